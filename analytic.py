@@ -0,0 +1,298 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+# Минимальное время обслуживания, принятое в ShopSimulation.generate_service_time
+MIN_SERVICE_TIME = 0.5
+
+_STANDARD_NORMAL = NormalDist()
+
+
+def _truncated_below_moments(dist, mean, std, lower):
+    """
+    Первые два момента величины max(lower, X)
+
+    Args:
+        dist (str): 'normal' или 'exponential'
+        mean (float): Среднее исходного распределения
+        std (float): Стандартное отклонение (для нормального)
+        lower (float): Нижняя граница
+
+    Returns:
+        tuple: (E[X'], E[X'^2])
+    """
+    if dist == 'normal':
+        if std <= 0:
+            value = max(lower, mean)
+            return value, value ** 2
+        d = (mean - lower) / std
+        cdf = _STANDARD_NORMAL.cdf(d)
+        pdf = _STANDARD_NORMAL.pdf(d)
+        first = lower * (1 - cdf) + mean * cdf + std * pdf
+        second = (lower ** 2 * (1 - cdf) + (mean ** 2 + std ** 2) * cdf
+                  + std * (mean + lower) * pdf)
+        return first, second
+
+    # Экспоненциальное распределение
+    if mean <= 0:
+        return lower, lower ** 2
+    tail = math.exp(-lower / mean)
+    first = lower * (1 - tail) + tail * (lower + mean)
+    second = lower ** 2 * (1 - tail) + tail * \
+        (lower ** 2 + 2 * lower * mean + 2 * mean ** 2)
+    return first, second
+
+
+def expected_shopping_time(params):
+    """Среднее время выбора товаров с учетом ограничений из ShopSimulation"""
+    dist = params.get('shopping_time_dist', 'normal')
+    mean = float(params.get('shopping_time_mean', 15))
+    std = float(params.get('shopping_time_std', 5))
+    low = float(params.get('shopping_time_min', 5))
+    high = float(params.get('shopping_time_max', 30))
+
+    if dist == 'normal':
+        # Нормальное распределение, обрезанное в точках low и high
+        if std <= 0:
+            return min(max(mean, low), high)
+        alpha = (low - mean) / std
+        beta = (high - mean) / std
+        cdf_a, cdf_b = _STANDARD_NORMAL.cdf(alpha), _STANDARD_NORMAL.cdf(beta)
+        pdf_a, pdf_b = _STANDARD_NORMAL.pdf(alpha), _STANDARD_NORMAL.pdf(beta)
+        return (low * cdf_a + high * (1 - cdf_b)
+                + mean * (cdf_b - cdf_a) + std * (pdf_a - pdf_b))
+    elif dist == 'uniform':
+        return (low + high) / 2
+    return _truncated_below_moments('exponential', mean, 0, low)[0]
+
+
+def service_time_moments(params):
+    """Среднее и квадрат коэффициента вариации времени обслуживания"""
+    dist = params.get('service_time_dist', 'exponential')
+    mean = float(params.get('service_time_mean', 3))
+    std = float(params.get('service_time_std', 1))
+
+    if dist in ('normal', 'exponential'):
+        first, second = _truncated_below_moments(
+            dist, mean, std, MIN_SERVICE_TIME)
+        variance = max(second - first ** 2, 0.0)
+    else:
+        # Для остальных распределений ограничение снизу не учитывается
+        samples = params.get('service_time_samples')
+        if dist == 'empirical' and samples is not None:
+            mean, std = float(np.mean(samples)), float(np.std(samples))
+        first, variance = max(mean, MIN_SERVICE_TIME), std ** 2
+    return first, variance / first ** 2 if first > 0 else 0.0
+
+
+def input_means(params):
+    """
+    Точно известные средние входных величин модели с учетом ограничений
+
+    Используются как контрольные переменные: выборочные средние входных
+    величин в прогоне сравниваются с этими значениями. Величины, среднее
+    которых с учетом ограничений точно не вычисляется (ограниченные снизу
+    логнормальное, гамма и Вейбулла, эмпирические распределения, журнал
+    прибытий), не включаются.
+
+    Returns:
+        dict: Имя параметра среднего -> точное среднее
+    """
+    means = {}
+    if not params.get('arrival_trace'):
+        means['customer_arrival_mean'] = float(params.get('customer_arrival_mean', 5))
+    if params.get('shopping_time_dist', 'normal') in ('normal', 'uniform', 'exponential'):
+        means['shopping_time_mean'] = expected_shopping_time(params)
+    if params.get('service_time_dist', 'exponential') in ('normal', 'exponential'):
+        means['service_time_mean'] = service_time_moments(params)[0]
+    return means
+
+
+def erlang_c(num_servers, offered_load):
+    """
+    Вероятность ожидания в системе M/M/c (формула Эрланга C)
+
+    Вычисляется через рекуррентную формулу Эрланга B,
+    устойчивую к переполнению при большом числе касс.
+    """
+    if num_servers <= 0:
+        return 1.0
+    if offered_load >= num_servers:
+        return 1.0
+    erlang_b = 1.0
+    for k in range(1, num_servers + 1):
+        erlang_b = offered_load * erlang_b / (k + offered_load * erlang_b)
+    rho = offered_load / num_servers
+    return erlang_b / (1 - rho * (1 - erlang_b))
+
+
+def is_stable(params):
+    """Проверяет, что предлагаемая нагрузка меньше количества касс"""
+    arrival_mean = float(params.get('customer_arrival_mean', 5))
+    if arrival_mean <= 0:
+        return False
+    mean_service, _ = service_time_moments(params)
+    return mean_service / arrival_mean < int(params.get('num_cash_desks', 3))
+
+
+def waiting_tail_decay(params):
+    """
+    Скорость убывания хвоста времени ожидания: P(W > t) ~ C * exp(-decay * t)
+
+    Для M/M/c decay = c * mu - lambda, для неэкспоненциального обслуживания
+    применяется поправка Аллена-Каннина. Возвращает None при перегрузке.
+    """
+    arrival_mean = float(params.get('customer_arrival_mean', 5))
+    num_cash_desks = int(params.get('num_cash_desks', 3))
+    if arrival_mean <= 0:
+        return None
+    mean_service, service_scv = service_time_moments(params)
+    offered_load = mean_service / arrival_mean
+    if num_cash_desks <= 0 or offered_load >= num_cash_desks:
+        return None
+    # Поправка Аллена-Каннина: (ca^2 + cs^2) / 2, поток прибытия пуассоновский
+    variability = (1.0 + service_scv) / 2
+    return (num_cash_desks - offered_load) / mean_service / variability
+
+
+def analytic_results(params):
+    """
+    Аналитическая оценка показателей модели без симуляции
+
+    Этап выбора товаров - система с бесконечным числом каналов, поэтому
+    в стационарном режиме поток к кассам остается пуассоновским. Касса
+    рассматривается как M/M/c (формула Эрланга C), а для неэкспоненциального
+    обслуживания применяется приближение Аллена-Каннина для G/G/c.
+    Максимальные значения оцениваются как квантили уровня 1 - 1/N
+    хвостового распределения ожидания.
+
+    Args:
+        params (dict): Параметры модели (как у ShopSimulation)
+
+    Returns:
+        dict: Результаты с теми же ключами, что и ShopSimulation.calculate_results,
+              а также 'analytic' и 'stable'
+    """
+    simulation_time = float(params.get('simulation_time', 480))
+    arrival_mean = float(params.get('customer_arrival_mean', 5))
+    num_cash_desks = int(params.get('num_cash_desks', 3))
+
+    arrival_rate = 1.0 / arrival_mean if arrival_mean > 0 else float('inf')
+    mean_service, _ = service_time_moments(params)
+    mean_shopping = expected_shopping_time(params)
+
+    offered_load = arrival_rate * mean_service
+    stable = num_cash_desks > 0 and offered_load < num_cash_desks
+    arrivals = arrival_rate * simulation_time
+
+    results = {
+        'analytic': True,
+        'stable': stable,
+        'offered_load': offered_load,
+        'total_customers_arrived': int(round(arrivals)),
+        'time_in_shop_distribution': [],
+        'waiting_time_distribution': [],
+        'queue_length_time_series': [],
+    }
+
+    if not stable:
+        # Перегрузка: очередь растет неограниченно, стационарных значений нет
+        served_rate = num_cash_desks / mean_service if mean_service > 0 else 0
+        results.update({
+            'total_customers_served': int(round(served_rate * simulation_time)),
+            'avg_time_in_shop': float('inf'),
+            'max_time_in_shop': float('inf'),
+            'avg_waiting_time': float('inf'),
+            'max_waiting_time': float('inf'),
+            'p95_waiting_time': float('inf'),
+            'avg_queue_length': float('inf'),
+            'max_queue_length': float('inf'),
+            'cash_desk_utilization': {i: 1.0 for i in range(num_cash_desks)},
+            'avg_cash_desk_utilization': 1.0 if num_cash_desks > 0 else 0,
+        })
+        return results
+
+    rho = offered_load / num_cash_desks
+    wait_probability = erlang_c(num_cash_desks, offered_load)
+
+    # Скорость убывания хвоста ожидания: P(W > t) = C * exp(-decay * t)
+    decay = waiting_tail_decay(params)
+
+    avg_waiting_time = wait_probability / decay
+    avg_queue_length = arrival_rate * avg_waiting_time + offered_load
+
+    def waiting_quantile(probability):
+        if wait_probability <= probability:
+            return 0.0
+        return math.log(wait_probability / probability) / decay
+
+    def queue_quantile(probability):
+        if wait_probability <= probability or rho <= 0:
+            return float(num_cash_desks)
+        return num_cash_desks + math.ceil(
+            math.log(probability / wait_probability) / math.log(rho))
+
+    customers = max(arrivals, 1.0)
+    max_waiting_time = waiting_quantile(1.0 / customers)
+    # Для длины очереди используем число минутных отсчетов мониторинга
+    max_queue_length = min(queue_quantile(1.0 / max(simulation_time, 1.0)),
+                           num_cash_desks + arrivals)
+
+    avg_time_in_shop = mean_shopping + avg_waiting_time + mean_service
+    served = arrival_rate * max(simulation_time - avg_time_in_shop, 0.0)
+
+    results.update({
+        'total_customers_served': int(round(served)),
+        'avg_time_in_shop': avg_time_in_shop,
+        'max_time_in_shop': avg_time_in_shop - avg_waiting_time + max_waiting_time,
+        'avg_waiting_time': avg_waiting_time,
+        'max_waiting_time': max_waiting_time,
+        'p95_waiting_time': waiting_quantile(0.05),
+        'avg_queue_length': avg_queue_length,
+        'max_queue_length': max_queue_length,
+        'cash_desk_utilization': {i: rho for i in range(num_cash_desks)},
+        'avg_cash_desk_utilization': rho,
+    })
+    return results
+
+
+def compare_with_simulation(simulation_results, params,
+                            metrics=('avg_waiting_time', 'avg_queue_length',
+                                     'avg_cash_desk_utilization')):
+    """
+    Сравнение результатов симуляции с аналитической оценкой
+
+    Returns:
+        dict: метрика -> (значение симуляции, аналитическое значение, отн. отклонение)
+    """
+    analytic = analytic_results(params)
+    comparison = {}
+    for metric_name in metrics:
+        simulated = float(simulation_results.get(metric_name, 0))
+        expected = float(analytic.get(metric_name, 0))
+        if math.isfinite(expected) and expected != 0:
+            deviation = (simulated - expected) / expected
+        else:
+            deviation = float('nan')
+        comparison[metric_name] = (simulated, expected, deviation)
+    return comparison
+
+
+def prune_infeasible_points(base_params, param_name, param_values):
+    """
+    Отбор точек эксперимента, в которых система заведомо перегружена
+
+    Returns:
+        tuple: (список допустимых значений, список отброшенных значений)
+    """
+    kept, pruned = [], []
+    for value in param_values:
+        params = base_params.copy()
+        params[param_name] = int(value) if param_name == "num_cash_desks" \
+            else float(value)
+        if is_stable(params):
+            kept.append(value)
+        else:
+            pruned.append(value)
+    return kept, pruned
@@ -0,0 +1,166 @@
+import csv
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+# Множители для перевода времени из журнала в минуты модели
+TIME_UNITS = {
+    's': 1 / 60,
+    'min': 1.0,
+    'h': 60.0,
+}
+
+
+class CsvArrivalTrace:
+    """
+    Поток прибытий из CSV-журнала кассовых транзакций
+
+    Журнал читается построчно при каждой итерации, поэтому в памяти
+    находится только текущая строка, независимо от размера файла.
+    Время прибытия может быть числом (в единицах time_unit) или
+    датой-временем в формате ISO 8601. Итерация возвращает пары
+    (время от начала журнала в минутах, время обслуживания или None).
+    """
+
+    def __init__(self, path, time_column='timestamp', service_column=None,
+                 time_unit='min', service_unit='min', delimiter=','):
+        """
+        Args:
+            path (str): Путь к CSV-файлу с заголовком
+            time_column (str): Столбец с моментом прибытия
+            service_column (str): Столбец с наблюдаемым временем обслуживания
+            time_unit (str): Единица числового времени ('s', 'min', 'h')
+            service_unit (str): Единица времени обслуживания
+            delimiter (str): Разделитель столбцов
+        """
+        self.path = path
+        self.time_column = time_column
+        self.service_column = service_column
+        self.time_scale = TIME_UNITS[time_unit]
+        self.service_scale = TIME_UNITS[service_unit]
+        self.delimiter = delimiter
+
+    def _parse_time(self, value):
+        """
+        Перевод значения времени из журнала в минуты
+
+        Дата-время без часового пояса считается UTC, чтобы интервалы между
+        прибытиями не зависели от часового пояса и перехода на летнее время
+        компьютера, на котором запущена модель.
+        """
+        try:
+            return float(value) * self.time_scale
+        except ValueError:
+            moment = datetime.fromisoformat(value)
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=timezone.utc)
+            return moment.timestamp() / 60
+
+    def __iter__(self):
+        with open(self.path, newline='', encoding='utf-8') as f:
+            start = None
+            for row in csv.DictReader(f, delimiter=self.delimiter):
+                timestamp = self._parse_time(row[self.time_column])
+                if start is None:
+                    start = timestamp
+
+                service_time = None
+                if self.service_column and row.get(self.service_column) not in (None, ''):
+                    service_time = float(
+                        row[self.service_column]) * self.service_scale
+
+                yield timestamp - start, service_time
+
+
+class BinaryArrivalTrace:
+    """
+    Поток прибытий из двоичного файла, отображенного в память
+
+    Файл содержит записи float64: либо только моменты прибытия (в минутах),
+    либо пары (момент прибытия, время обслуживания). Данные читаются через
+    np.memmap блоками по chunk_size записей, без загрузки файла целиком.
+    """
+
+    def __init__(self, path, with_service_times=False, chunk_size=65536):
+        """
+        Args:
+            path (str): Путь к файлу, созданному write_binary_trace
+            with_service_times (bool): Содержит ли файл время обслуживания
+            chunk_size (int): Количество записей в блоке чтения
+        """
+        self.path = path
+        self.with_service_times = with_service_times
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        columns = 2 if self.with_service_times else 1
+        # np.memmap не отображает файлы нулевой длины
+        if os.path.getsize(self.path) == 0:
+            return
+        data = np.memmap(self.path, dtype=np.float64, mode='r')
+        records = data.reshape(-1, columns)
+        if len(records) == 0:
+            return
+        start = float(records[0, 0])
+
+        for offset in range(0, len(records), self.chunk_size):
+            # Копируем только текущий блок
+            chunk = np.array(records[offset:offset + self.chunk_size])
+            times = (chunk[:, 0] - start).tolist()
+            if self.with_service_times:
+                # NaN означает, что время обслуживания не наблюдалось
+                for arrival_time, service_time in zip(times, chunk[:, 1].tolist()):
+                    yield arrival_time, (service_time
+                                         if service_time == service_time else None)
+            else:
+                for arrival_time in times:
+                    yield arrival_time, None
+
+
+def write_binary_trace(path, arrival_times, service_times=None):
+    """
+    Запись двоичного журнала прибытий для BinaryArrivalTrace
+
+    Args:
+        path (str): Путь к создаваемому файлу
+        arrival_times: моменты прибытия (мин)
+        service_times: время обслуживания (мин), если известно
+    """
+    arrival_times = np.asarray(arrival_times, dtype=np.float64)
+    if service_times is None:
+        records = arrival_times
+    else:
+        records = np.column_stack(
+            [arrival_times, np.asarray(service_times, dtype=np.float64)])
+    records.tofile(path)
+
+
+def convert_csv_to_binary(csv_trace, path, chunk_size=65536):
+    """
+    Преобразование CSV-журнала в двоичный формат блоками
+
+    Args:
+        csv_trace (CsvArrivalTrace): Исходный журнал
+        path (str): Путь к создаваемому двоичному файлу
+        chunk_size (int): Количество записей в блоке записи
+
+    Returns:
+        bool: Содержит ли результат время обслуживания
+    """
+    with_service_times = csv_trace.service_column is not None
+    buffer = []
+    with open(path, 'wb') as f:
+        for arrival_time, service_time in csv_trace:
+            if with_service_times:
+                buffer.extend((arrival_time, service_time
+                               if service_time is not None else np.nan))
+            else:
+                buffer.append(arrival_time)
+            if len(buffer) >= chunk_size:
+                np.asarray(buffer, dtype=np.float64).tofile(f)
+                buffer = []
+        if buffer:
+            np.asarray(buffer, dtype=np.float64).tofile(f)
+    return with_service_times
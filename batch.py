@@ -0,0 +1,452 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Возобновляемые пакетные эксперименты на общем каталоге
+
+Файл сценария (JSON) разворачивается в список заданий, которые записываются
+в общий каталог (например, сетевой диск). Рабочие процессы на любом
+количестве машин захватывают задания атомарным созданием файлов блокировки,
+результат каждого задания записывается в отдельный файл, а события
+(захват, завершение, ошибка) - в журнал. Выполненные задания не
+повторяются, поэтому прерванный или расширенный эксперимент продолжается
+с того места, где остановился. Внешний брокер не нужен.
+
+Пример сценария:
+    {
+        "base_params": {"simulation_time": 480, "seed": 42},
+        "sweep": {"num_cash_desks": [2, 3, 4], "customer_arrival_mean": [0.5, 1.0]},
+        "replications": 5,
+        "stores": "stores.csv"
+    }
+
+Пример запуска:
+    python batch.py init scenario.json /mnt/shared/sweep
+    python batch.py work /mnt/shared/sweep --workers 8     (на каждой машине)
+    python batch.py status /mnt/shared/sweep
+    python batch.py collect /mnt/shared/sweep --output sweep.csv
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from chain import load_store_table
+from parallel import SUMMARY_KEYS, default_workers, run_simulation_summary
+from replications import replication_params
+
+
+MANIFEST_FILE = 'manifest.json'
+TASKS_FILE = 'tasks.json'
+JOURNAL_FILE = 'journal.jsonl'
+LOCKS_DIR = 'locks'
+RESULTS_DIR = 'results'
+
+# Блокировка без результата, не обновлявшаяся дольше этого времени (с),
+# считается оставшейся от упавшего рабочего процесса и может быть
+# захвачена снова; работающий процесс обновляет свои блокировки чаще
+DEFAULT_LOCK_TIMEOUT = 120.0
+HEARTBEAT_FRACTION = 0.25
+
+
+def _task_id(task):
+    """Идентификатор задания по его содержимому (не зависит от порядка в сценарии)"""
+    key = json.dumps(task, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def expand_manifest(manifest, base_dir='.'):
+    """
+    Развертывание сценария в список заданий
+
+    Задания - декартово произведение магазинов (необязательная таблица
+    'stores', как у chain.py), значений параметров 'sweep' и номеров
+    репликаций 'replications'. Идентификатор задания зависит только от
+    его параметров, поэтому при расширении сценария уже выполненные
+    задания сохраняются.
+
+    Args:
+        manifest (dict): Сценарий эксперимента
+        base_dir (str): Каталог, относительно которого указана таблица магазинов
+
+    Returns:
+        list: Задания {'task_id', 'params', 'store_id', 'replication'}
+    """
+    base_params = manifest.get('base_params', {})
+    sweep = manifest.get('sweep', {})
+    names = list(sweep)
+    stores = [None]
+    if manifest.get('stores'):
+        stores = load_store_table(os.path.join(base_dir, manifest['stores']))
+
+    tasks = []
+    for store in stores:
+        for values in itertools.product(*(sweep[name] for name in names)):
+            params = dict(base_params)
+            store_id = None
+            if store is not None:
+                store_params = dict(store)
+                store_id = store_params.pop('store_id')
+                params.update(store_params)
+            params.update(zip(names, values))
+            for replication in range(manifest.get('replications', 1)):
+                task = {
+                    'params': replication_params(params, replication),
+                    'store_id': store_id,
+                    'replication': replication,
+                }
+                task['task_id'] = _task_id(task)
+                tasks.append(task)
+    return tasks
+
+
+class WorkQueue:
+    """
+    Очередь заданий в общем каталоге
+
+    Задание захватывается созданием файла locks/<task_id>.lock с флагом
+    O_EXCL (атомарно и на сетевых файловых системах), результат
+    записывается во временный файл и переименовывается в
+    results/<task_id>.json. Журнал дописывается строками JSON в режиме
+    O_APPEND.
+    """
+
+    def __init__(self, directory, lock_timeout=DEFAULT_LOCK_TIMEOUT):
+        """
+        Args:
+            directory (str): Общий каталог эксперимента
+            lock_timeout (float): Время (с), после которого блокировка считается потерянной
+        """
+        self.directory = directory
+        self.lock_timeout = lock_timeout
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def init(self, manifest_path):
+        """
+        Создание (или расширение) эксперимента по файлу сценария
+
+        Returns:
+            tuple: (количество заданий, количество уже выполненных)
+        """
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        tasks = expand_manifest(manifest, os.path.dirname(os.path.abspath(manifest_path)))
+
+        os.makedirs(self._path(LOCKS_DIR), exist_ok=True)
+        os.makedirs(self._path(RESULTS_DIR), exist_ok=True)
+        self._write_atomic(self._path(MANIFEST_FILE), manifest)
+        self._write_atomic(self._path(TASKS_FILE), tasks)
+        self.journal('init', None, tasks=len(tasks))
+
+        done = self.completed_ids()
+        return len(tasks), sum(1 for task in tasks if task['task_id'] in done)
+
+    def tasks(self):
+        """Список заданий эксперимента"""
+        with open(self._path(TASKS_FILE), encoding='utf-8') as f:
+            return json.load(f)
+
+    def completed_ids(self):
+        """Идентификаторы заданий с записанными результатами"""
+        results_dir = self._path(RESULTS_DIR)
+        if not os.path.isdir(results_dir):
+            return set()
+        return {name[:-5] for name in os.listdir(results_dir) if name.endswith('.json')}
+
+    def journal(self, event, task_id, **fields):
+        """Запись события в журнал эксперимента"""
+        record = dict(time=time.time(), worker=self.worker_id, event=event,
+                      task_id=task_id, **fields)
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        fd = os.open(self._path(JOURNAL_FILE), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def read_journal(self):
+        """События журнала (незавершенная последняя строка пропускается)"""
+        records = []
+        try:
+            with open(self._path(JOURNAL_FILE), encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return records
+
+    def claim(self, task_id):
+        """
+        Попытка захватить задание
+
+        Returns:
+            bool: True, если задание захвачено этим рабочим процессом
+        """
+        if os.path.exists(self._path(RESULTS_DIR, task_id + '.json')):
+            return False
+        lock_path = self._path(LOCKS_DIR, task_id + '.lock')
+        try:
+            fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            if not self._break_stale_lock(lock_path):
+                return False
+            try:
+                fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                return False
+        try:
+            os.write(fd, self.worker_id.encode('utf-8'))
+        finally:
+            os.close(fd)
+        # Результат мог появиться между проверкой и захватом
+        if os.path.exists(self._path(RESULTS_DIR, task_id + '.json')):
+            self.release(task_id)
+            return False
+        self.journal('claim', task_id)
+        return True
+
+    def _break_stale_lock(self, lock_path):
+        """
+        Снятие потерянной блокировки
+
+        Блокировка переименовывается (атомарно), поэтому снять ее может
+        только один из рабочих процессов, одновременно обнаруживших ее.
+        """
+        try:
+            age = time.time() - os.path.getmtime(lock_path)
+        except FileNotFoundError:
+            return True
+        if age < self.lock_timeout:
+            return False
+        stale_path = f"{lock_path}.stale.{uuid.uuid4().hex}"
+        try:
+            os.rename(lock_path, stale_path)
+        except FileNotFoundError:
+            return False
+        os.remove(stale_path)
+        self.journal('stale_lock', os.path.basename(lock_path)[:-5], age=age)
+        return True
+
+    def heartbeat(self, task_ids):
+        """Обновление времени блокировок выполняемых заданий"""
+        for task_id in task_ids:
+            try:
+                os.utime(self._path(LOCKS_DIR, task_id + '.lock'))
+            except FileNotFoundError:
+                pass
+
+    def release(self, task_id):
+        """Снятие блокировки задания"""
+        try:
+            os.remove(self._path(LOCKS_DIR, task_id + '.lock'))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, task, summary, elapsed):
+        """Запись результата задания и снятие блокировки"""
+        record = dict(task, summary=summary, worker=self.worker_id, elapsed=elapsed)
+        self._write_atomic(self._path(RESULTS_DIR, task['task_id'] + '.json'), record)
+        self.journal('done', task['task_id'], elapsed=elapsed)
+        self.release(task['task_id'])
+
+    def fail(self, task, error):
+        """Запись ошибки задания; задание будет повторено при следующем запуске"""
+        self.journal('failed', task['task_id'], error=error)
+        self.release(task['task_id'])
+
+    def _write_atomic(self, path, data):
+        """Запись JSON через временный файл и переименование"""
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def status(self):
+        """
+        Состояние эксперимента
+
+        Returns:
+            dict: Количество заданий: всего, выполнено, захвачено, ожидает;
+                  количество ошибок по журналу
+        """
+        tasks = self.tasks()
+        done = self.completed_ids()
+        locks_dir = self._path(LOCKS_DIR)
+        locked = {name[:-5] for name in os.listdir(locks_dir) if name.endswith('.lock')}
+        ids = {task['task_id'] for task in tasks}
+        return {
+            'total': len(ids),
+            'done': len(ids & done),
+            'running': len((ids & locked) - done),
+            'pending': len(ids - done - locked),
+            'failures': sum(1 for r in self.read_journal() if r['event'] == 'failed'),
+        }
+
+    def results(self):
+        """Результаты выполненных заданий в порядке сценария"""
+        records = []
+        for task in self.tasks():
+            path = self._path(RESULTS_DIR, task['task_id'] + '.json')
+            try:
+                with open(path, encoding='utf-8') as f:
+                    records.append(json.load(f))
+            except FileNotFoundError:
+                continue
+        return records
+
+
+def run_worker(directory, max_workers=None, lock_timeout=DEFAULT_LOCK_TIMEOUT,
+               progress_callback=None):
+    """
+    Выполнение заданий эксперимента на этой машине
+
+    Задания захватываются по одному по мере освобождения рабочих
+    процессов, поэтому несколько машин делят задания без пересечений.
+    Пока задания выполняются, их блокировки периодически обновляются.
+    Функция завершается, когда свободных заданий не осталось.
+
+    Args:
+        directory (str): Общий каталог эксперимента
+        max_workers (int): Количество рабочих процессов на этой машине
+        lock_timeout (float): Время (с), после которого блокировка считается потерянной
+        progress_callback (callable): Вызывается с заданием после его выполнения
+
+    Returns:
+        int: Количество заданий, выполненных этой машиной
+    """
+    queue = WorkQueue(directory, lock_timeout)
+    max_workers = max_workers or default_workers()
+    pending = iter(queue.tasks())
+    completed = 0
+
+    def claim_next():
+        for task in pending:
+            if queue.claim(task['task_id']):
+                return task
+        return None
+
+    running = {}
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        while not stop_heartbeat.wait(lock_timeout * HEARTBEAT_FRACTION):
+            queue.heartbeat([task['task_id'] for task, _ in list(running.values())])
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+
+        def submit_next():
+            task = claim_next()
+            if task is not None:
+                future = executor.submit(run_simulation_summary, task['params'])
+                running[future] = (task, time.time())
+            return task is not None
+
+        for _ in range(max_workers):
+            if not submit_next():
+                break
+
+        try:
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task, started = running.pop(future)
+                    try:
+                        summary = future.result()
+                    except Exception as e:
+                        queue.fail(task, f"{type(e).__name__}: {e}")
+                    else:
+                        queue.complete(task, summary, time.time() - started)
+                        completed += 1
+                        if progress_callback:
+                            progress_callback(task)
+                    submit_next()
+        finally:
+            # При прерывании блокировки снимаются, задания выполнит следующий запуск
+            stop_heartbeat.set()
+            for task, _ in running.values():
+                queue.release(task['task_id'])
+    return completed
+
+
+def write_results_csv(path, records, manifest):
+    """Запись результатов эксперимента в CSV (по строке на задание)"""
+    sweep_names = list(manifest.get('sweep', {}))
+    columns = ['task_id', 'store_id', 'replication'] + sweep_names + SUMMARY_KEYS
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for record in records:
+            row = {'task_id': record['task_id'], 'store_id': record['store_id'],
+                   'replication': record['replication']}
+            row.update({name: record['params'].get(name) for name in sweep_names})
+            row.update(record['summary'])
+            writer.writerow(row)
+
+
+def main():
+    """Управление пакетным экспериментом из командной строки"""
+    parser = argparse.ArgumentParser(description="Пакетный эксперимент на общем каталоге")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    init_parser = commands.add_parser('init', help="создать или расширить эксперимент")
+    init_parser.add_argument('manifest', help="файл сценария (JSON)")
+    init_parser.add_argument('directory', help="общий каталог эксперимента")
+
+    work_parser = commands.add_parser('work', help="выполнять задания на этой машине")
+    work_parser.add_argument('directory', help="общий каталог эксперимента")
+    work_parser.add_argument('--workers', type=int, default=None,
+                             help="количество рабочих процессов")
+    work_parser.add_argument('--lock-timeout', type=float, default=DEFAULT_LOCK_TIMEOUT,
+                             help="время (с), после которого блокировка считается потерянной")
+
+    status_parser = commands.add_parser('status', help="состояние эксперимента")
+    status_parser.add_argument('directory', help="общий каталог эксперимента")
+
+    collect_parser = commands.add_parser('collect', help="сбор результатов в CSV")
+    collect_parser.add_argument('directory', help="общий каталог эксперимента")
+    collect_parser.add_argument('--output', required=True, help="CSV для результатов")
+
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        total, done = WorkQueue(args.directory).init(args.manifest)
+        print(f"Заданий: {total}, уже выполнено: {done}")
+    elif args.command == 'work':
+        completed = run_worker(
+            args.directory, args.workers, args.lock_timeout,
+            progress_callback=lambda task: print(f"- выполнено задание {task['task_id']}"))
+        print(f"Выполнено заданий: {completed}")
+    elif args.command == 'status':
+        status = WorkQueue(args.directory).status()
+        print(f"Всего: {status['total']}, выполнено: {status['done']}, "
+              f"выполняется: {status['running']}, ожидает: {status['pending']}, "
+              f"ошибок: {status['failures']}")
+    elif args.command == 'collect':
+        queue = WorkQueue(args.directory)
+        with open(os.path.join(args.directory, MANIFEST_FILE), encoding='utf-8') as f:
+            manifest = json.load(f)
+        records = queue.results()
+        write_results_csv(args.output, records, manifest)
+        print(f"Записано результатов: {len(records)}")
+
+
+if __name__ == "__main__":
+    main()
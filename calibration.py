@@ -0,0 +1,239 @@
+import math
+
+from engine import EventShopSimulation
+from parallel import map_in_processes
+from replications import replication_params
+
+
+# Калибруемые параметры (средние времена, поиск ведется по их логарифмам)
+CALIBRATION_PARAMS = ('customer_arrival_mean', 'shopping_time_mean', 'service_time_mean')
+
+# Показатели, по которым сверяется модель с наблюдениями в магазине.
+# Среднее время выбора товаров влияет в основном на время в магазине:
+# без avg_time_in_shop оно определяется по наблюдениям плохо
+CALIBRATION_KPIS = ('avg_waiting_time', 'avg_queue_length', 'avg_cash_desk_utilization',
+                    'avg_time_in_shop')
+
+
+def _evaluate_kpis(task):
+    """Показатели одной репликации (выполняется в рабочем процессе)"""
+    params, kpi_names = task
+    results = EventShopSimulation(params).run_simulation()
+    return [float(results.get(name, 0.0)) for name in kpi_names]
+
+
+class CalibrationEvaluator:
+    """
+    Целевая функция калибровки: взвешенная сумма квадратов относительных
+    отклонений показателей модели от наблюдаемых значений
+
+    Каждая точка прогоняется в нескольких репликациях с общими случайными
+    числами (одинаковые seed во всех точках), поэтому целевая функция
+    гладко зависит от параметров. Репликации всех точек пакета выполняются
+    параллельно в пуле процессов, результаты кэшируются по значениям
+    параметров.
+    """
+
+    def __init__(self, base_params, targets, param_names=CALIBRATION_PARAMS,
+                 replications=5, weights=None, max_workers=None):
+        """
+        Args:
+            base_params (dict): Базовые параметры модели
+            targets (dict): Наблюдаемые значения показателей (имя -> значение)
+            param_names: Калибруемые параметры
+            replications (int): Количество репликаций на точку
+            weights (dict): Веса показателей (по умолчанию 1)
+            max_workers (int): Количество рабочих процессов
+        """
+        self.base_params = base_params
+        self.targets = dict(targets)
+        self.kpi_names = list(self.targets)
+        self.param_names = list(param_names)
+        self.replications = replications
+        self.weights = {name: 1.0 for name in self.kpi_names}
+        self.weights.update(weights or {})
+        self.max_workers = max_workers
+        self.cache = {}
+        self.simulations_run = 0
+
+    def point_params(self, point):
+        """Параметры модели в точке (логарифмы калибруемых параметров)"""
+        params = self.base_params.copy()
+        for name, value in zip(self.param_names, point):
+            params[name] = math.exp(value)
+        return params
+
+    @staticmethod
+    def _key(point):
+        # Точки, совпадающие до 6 значащих цифр, считаются одинаковыми
+        return tuple(float(f"{value:.6g}") for value in point)
+
+    def objective(self, kpis):
+        """Значение целевой функции по показателям модели"""
+        total = 0.0
+        for name in self.kpi_names:
+            target = self.targets[name]
+            scale = abs(target) if target else 1.0
+            total += self.weights[name] * ((kpis[name] - target) / scale) ** 2
+        return total
+
+    def evaluate_many(self, points):
+        """
+        Значения целевой функции в наборе точек
+
+        Returns:
+            list: Значение целевой функции для каждой точки
+        """
+        keys = [self._key(point) for point in points]
+        pending = [key for key in dict.fromkeys(keys) if key not in self.cache]
+        tasks = [(replication_params(self.point_params(key), replication), self.kpi_names)
+                 for key in pending for replication in range(self.replications)]
+
+        outputs = map_in_processes(_evaluate_kpis, tasks, max_workers=self.max_workers)
+        self.simulations_run += len(tasks)
+
+        for i, key in enumerate(pending):
+            runs = outputs[i * self.replications:(i + 1) * self.replications]
+            kpis = {name: sum(run[j] for run in runs) / len(runs)
+                    for j, name in enumerate(self.kpi_names)}
+            self.cache[key] = {'kpis': kpis, 'objective': self.objective(kpis)}
+
+        return [self.cache[key]['objective'] for key in keys]
+
+    def evaluate(self, point):
+        """Значение целевой функции в одной точке"""
+        return self.evaluate_many([point])[0]
+
+    def kpis(self, point):
+        """Средние показатели модели в уже оцененной точке"""
+        return self.cache[self._key(point)]['kpis']
+
+
+def calibrate_parameters(base_params, targets, param_names=CALIBRATION_PARAMS,
+                         replications=5, weights=None, initial_step=0.2,
+                         max_iterations=60, tolerance=1e-4, max_workers=None,
+                         progress_callback=None):
+    """
+    Подбор средних времен модели под наблюдаемые показатели магазина
+
+    Используется метод Нелдера-Мида по логарифмам параметров (параметры
+    остаются положительными, шаги - относительными). На каждой итерации
+    все пробные точки (отражение, растяжение, внешнее и внутреннее
+    сжатие) оцениваются одним пакетом в пуле процессов, поэтому время
+    итерации определяется одной волной прогонов, а не четырьмя
+    последовательными. Повторные точки берутся из кэша.
+
+    Args:
+        base_params (dict): Базовые параметры модели (начальная точка)
+        targets (dict): Наблюдаемые значения показателей, например
+            {'avg_waiting_time': 4.0, 'avg_cash_desk_utilization': 0.8}
+        param_names: Калибруемые параметры
+        replications (int): Количество репликаций на точку
+        weights (dict): Веса показателей в целевой функции
+        initial_step (float): Относительный размер начального симплекса
+        max_iterations (int): Предельное количество итераций
+        tolerance (float): Остановка, когда разброс целевой функции
+            и размер симплекса (в логарифмах) меньше этого значения
+        max_workers (int): Количество рабочих процессов
+        progress_callback (callable): Вызывается с номером итерации
+            и лучшим значением целевой функции
+
+    Returns:
+        dict: Найденные параметры, показатели модели в них и сведения о поиске
+    """
+    if not targets:
+        raise ValueError("Не заданы наблюдаемые показатели для калибровки")
+    unknown = [name for name in targets if name not in CALIBRATION_KPIS]
+    if unknown:
+        raise ValueError(f"Неизвестные показатели калибровки: {', '.join(unknown)}")
+
+    evaluator = CalibrationEvaluator(base_params, targets, param_names, replications,
+                                     weights, max_workers)
+    defaults = {'customer_arrival_mean': 5.0, 'shopping_time_mean': 15.0,
+                'service_time_mean': 3.0}
+    start = [math.log(float(base_params.get(name, defaults.get(name, 1.0))))
+             for name in evaluator.param_names]
+    dimension = len(start)
+
+    # Начальный симплекс: начальная точка и сдвиги по каждому параметру
+    simplex = [list(start)]
+    for i in range(dimension):
+        vertex = list(start)
+        vertex[i] += math.log(1 + initial_step)
+        simplex.append(vertex)
+    values = evaluator.evaluate_many(simplex)
+
+    def combine(a, b, coefficient):
+        """Точка a + coefficient * (b - a)"""
+        return [x + coefficient * (y - x) for x, y in zip(a, b)]
+
+    history = []
+    iterations = 0
+    converged = False
+    for iterations in range(1, max_iterations + 1):
+        order = sorted(range(dimension + 1), key=lambda i: values[i])
+        simplex = [simplex[i] for i in order]
+        values = [values[i] for i in order]
+        history.append(values[0])
+        if progress_callback:
+            progress_callback(iterations, values[0])
+
+        size = max(abs(x - y) for vertex in simplex[1:] for x, y in zip(vertex, simplex[0]))
+        if values[-1] - values[0] < tolerance and size < tolerance:
+            converged = True
+            break
+
+        centroid = [sum(vertex[i] for vertex in simplex[:-1]) / dimension
+                    for i in range(dimension)]
+        worst = simplex[-1]
+        reflected = combine(centroid, worst, -1.0)
+        expanded = combine(centroid, worst, -2.0)
+        outside = combine(centroid, worst, -0.5)
+        inside = combine(centroid, worst, 0.5)
+        # Все пробные точки итерации - одним пакетом
+        evaluator.evaluate_many([reflected, expanded, outside, inside])
+
+        f_reflected = evaluator.evaluate(reflected)
+        if f_reflected < values[0]:
+            f_expanded = evaluator.evaluate(expanded)
+            if f_expanded < f_reflected:
+                simplex[-1], values[-1] = expanded, f_expanded
+            else:
+                simplex[-1], values[-1] = reflected, f_reflected
+            continue
+        if f_reflected < values[-2]:
+            simplex[-1], values[-1] = reflected, f_reflected
+            continue
+
+        # Сжатие: наружу, если отражение лучше худшей вершины, иначе внутрь
+        if f_reflected < values[-1]:
+            candidate, limit = outside, f_reflected
+        else:
+            candidate, limit = inside, values[-1]
+        f_candidate = evaluator.evaluate(candidate)
+        if f_candidate <= limit:
+            simplex[-1], values[-1] = candidate, f_candidate
+            continue
+
+        # Сжатие всего симплекса к лучшей вершине
+        simplex = [simplex[0]] + [combine(simplex[0], vertex, 0.5) for vertex in simplex[1:]]
+        values = [values[0]] + evaluator.evaluate_many(simplex[1:])
+
+    best = min(range(dimension + 1), key=lambda i: values[i])
+    best_point = simplex[best]
+    return {
+        'params': {name: math.exp(value)
+                   for name, value in zip(evaluator.param_names, best_point)},
+        'kpis': evaluator.kpis(best_point),
+        'initial_params': {name: math.exp(value)
+                           for name, value in zip(evaluator.param_names, start)},
+        'initial_kpis': evaluator.kpis(start),
+        'targets': dict(targets),
+        'objective': values[best],
+        'history': history,
+        'iterations': iterations,
+        'converged': converged,
+        'replications': replications,
+        'points_evaluated': len(evaluator.cache),
+        'simulations_run': evaluator.simulations_run,
+    }
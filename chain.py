@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Моделирование сети магазинов
+
+Запускает модель для каждого магазина из таблицы параметров, распределяя
+магазины по пулу процессов. Рабочие процессы возвращают только компактные
+сводки, которые агрегируются в показатели сети и список магазинов-выбросов.
+
+Пример запуска:
+    python chain.py stores.csv --workers 8 --output chain_summary.csv
+"""
+
+import argparse
+import csv
+
+import numpy as np
+
+from parallel import SUMMARY_KEYS, map_in_processes, run_simulation_summary
+
+
+# Типы параметров модели для чтения таблицы магазинов
+PARAM_TYPES = {
+    'seed': int,
+    'simulation_time': float,
+    'customer_arrival_mean': float,
+    'shopping_time_dist': str,
+    'shopping_time_mean': float,
+    'shopping_time_std': float,
+    'shopping_time_min': float,
+    'shopping_time_max': float,
+    'num_cash_desks': int,
+    'service_time_dist': str,
+    'service_time_mean': float,
+    'service_time_std': float,
+    'balk_queue_length': int,
+    'patience_mean': float,
+    'max_customers_in_shop': int,
+}
+
+
+def load_store_table(path):
+    """
+    Чтение таблицы параметров магазинов из CSV
+
+    Первая строка - заголовок. Столбец 'store_id' обязателен,
+    остальные столбцы совпадают с именами параметров модели.
+    Пустые ячейки означают значение по умолчанию.
+
+    Returns:
+        list: Список словарей параметров с ключом 'store_id'
+    """
+    stores = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            store = {'store_id': row.pop('store_id')}
+            for name, value in row.items():
+                if name in PARAM_TYPES and value not in (None, ''):
+                    converter = PARAM_TYPES[name]
+                    store[name] = converter(
+                        float(value)) if converter is int else converter(value)
+            stores.append(store)
+    return stores
+
+
+def _run_store(store):
+    """
+    Симуляция одного магазина в рабочем процессе
+
+    Нужна только сводка, поэтому статистика накапливается без хранения
+    данных по отдельным покупателям
+    """
+    params = {k: v for k, v in store.items() if k != 'store_id'}
+    summary = run_simulation_summary(params, keep_stats=False)
+    summary['store_id'] = store['store_id']
+    summary['num_cash_desks'] = int(params.get('num_cash_desks', 3))
+    return summary
+
+
+def aggregate_chain(summaries):
+    """
+    Агрегирование сводок магазинов в показатели сети
+
+    Средние по времени ожидания и времени в магазине взвешиваются
+    по числу обслуженных покупателей, загрузка касс - по числу касс.
+    """
+    if not summaries:
+        return {}
+
+    served = np.array([s.get('total_customers_served', 0) for s in summaries])
+    desks = np.array([s.get('num_cash_desks', 0) for s in summaries])
+    total_served = served.sum()
+
+    def weighted(key, weights):
+        values = np.array([s.get(key, 0) for s in summaries])
+        total = weights.sum()
+        return float(np.dot(values, weights) / total) if total > 0 else 0.0
+
+    return {
+        'num_stores': len(summaries),
+        'total_cash_desks': int(desks.sum()),
+        'total_customers_arrived': int(sum(s.get('total_customers_arrived', 0)
+                                           for s in summaries)),
+        'total_customers_served': int(total_served),
+        'avg_waiting_time': weighted('avg_waiting_time', served),
+        'avg_time_in_shop': weighted('avg_time_in_shop', served),
+        'avg_queue_length': float(np.mean([s.get('avg_queue_length', 0)
+                                           for s in summaries])),
+        'avg_cash_desk_utilization': weighted('avg_cash_desk_utilization', desks),
+        'max_p95_waiting_time': float(max(s.get('p95_waiting_time', 0)
+                                          for s in summaries)),
+    }
+
+
+def rank_outliers(summaries, metric_name='avg_waiting_time', top=10, threshold=3.0):
+    """
+    Поиск магазинов-выбросов по метрике
+
+    Используется устойчивая z-оценка на основе медианы и медианного
+    абсолютного отклонения, чтобы сами выбросы не искажали масштаб.
+
+    Returns:
+        list: До top словарей (store_id, значение, z-оценка), по убыванию z-оценки
+    """
+    if not summaries:
+        return []
+
+    values = np.array([s.get(metric_name, 0) for s in summaries], dtype=float)
+    median = np.median(values)
+    mad = np.median(np.abs(values - median)) * 1.4826
+    scale = mad if mad > 0 else (np.std(values) or 1.0)
+    scores = (values - median) / scale
+
+    ranked = sorted(zip(summaries, values, scores), key=lambda x: -x[2])
+    return [{'store_id': s['store_id'], metric_name: float(value), 'z_score': float(score)}
+            for s, value, score in ranked[:top] if score >= threshold]
+
+
+def run_chain(stores, base_params=None, max_workers=None, chunksize=None,
+              outlier_metric='avg_waiting_time', top_outliers=10):
+    """
+    Моделирование всех магазинов сети в пуле процессов
+
+    Args:
+        stores: список словарей параметров магазинов (см. load_store_table)
+        base_params: параметры по умолчанию для всех магазинов
+        max_workers: количество рабочих процессов
+        chunksize: количество магазинов в одном пакете задания
+        outlier_metric: метрика для поиска выбросов
+        top_outliers: максимальное число выбросов в отчете
+
+    Returns:
+        dict: 'stores' - сводки по магазинам, 'kpis' - показатели сети,
+              'outliers' - магазины-выбросы
+    """
+    tasks = []
+    for store in stores:
+        params = dict(base_params or {})
+        params.update(store)
+        tasks.append(params)
+
+    summaries = map_in_processes(_run_store, tasks, max_workers=max_workers,
+                                 chunksize=chunksize)
+    return {
+        'stores': summaries,
+        'kpis': aggregate_chain(summaries),
+        'outliers': rank_outliers(summaries, outlier_metric, top=top_outliers),
+    }
+
+
+def write_store_summaries(path, summaries):
+    """Запись сводок по магазинам в CSV"""
+    columns = ['store_id', 'num_cash_desks'] + SUMMARY_KEYS
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(summaries)
+
+
+def main():
+    """Запуск моделирования сети из командной строки"""
+    parser = argparse.ArgumentParser(description="Моделирование сети магазинов")
+    parser.add_argument('stores', help="CSV с параметрами магазинов")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="количество рабочих процессов")
+    parser.add_argument('--output', default=None,
+                        help="CSV для сводок по магазинам")
+    parser.add_argument('--outlier-metric', default='avg_waiting_time',
+                        help="метрика для поиска выбросов")
+    args = parser.parse_args()
+
+    chain = run_chain(load_store_table(args.stores), max_workers=args.workers,
+                      outlier_metric=args.outlier_metric)
+
+    print("Показатели сети:")
+    for key, value in chain['kpis'].items():
+        print(f"- {key}: {value:.3f}" if isinstance(value, float) else f"- {key}: {value}")
+
+    print("Магазины-выбросы:")
+    if not chain['outliers']:
+        print("- нет")
+    for outlier in chain['outliers']:
+        print(f"- {outlier['store_id']}: {outlier[args.outlier_metric]:.2f} "
+              f"(z = {outlier['z_score']:.1f})")
+
+    if args.output:
+        write_store_summaries(args.output, chain['stores'])
+
+
+if __name__ == "__main__":
+    main()
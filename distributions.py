@@ -0,0 +1,332 @@
+import math
+
+import numpy as np
+
+
+# Реестр распределений: имя -> построитель векторизованного генератора
+DISTRIBUTIONS = {}
+
+# Русские названия распределений для интерфейса
+DISTRIBUTION_LABELS = {
+    'normal': "Нормальное",
+    'uniform': "Равномерное",
+    'exponential': "Экспоненциальное",
+    'lognormal': "Логнормальное",
+    'gamma': "Гамма",
+    'weibull': "Вейбулла",
+    'empirical': "Эмпирическое",
+}
+
+
+def register_distribution(name):
+    """
+    Декоратор регистрации распределения
+
+    Построитель принимает генератор случайных чисел и параметры
+    (mean, std и дополнительные именованные аргументы) и возвращает
+    функцию generate(size) -> np.ndarray.
+    """
+    def decorator(builder):
+        DISTRIBUTIONS[name] = builder
+        return builder
+    return decorator
+
+
+class AliasTable:
+    """Таблица псевдонимов Уолкера для выбора дискретного исхода за O(1)"""
+
+    def __init__(self, weights):
+        """
+        Построение таблицы методом Возе за O(n)
+
+        Args:
+            weights: неотрицательные веса исходов
+        """
+        weights = np.asarray(weights, dtype=float)
+        n = len(weights)
+        scaled = weights * n / weights.sum()
+
+        self.probability = np.zeros(n)
+        self.alias = np.zeros(n, dtype=np.int64)
+
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+
+        # Остатки из-за погрешности округления получают вероятность 1
+        for i in small + large:
+            self.probability[i] = 1.0
+
+    def sample(self, rng, size):
+        """Векторизованный выбор индексов исходов"""
+        columns = rng.integers(0, len(self.probability), size)
+        accept = rng.random(size) < self.probability[columns]
+        return np.where(accept, columns, self.alias[columns])
+
+
+class EmpiricalDistribution:
+    """Эмпирическое распределение в виде гистограммы по наблюдениям"""
+
+    def __init__(self, bin_edges, counts):
+        """
+        Args:
+            bin_edges: границы интервалов гистограммы (n + 1 значение)
+            counts: количество наблюдений в интервалах (n значений)
+        """
+        self.bin_edges = np.asarray(bin_edges, dtype=float)
+        self.counts = np.asarray(counts, dtype=float)
+        self.alias_table = AliasTable(self.counts)
+
+    @classmethod
+    def from_samples(cls, samples, bins='auto'):
+        """Построение гистограммы по наблюдаемым значениям"""
+        counts, bin_edges = np.histogram(np.asarray(samples, dtype=float), bins=bins)
+        return cls(bin_edges, counts)
+
+    def mean(self):
+        """Среднее значение гистограммы"""
+        centers = (self.bin_edges[:-1] + self.bin_edges[1:]) / 2
+        return float(np.dot(centers, self.counts) / self.counts.sum())
+
+    def std(self):
+        """Стандартное отклонение гистограммы (с учетом ширины интервалов)"""
+        centers = (self.bin_edges[:-1] + self.bin_edges[1:]) / 2
+        widths = np.diff(self.bin_edges)
+        weights = self.counts / self.counts.sum()
+        second = np.dot(weights, centers ** 2 + widths ** 2 / 12)
+        return float(math.sqrt(max(second - self.mean() ** 2, 0.0)))
+
+    def sample(self, rng, size):
+        """Выбор интервала по таблице псевдонимов и равномерно внутри интервала"""
+        bins = self.alias_table.sample(rng, size)
+        low = self.bin_edges[bins]
+        return low + (self.bin_edges[bins + 1] - low) * rng.random(size)
+
+
+def _check_moments(label, mean, std=0.0):
+    """Проверка среднего (> 0) и стандартного отклонения (>= 0) распределения"""
+    if mean is None or not mean > 0:
+        raise ValueError(f"Среднее значение ({label}) должно быть положительным")
+    if std is None or not std >= 0:
+        raise ValueError(
+            f"Стандартное отклонение ({label}) не может быть отрицательным")
+
+
+@register_distribution('normal')
+def _normal(rng, mean, std, **_):
+    _check_moments("нормальное распределение", mean, std)
+    return lambda size: rng.normal(mean, std, size)
+
+
+@register_distribution('uniform')
+def _uniform(rng, mean, std, low=None, high=None, **_):
+    # Без явных границ - интервал с заданными средним и отклонением
+    if low is None or high is None:
+        _check_moments("равномерное распределение", mean, std)
+        half_width = math.sqrt(3) * std
+        low, high = mean - half_width, mean + half_width
+    elif low > high:
+        raise ValueError("Нижняя граница равномерного распределения больше верхней")
+    return lambda size: rng.uniform(low, high, size)
+
+
+@register_distribution('exponential')
+def _exponential(rng, mean, std=None, **_):
+    _check_moments("экспоненциальное распределение", mean)
+    return lambda size: rng.exponential(mean, size)
+
+
+@register_distribution('lognormal')
+def _lognormal(rng, mean, std, **_):
+    _check_moments("логнормальное распределение", mean, std)
+    sigma2 = math.log(1 + (std / mean) ** 2)
+    mu = math.log(mean) - sigma2 / 2
+    return lambda size: rng.lognormal(mu, math.sqrt(sigma2), size)
+
+
+@register_distribution('gamma')
+def _gamma(rng, mean, std, **_):
+    _check_moments("гамма-распределение", mean, std)
+    # Нулевой разброс - вырожденное распределение (постоянное значение)
+    if std == 0:
+        return lambda size: np.full(size, float(mean))
+    shape = (mean / std) ** 2
+    scale = std ** 2 / mean
+    return lambda size: rng.gamma(shape, scale, size)
+
+
+def weibull_shape(cv):
+    """
+    Параметр формы распределения Вейбулла по коэффициенту вариации
+
+    Решает уравнение cv^2 = Г(1 + 2/k) / Г(1 + 1/k)^2 - 1 делением пополам
+    (коэффициент вариации монотонно убывает по k).
+    """
+    def cv_of(k):
+        g1 = math.gamma(1 + 1 / k)
+        return math.sqrt(math.gamma(1 + 2 / k) / g1 ** 2 - 1)
+
+    low, high = 0.1, 100.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        if cv_of(middle) > cv:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+@register_distribution('weibull')
+def _weibull(rng, mean, std, **_):
+    _check_moments("распределение Вейбулла", mean, std)
+    # Нулевой разброс - вырожденное распределение (постоянное значение)
+    if std == 0:
+        return lambda size: np.full(size, float(mean))
+    shape = weibull_shape(std / mean)
+    scale = mean / math.gamma(1 + 1 / shape)
+    return lambda size: scale * rng.weibull(shape, size)
+
+
+@register_distribution('empirical')
+def _empirical(rng, mean=None, std=None, samples=None, histogram=None, **_):
+    if histogram is None:
+        if samples is None:
+            raise ValueError(
+                "Для эмпирического распределения нужны наблюдения (samples) или гистограмма")
+        histogram = EmpiricalDistribution.from_samples(samples)
+    return lambda size: histogram.sample(rng, size)
+
+
+class Sampler:
+    """
+    Генератор значений случайной величины с ограничениями
+
+    Значения генерируются векторизованно пакетами по batch_size, а метод
+    draw() выдает их по одному из буфера, поэтому стоимость одного значения
+    не зависит от сложности распределения. Генератор сериализуется pickle
+    вместе с состоянием потока случайных чисел и буфером.
+    """
+
+    def __init__(self, name, rng, lower=None, upper=None, batch_size=1024, **params):
+        """
+        Args:
+            name (str): Имя распределения из DISTRIBUTIONS
+            rng (np.random.Generator): Генератор случайных чисел
+            lower: нижняя граница значений (значения ниже заменяются ею)
+            upper: верхняя граница значений
+            batch_size: размер пакета генерации для draw()
+            **params: параметры распределения (mean, std, low, high, samples, histogram)
+        """
+        if name not in DISTRIBUTIONS:
+            raise ValueError(f"Неизвестное распределение: {name}")
+        self.name = name
+        self.rng = rng
+        self.params = params
+        self.lower = lower
+        self.upper = upper
+        self.batch_size = batch_size
+        self.generate = DISTRIBUTIONS[name](rng, **params)
+        self._buffer = []
+        self._position = 0
+        # Сумма и количество значений уже израсходованных пакетов draw()
+        self._drawn_sum = 0.0
+        self._drawn_count = 0
+
+    def __getstate__(self):
+        # Функция генерации - замыкание, она пересоздается при восстановлении
+        state = self.__dict__.copy()
+        del state['generate']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.generate = DISTRIBUTIONS[self.name](self.rng, **self.params)
+
+    def sample(self, size):
+        """Векторизованная генерация size значений"""
+        values = self.generate(size)
+        if self.lower is not None or self.upper is not None:
+            values = np.clip(values, self.lower, self.upper)
+        return values
+
+    def draw(self):
+        """Одно значение из буфера (буфер пополняется пакетом)"""
+        if self._position >= len(self._buffer):
+            self._drawn_sum += sum(self._buffer)
+            self._drawn_count += len(self._buffer)
+            self._buffer = self.sample(self.batch_size).tolist()
+            self._position = 0
+        value = self._buffer[self._position]
+        self._position += 1
+        return value
+
+    def drawn_mean(self):
+        """
+        Выборочное среднее значений, выданных draw()
+
+        Сумма накапливается при смене пакета, поэтому draw() не замедляется.
+
+        Returns:
+            float: Среднее или None, если значения не выдавались
+        """
+        count = self._drawn_count + self._position
+        if count == 0:
+            return None
+        return (self._drawn_sum + sum(self._buffer[:self._position])) / count
+
+
+def make_sampler(name, rng, mean=None, std=None, lower=None, upper=None,
+                 batch_size=1024, **kwargs):
+    """
+    Создание генератора по имени распределения из реестра
+
+    Args:
+        name (str): Имя распределения из DISTRIBUTIONS
+        rng (np.random.Generator): Генератор случайных чисел
+        mean, std: Среднее и стандартное отклонение
+        lower, upper: Ограничения значений
+        batch_size: Размер пакета генерации
+        **kwargs: Дополнительные параметры распределения (low, high, samples, histogram)
+    """
+    return Sampler(name, rng, lower=lower, upper=upper, batch_size=batch_size,
+                   mean=mean, std=std, **kwargs)
+
+
+def fit_distribution(samples, name, prefix):
+    """
+    Подбор параметров распределения по наблюдениям методом моментов
+
+    Args:
+        samples: Наблюдаемые значения
+        name (str): Имя распределения из DISTRIBUTIONS
+        prefix (str): Префикс параметров модели ('shopping_time' или 'service_time')
+
+    Returns:
+        dict: Параметры модели (например, service_time_dist, service_time_mean,
+            service_time_std; для равномерного также _min и _max, для
+            эмпирического - _samples)
+    """
+    samples = np.asarray(samples, dtype=float)
+    samples = samples[np.isfinite(samples)]
+    if len(samples) < 2:
+        raise ValueError("Для подбора распределения нужно хотя бы два наблюдения")
+
+    params = {
+        f'{prefix}_dist': name,
+        f'{prefix}_mean': float(samples.mean()),
+        f'{prefix}_std': float(samples.std(ddof=1)),
+    }
+    if name == 'uniform':
+        params[f'{prefix}_min'] = float(samples.min())
+        params[f'{prefix}_max'] = float(samples.max())
+    elif name == 'empirical':
+        params[f'{prefix}_samples'] = samples.tolist()
+    return params
@@ -0,0 +1,462 @@
+import copy
+import heapq
+import pickle
+from collections import defaultdict, deque
+
+import numpy as np
+
+import events
+from simulation import ShopSimulation, working_time
+from sketches import StreamingSummary
+from parallel import map_in_processes
+
+
+# Типы событий календаря
+ARRIVAL = 0      # прибытие покупателя
+QUEUE_JOIN = 1   # покупатель закончил выбор товаров и встает в очередь
+SERVICE_END = 2  # окончание обслуживания на кассе
+MONITOR = 3      # отсчет мониторинга длины очереди
+DESK_CHANGE = 4  # изменение количества открытых касс по графику
+RENEGE = 5       # истечение терпения покупателя в очереди
+
+# Параметры, от которых зависят генераторы случайных величин
+SAMPLER_PARAMS = {
+    'customer_arrival_mean': float,
+    'shopping_time_dist': str,
+    'shopping_time_mean': float,
+    'shopping_time_std': float,
+    'shopping_time_min': float,
+    'shopping_time_max': float,
+    'service_time_dist': str,
+    'service_time_mean': float,
+    'service_time_std': float,
+    'patience_mean': float,
+}
+
+# Генератор, который пересоздается при изменении параметра в ветви
+PARAM_SAMPLERS = {
+    'customer_arrival_mean': 'interarrival_sampler',
+    'shopping_time_dist': 'shopping_sampler',
+    'shopping_time_mean': 'shopping_sampler',
+    'shopping_time_std': 'shopping_sampler',
+    'shopping_time_min': 'shopping_sampler',
+    'shopping_time_max': 'shopping_sampler',
+    'service_time_dist': 'service_sampler',
+    'service_time_mean': 'service_sampler',
+    'service_time_std': 'service_sampler',
+    'patience_mean': 'patience_sampler',
+}
+
+
+class EventShopSimulation(ShopSimulation):
+    """
+    Событийная модель магазина с сериализуемым состоянием
+
+    Реализует ту же модель, что и ShopSimulation, но вместо генераторов SimPy
+    хранит календарь событий в явном виде (куча кортежей), очередь покупателей
+    и состояние касс. Поэтому модель можно в любой момент модельного времени
+    сохранить (pickle) вместе с состоянием потоков случайных чисел и накопленной
+    статистикой, а затем продолжить или породить от нее ветви с другими
+    параметрами.
+
+    Дополнительно поддерживается график работы касс (параметр 'desk_schedule':
+    список пар (момент времени, количество открытых касс)) и почасовая
+    статистика ожидания (по часу постановки в очередь).
+    """
+
+    def __init__(self, params):
+        super().__init__(params)
+        if self.arrival_trace is not None:
+            raise ValueError(
+                "Воспроизведение журнала прибытий не поддерживается событийной моделью")
+
+        # Среда SimPy не используется, ее состояние не сериализуется
+        self.env = None
+        self.cash_desks = None
+
+        self.now = 0.0
+        self.events = []
+        self._sequence = 0
+        self.waiting = deque()
+        # Номера покупателей, которые сейчас ждут в очереди (ушедшие по
+        # истечении терпения удаляются отсюда, а из deque - при извлечении)
+        self.waiting_ids = set()
+        self.busy_desks = 0
+        self.desk_open = [True] * self.num_cash_desks
+        self.customer_id = 0
+        self._started = False
+
+        # Менялось ли количество касс (по графику или в ветви): тогда загрузка
+        # считается по времени, когда каждая касса была открыта
+        self.desks_changed = False
+
+        # График работы касс: список (момент, количество касс)
+        self.desk_schedule = sorted(
+            (float(t), int(n)) for t, n in params.get('desk_schedule', []))
+        if self.desk_schedule and self.desk_schedule[0][0] <= 0:
+            self.set_num_cash_desks(self.desk_schedule[0][1])
+
+        # Учет времени, в течение которого каждая касса была открыта
+        self.desk_opened_at = [0.0] * len(self.desk_open)
+        self.desk_open_time = [0.0] * len(self.desk_open)
+
+        # Время ожидания по часу постановки в очередь
+        self.hourly_waits = defaultdict(list)
+
+    def _schedule(self, time, kind, data=None):
+        """Добавление события в календарь"""
+        heapq.heappush(self.events, (time, self._sequence, kind, data))
+        self._sequence += 1
+
+    def _record_queue_length(self):
+        """Запись длины очереди (ожидающие и обслуживаемые покупатели)"""
+        self.stats['queue_lengths'][int(self.now)] = len(
+            self.waiting_ids) + self.busy_desks
+
+    def _free_desk(self):
+        """Номер свободной открытой кассы с наименьшим номером или None"""
+        for i in range(len(self.desk_open)):
+            if self.desk_open[i] and not self.cash_desk_active[i]:
+                return i
+        return None
+
+    def _start_service(self, desk_id, customer_id, arrival_time, queue_join_time):
+        """Начало обслуживания покупателя на кассе"""
+        waiting_time = self.now - queue_join_time
+        self.stats['waiting_times'].append(waiting_time)
+        self.hourly_waits[int(queue_join_time // 60)].append(waiting_time)
+        service_time = self.generate_service_time()
+
+        self.cash_desk_active[desk_id] = True
+        self.busy_desks += 1
+        self.stats['cash_desk_usage'][desk_id].append(
+            (self.now, self.now + service_time))
+        self._emit(events.SERVICE_START, customer_id, desk_id, waiting_time)
+        self._schedule(self.now + service_time, SERVICE_END,
+                       (desk_id, arrival_time, customer_id))
+
+    def _start_waiting_customers(self):
+        """Направление ожидающих покупателей на освободившиеся кассы"""
+        while self.waiting:
+            if self.waiting[0][0] not in self.waiting_ids:
+                # Покупатель уже ушел из очереди
+                self.waiting.popleft()
+                continue
+            desk_id = self._free_desk()
+            if desk_id is None:
+                break
+            customer = self.waiting.popleft()
+            self.waiting_ids.discard(customer[0])
+            self._start_service(desk_id, *customer)
+
+    def _handle(self, kind, data):
+        """Обработка одного события календаря"""
+        if kind == ARRIVAL:
+            self.customer_id += 1
+            self.stats['customer_arrivals'] += 1
+            if self._admit_customer(self.customer_id):
+                self._record_queue_length()
+                self._schedule(self.now + self.generate_shopping_time(), QUEUE_JOIN,
+                               (self.customer_id, self.now))
+            self._schedule(self.now + self.interarrival_sampler.draw(), ARRIVAL)
+
+        elif kind == QUEUE_JOIN:
+            customer_id, arrival_time = data
+            self._record_queue_length()
+            if self.balk_queue_length and len(self.waiting_ids) >= self.balk_queue_length:
+                self.stats['customers_balked'] += 1
+                self.customers_in_shop -= 1
+                self._emit(events.BALK, customer_id)
+                return
+            self._emit(events.QUEUE_JOIN, customer_id)
+            self.waiting.append((customer_id, arrival_time, self.now))
+            self.waiting_ids.add(customer_id)
+            if self.patience_sampler is not None:
+                self._schedule(self.now + self.patience_sampler.draw(), RENEGE,
+                               customer_id)
+            self._start_waiting_customers()
+
+        elif kind == RENEGE:
+            if data in self.waiting_ids:
+                self.waiting_ids.discard(data)
+                self.stats['customers_reneged'] += 1
+                self.customers_in_shop -= 1
+                self._record_queue_length()
+                self._emit(events.RENEGE, data)
+
+        elif kind == SERVICE_END:
+            desk_id, arrival_time, customer_id = data
+            self.cash_desk_active[desk_id] = False
+            self.busy_desks -= 1
+            self.stats['total_time_in_shop'].append(self.now - arrival_time)
+            self.stats['customers_served'] += 1
+            self.customers_in_shop -= 1
+            self._emit(events.SERVICE_END, customer_id, desk_id)
+            self._emit(events.DEPARTURE, customer_id, value=self.now - arrival_time)
+            self._start_waiting_customers()
+            self._record_queue_length()
+
+        elif kind == DESK_CHANGE:
+            self.set_num_cash_desks(data)
+
+        elif kind == MONITOR:
+            if self.now > 0:
+                self.stats['current_time'] = self.now
+            self._record_queue_length()
+            if self._check_stability(len(self.waiting_ids) + self.busy_desks):
+                # Досрочная остановка: календарь больше не обрабатывается
+                return
+            self._schedule(self.now + 1, MONITOR)
+
+    def _start(self):
+        """Планирование начальных событий"""
+        self._started = True
+        self._schedule(self.interarrival_sampler.draw(), ARRIVAL)
+        self._schedule(0.0, MONITOR)
+        for time, num_cash_desks in self.desk_schedule:
+            if time > 0:
+                self._schedule(time, DESK_CHANGE, num_cash_desks)
+
+    def run_until(self, until):
+        """
+        Продвижение модели до момента until (события в момент until не обрабатываются)
+
+        Args:
+            until (float): Момент модельного времени
+        """
+        if not self._started:
+            self._start()
+        calendar = self.events
+        while calendar and calendar[0][0] < until and self.stopped_at is None:
+            time, _, kind, data = heapq.heappop(calendar)
+            self.now = time
+            self._handle(kind, data)
+        if self.stopped_at is None:
+            self.now = max(self.now, until)
+
+    def run_simulation(self):
+        """Запуск (или продолжение) симуляции до конца заданного времени"""
+        self.run_until(self.simulation_time)
+        self.calculate_results()
+        return self.results
+
+    def iter_events(self, kinds=None, keep_stats=True):
+        """
+        Потоковое выполнение (или продолжение) симуляции с выдачей событий
+
+        См. ShopSimulation.iter_events: события календаря обрабатываются
+        по одному по мере чтения потока.
+        """
+        if not keep_stats:
+            self.use_streaming_stats()
+        wanted = set(kinds) if kinds is not None else None
+        sink = self._event_sink = deque()
+        try:
+            if not self._started:
+                self._start()
+            calendar = self.events
+            while (calendar and calendar[0][0] < self.simulation_time
+                   and self.stopped_at is None):
+                time, _, kind, data = heapq.heappop(calendar)
+                self.now = time
+                self._handle(kind, data)
+                while sink:
+                    event = sink.popleft()
+                    if wanted is None or event.kind in wanted:
+                        yield event
+            if self.stopped_at is None:
+                self.now = max(self.now, self.simulation_time)
+        finally:
+            self._event_sink = None
+        self.calculate_results()
+
+    def _current_time(self):
+        """Текущий момент модельного времени"""
+        return self.now
+
+    def use_streaming_stats(self):
+        """См. ShopSimulation.use_streaming_stats; почасовые ожидания тоже накапливаются"""
+        if not self.keep_stats:
+            return
+        super().use_streaming_stats()
+        hourly_waits = defaultdict(StreamingSummary)
+        for hour, waits in self.hourly_waits.items():
+            for wait in waits:
+                hourly_waits[hour].append(wait)
+        self.hourly_waits = hourly_waits
+
+    def set_num_cash_desks(self, num_cash_desks):
+        """
+        Изменение количества открытых касс в текущий момент
+
+        Закрываемые кассы дообслуживают текущих покупателей, но новых
+        не принимают. Новые кассы сразу начинают обслуживать очередь.
+        """
+        num_cash_desks = int(num_cash_desks)
+        if num_cash_desks != self.num_cash_desks:
+            self.desks_changed = True
+        opened_at = getattr(self, 'desk_opened_at', None)
+        while len(self.desk_open) < num_cash_desks:
+            self.desk_open.append(False)
+            self.cash_desk_active.append(False)
+            if opened_at is not None:
+                opened_at.append(self.now)
+                self.desk_open_time.append(0.0)
+        for i in range(len(self.desk_open)):
+            is_open = i < num_cash_desks
+            if opened_at is not None and is_open != self.desk_open[i]:
+                if is_open:
+                    opened_at[i] = self.now
+                else:
+                    self.desk_open_time[i] += self.now - opened_at[i]
+            self.desk_open[i] = is_open
+        self.num_cash_desks = num_cash_desks
+        self.available_cash_desks = list(range(num_cash_desks))
+        if self._started:
+            self._start_waiting_customers()
+
+    def calculate_results(self):
+        """Расчет результатов с учетом графика касс и почасовой статистики"""
+        super().calculate_results()
+
+        # Покупатели, не дождавшиеся обслуживания, учитываются в почасовой
+        # статистике с текущим (цензурированным) временем ожидания
+        if self.keep_stats:
+            hourly = defaultdict(list)
+            for hour, waits in self.hourly_waits.items():
+                hourly[hour].extend(waits)
+        else:
+            # Копия накопителей: модель можно продолжить после расчета
+            hourly = copy.deepcopy(self.hourly_waits)
+        for customer_id, _, queue_join_time in self.waiting:
+            if customer_id in self.waiting_ids:
+                hourly[int(queue_join_time // 60)].append(
+                    self.now - queue_join_time)
+
+        hours = int(np.ceil(self.simulation_time / 60))
+        if self.keep_stats:
+            self.results['hourly_avg_waiting_time'] = [
+                float(np.mean(hourly[h])) if hourly.get(h) else 0.0 for h in range(hours)]
+            self.results['hourly_p95_waiting_time'] = [
+                float(np.percentile(hourly[h], 95)) if hourly.get(h) else 0.0
+                for h in range(hours)]
+        else:
+            self.results['hourly_avg_waiting_time'] = [
+                hourly[h].mean() if hourly.get(h) else 0.0 for h in range(hours)]
+            self.results['hourly_p95_waiting_time'] = [
+                hourly[h].quantile.value() if hourly.get(h) else 0.0 for h in range(hours)]
+
+        if not self.desk_schedule and not self.desks_changed:
+            return
+
+        # Загрузка касс относительно времени, когда каждая касса была открыта
+        # (включая кассы, закрытые к концу прогона)
+        open_time = list(self.desk_open_time)
+        for i, is_open in enumerate(self.desk_open):
+            if is_open:
+                open_time[i] += self.observed_time() - self.desk_opened_at[i]
+
+        utilization = {}
+        total_working_time = 0.0
+        for desk_id in range(len(self.desk_open)):
+            desk_working_time = working_time(self.stats['cash_desk_usage'][desk_id],
+                                             self.observed_time())
+            total_working_time += desk_working_time
+            utilization[desk_id] = desk_working_time / \
+                open_time[desk_id] if open_time[desk_id] > 0 else 0.0
+
+        self.results['cash_desk_utilization'] = utilization
+        self.results['avg_cash_desk_utilization'] = total_working_time / \
+            sum(open_time) if sum(open_time) > 0 else 0
+        self.results['desk_minutes'] = float(sum(open_time))
+
+    def apply_changes(self, changes):
+        """
+        Изменение параметров модели в текущий момент модельного времени
+
+        Поддерживаются параметры распределений, 'num_cash_desks',
+        'simulation_time', ограничения очереди и 'seed' (новые потоки
+        случайных чисел для ветви). При изменении параметров распределения
+        пересоздается только его генератор, остальные генераторы сохраняют
+        состояние потоков и буферы, поэтому ветви сравнимы с родительской
+        моделью и между собой.
+        """
+        rebuild_samplers = False
+        changed_samplers = set()
+        for name, value in changes.items():
+            if name == 'num_cash_desks':
+                self.set_num_cash_desks(value)
+            elif name == 'simulation_time':
+                self.simulation_time = float(value)
+            elif name == 'seed':
+                self.seed = int(value)
+                self._init_random_streams()
+                rebuild_samplers = True
+            elif name in ('balk_queue_length', 'max_customers_in_shop'):
+                setattr(self, name, value)
+            elif name in SAMPLER_PARAMS:
+                setattr(self, name, SAMPLER_PARAMS[name](value))
+                changed_samplers.add(PARAM_SAMPLERS[name])
+            else:
+                raise ValueError(f"Параметр нельзя изменить в ветви: {name}")
+        if rebuild_samplers:
+            self._create_samplers()
+        elif changed_samplers:
+            kept = {attribute: getattr(self, attribute) for attribute in set(PARAM_SAMPLERS.values())
+                    if attribute not in changed_samplers}
+            self._create_samplers()
+            for attribute, sampler in kept.items():
+                setattr(self, attribute, sampler)
+
+    def snapshot(self):
+        """Сохранение полного состояния модели в байты"""
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def restore(data):
+        """Восстановление модели из сохраненного состояния"""
+        return pickle.loads(data)
+
+    def fork(self, changes=None):
+        """
+        Создание независимой ветви модели из текущего состояния
+
+        Args:
+            changes (dict): Параметры, изменяемые в ветви
+
+        Returns:
+            EventShopSimulation: Копия модели с примененными изменениями
+        """
+        branch = self.restore(self.snapshot())
+        if changes:
+            branch.apply_changes(changes)
+        return branch
+
+
+def _run_branch(task):
+    """Прогон одной ветви в рабочем процессе"""
+    snapshot, changes = task
+    branch = EventShopSimulation.restore(snapshot)
+    if changes:
+        branch.apply_changes(changes)
+    return branch.run_simulation()
+
+
+def run_branches(params, fork_time, branches, max_workers=None):
+    """
+    Прогон общей части модели один раз и ветвей "что если" от нее
+
+    Args:
+        params (dict): Параметры модели
+        fork_time (float): Момент модельного времени, в котором создаются ветви
+        branches (list): Список словарей изменяемых параметров для ветвей
+        max_workers (int): Количество процессов для ветвей
+
+    Returns:
+        list: Результаты для каждой ветви
+    """
+    model = EventShopSimulation(params)
+    model.run_until(fork_time)
+    snapshot = model.snapshot()
+    return map_in_processes(_run_branch, [(snapshot, changes) for changes in branches],
+                            max_workers=max_workers)
@@ -0,0 +1,47 @@
+import json
+from collections import namedtuple
+
+
+# Типы событий потока модели
+ARRIVAL = 'arrival'                # покупатель вошел в магазин
+REJECT = 'reject'                  # покупатель не впущен (магазин заполнен)
+QUEUE_JOIN = 'queue_join'          # покупатель выбрал товары и встал в очередь
+BALK = 'balk'                      # покупатель ушел, увидев длинную очередь
+RENEGE = 'renege'                  # покупатель ушел из очереди, не дождавшись
+SERVICE_START = 'service_start'    # начало обслуживания на кассе
+SERVICE_END = 'service_end'        # окончание обслуживания на кассе
+DEPARTURE = 'departure'            # обслуженный покупатель покинул магазин
+
+EVENT_KINDS = (ARRIVAL, REJECT, QUEUE_JOIN, BALK, RENEGE,
+               SERVICE_START, SERVICE_END, DEPARTURE)
+
+# Событие модели: момент времени, тип, номер покупателя, номер кассы
+# (для событий обслуживания) и значение: время ожидания для SERVICE_START,
+# время в магазине для DEPARTURE, иначе None
+SimulationEvent = namedtuple(
+    'SimulationEvent', ['time', 'kind', 'customer_id', 'desk_id', 'value'])
+
+
+def write_events_jsonl(events, stream, flush_every=1):
+    """
+    Запись потока событий в формате JSON Lines
+
+    Подходит для файлов и сокетов (socket.makefile('w')): каждое событие
+    записывается отдельной строкой сразу после получения.
+
+    Args:
+        events: итерируемый поток SimulationEvent (например, iter_events())
+        stream: текстовый поток с методами write и flush
+        flush_every (int): Сбрасывать буфер потока каждые N событий
+
+    Returns:
+        int: Количество записанных событий
+    """
+    count = 0
+    for event in events:
+        stream.write(json.dumps(event._asdict(), ensure_ascii=False) + '\n')
+        count += 1
+        if flush_every and count % flush_every == 0:
+            stream.flush()
+    stream.flush()
+    return count
@@ -1,12 +1,39 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import json
+import multiprocessing
 import threading
 import numpy as np
 
 from simulation import ShopSimulation
+from engine import EventShopSimulation
+from replications import (confidence_interval, control_variate_estimates, replicate_time_series,
+                          replication_params)
 from visualization import SimulationVisualizer
+from optimization import find_min_cash_desks, optimize_desk_schedule
+from metamodel import SweepMetamodel
+from analytic import analytic_results, compare_with_simulation, prune_infeasible_points
+from sweep import adaptive_sweep
+from sensitivity import sobol_sensitivity
+from rare_events import estimate_tail_probability
+from arrivals import CsvArrivalTrace
+from distributions import DISTRIBUTION_LABELS, fit_distribution
+from parallel import map_simulations_shared, summarize_results
+from shared_results import ResultStore
+from report import generate_report
+from calibration import calibrate_parameters
+from upstream import UPSTREAM_PARAMS, simulate_with_schedule
+
+
+# Живой предпросмотр: задержка после последней правки параметров (мс),
+# горизонт быстрого прогона (мин), количество репликаций уточнения и шаг
+# модельного времени (мин), после которого проверяется отмена прогона
+PREVIEW_DEBOUNCE_MS = 300
+PREVIEW_FAST_TIME = 480.0
+PREVIEW_REPLICATIONS = 10
+PREVIEW_TIME_STEP = 60.0
 
 
 class ShopSimulatorGUI:
@@ -38,14 +65,23 @@ class ShopSimulatorGUI:
 
         # Результаты симуляции
         self.simulation_results = None
+        self.simulation_params = None
         self.experiment_results = []
         self.experiment_param_values = []
+        self.experiment_metamodel = None
+        self.experiment_metric_name = None
+        self.experiment_pruned_values = []
+        self.experiment_base_params = None
+        self.experiment_param_name = None
+        # Хранилище массивов результатов эксперимента из рабочих процессов
+        self.experiment_store = ResultStore()
 
         # Флаги состояния симуляции
         self.is_simulating = False
 
         # Текущий отображаемый график
         self.current_canvas = None
+        self.calibration_result = None
 
     def _init_simulation_tab(self):
         """Инициализация вкладки настройки и запуска симуляции"""
@@ -72,6 +108,13 @@ class ShopSimulatorGUI:
         ttk.Entry(params_grid, textvariable=self.seed_var, width=10).grid(
             row=0, column=3, padx=5, pady=5, sticky="w")
 
+        # Ширина интервала статистики по времени суток (пусто - не собирать)
+        ttk.Label(params_grid, text="Интервал статистики (мин):").grid(
+            row=0, column=4, sticky="w", padx=5, pady=5)
+        self.interval_width_var = tk.StringVar(value="60")
+        ttk.Entry(params_grid, textvariable=self.interval_width_var, width=10).grid(
+            row=0, column=5, padx=5, pady=5, sticky="w")
+
         # Параметры покупателей
         ttk.Label(params_grid, text="Среднее время между прибытиями (мин):").grid(
             row=1, column=0, sticky="w", padx=5, pady=5)
@@ -79,6 +122,15 @@ class ShopSimulatorGUI:
         ttk.Entry(params_grid, textvariable=self.arrival_mean_var, width=10).grid(
             row=1, column=1, padx=5, pady=5, sticky="w")
 
+        # Журнал прибытий для воспроизведения вместо генерации
+        ttk.Label(params_grid, text="Журнал прибытий (CSV):").grid(
+            row=1, column=2, sticky="w", padx=5, pady=5)
+        self.arrival_trace_var = tk.StringVar(value="")
+        ttk.Entry(params_grid, textvariable=self.arrival_trace_var, width=30).grid(
+            row=1, column=3, padx=5, pady=5, sticky="w")
+        ttk.Button(params_grid, text="Обзор...", command=self._choose_arrival_trace).grid(
+            row=1, column=4, padx=5, pady=5, sticky="w")
+
         # Параметры выбора товаров
         shopping_frame = ttk.LabelFrame(
             params_frame, text="Параметры времени выбора товаров")
@@ -89,7 +141,9 @@ class ShopSimulatorGUI:
             row=0, column=0, sticky="w", padx=5, pady=5)
         self.shopping_dist_var = tk.StringVar(value="Нормальное")
         shopping_dist_combo = ttk.Combobox(shopping_frame, textvariable=self.shopping_dist_var,
-                                           values=["Нормальное", "Равномерное", "Экспоненциальное"], width=20, state="readonly")
+                                           values=["Нормальное", "Равномерное", "Экспоненциальное",
+                                                   "Логнормальное", "Гамма", "Вейбулла",
+                                                   "Эмпирическое"], width=20, state="readonly")
         shopping_dist_combo.grid(row=0, column=1, padx=5, pady=5, sticky="w")
 
         # Среднее время выбора товаров
@@ -99,6 +153,14 @@ class ShopSimulatorGUI:
         ttk.Entry(shopping_frame, textvariable=self.shopping_mean_var, width=10).grid(
             row=0, column=3, padx=5, pady=5, sticky="w")
 
+        # Подбор параметров по наблюдениям (для эмпирического - сами наблюдения)
+        ttk.Button(shopping_frame, text="Из наблюдений...",
+                   command=lambda: self._load_observations('shopping_time')).grid(
+            row=0, column=4, padx=5, pady=5, sticky="w")
+        self.shopping_observations_var = tk.StringVar(value="")
+        ttk.Label(shopping_frame, textvariable=self.shopping_observations_var).grid(
+            row=0, column=5, sticky="w", padx=5, pady=5)
+
         # Стандартное отклонение времени выбора товаров
         ttk.Label(shopping_frame, text="Стандартное отклонение (мин):").grid(
             row=1, column=0, sticky="w", padx=5, pady=5)
@@ -135,7 +197,9 @@ class ShopSimulatorGUI:
             row=0, column=2, sticky="w", padx=5, pady=5)
         self.service_dist_var = tk.StringVar(value="Экспоненциальное")
         service_dist_combo = ttk.Combobox(cashdesk_frame, textvariable=self.service_dist_var,
-                                          values=["Экспоненциальное", "Нормальное"], width=20, state="readonly")
+                                          values=["Экспоненциальное", "Нормальное", "Логнормальное",
+                                                  "Гамма", "Вейбулла", "Эмпирическое"],
+                                          width=20, state="readonly")
         service_dist_combo.grid(row=0, column=3, padx=5, pady=5, sticky="w")
 
         # Среднее время обслуживания
@@ -152,6 +216,39 @@ class ShopSimulatorGUI:
         ttk.Entry(cashdesk_frame, textvariable=self.service_std_var, width=10).grid(
             row=1, column=3, padx=5, pady=5, sticky="w")
 
+        ttk.Button(cashdesk_frame, text="Из наблюдений...",
+                   command=lambda: self._load_observations('service_time')).grid(
+            row=1, column=4, padx=5, pady=5, sticky="w")
+        self.service_observations_var = tk.StringVar(value="")
+        ttk.Label(cashdesk_frame, textvariable=self.service_observations_var).grid(
+            row=1, column=5, sticky="w", padx=5, pady=5)
+
+        # Наблюдаемые значения по этапам ('shopping_time', 'service_time')
+        self.observed_samples = {}
+
+        # Ограничения при перегрузке (пустое значение - без ограничения)
+        overload_frame = ttk.LabelFrame(
+            params_frame, text="Ограничения при перегрузке (пусто - без ограничения)")
+        overload_frame.pack(padx=10, pady=5, fill="x")
+
+        ttk.Label(overload_frame, text="Уход при очереди от (чел.):").grid(
+            row=0, column=0, sticky="w", padx=5, pady=5)
+        self.balk_queue_var = tk.StringVar(value="")
+        ttk.Entry(overload_frame, textvariable=self.balk_queue_var, width=10).grid(
+            row=0, column=1, padx=5, pady=5, sticky="w")
+
+        ttk.Label(overload_frame, text="Среднее терпение в очереди (мин):").grid(
+            row=0, column=2, sticky="w", padx=5, pady=5)
+        self.patience_mean_var = tk.StringVar(value="")
+        ttk.Entry(overload_frame, textvariable=self.patience_mean_var, width=10).grid(
+            row=0, column=3, padx=5, pady=5, sticky="w")
+
+        ttk.Label(overload_frame, text="Макс. покупателей в магазине:").grid(
+            row=0, column=4, sticky="w", padx=5, pady=5)
+        self.max_in_shop_var = tk.StringVar(value="")
+        ttk.Entry(overload_frame, textvariable=self.max_in_shop_var, width=10).grid(
+            row=0, column=5, padx=5, pady=5, sticky="w")
+
         # Кнопки управления
         control_frame = ttk.Frame(self.tab_simulation)
         control_frame.pack(padx=10, pady=10, fill="x")
@@ -163,6 +260,35 @@ class ShopSimulatorGUI:
         ttk.Button(control_frame, text="Просмотреть результаты",
                    command=lambda: self.tab_control.select(self.tab_results)).pack(side="left", padx=5)
 
+        ttk.Button(control_frame, text="Аналитическая оценка",
+                   command=self.show_analytic_preview).pack(side="left", padx=5)
+
+        self.live_preview_enabled_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(control_frame, text="Живой предпросмотр",
+                        variable=self.live_preview_enabled_var,
+                        command=self._on_live_preview_toggle).pack(side="left", padx=5)
+
+        # Мгновенная аналитическая оценка показателей
+        self.analytic_preview_var = tk.StringVar(value="")
+        ttk.Label(self.tab_simulation, textvariable=self.analytic_preview_var,
+                  justify="left").pack(padx=15, pady=5, anchor="w")
+
+        # Оценка живого предпросмотра, уточняемая в фоне
+        self.live_preview_var = tk.StringVar(value="")
+        ttk.Label(self.tab_simulation, textvariable=self.live_preview_var,
+                  justify="left").pack(padx=15, pady=5, anchor="w")
+
+        # Пересчет предпросмотра при любом изменении параметров
+        self._preview_after_id = None
+        self._preview_cancel = None
+        for var in (self.simulation_time_var, self.seed_var, self.arrival_mean_var,
+                    self.arrival_trace_var, self.shopping_dist_var, self.shopping_mean_var,
+                    self.shopping_std_var, self.shopping_min_var, self.shopping_max_var,
+                    self.cash_desks_var, self.service_dist_var, self.service_mean_var,
+                    self.service_std_var, self.balk_queue_var, self.patience_mean_var,
+                    self.max_in_shop_var):
+            var.trace_add('write', self._on_param_change)
+
     def _init_experiment_tab(self):
         """Инициализация вкладки настройки и запуска экспериментов"""
         experiment_frame = ttk.LabelFrame(
@@ -209,12 +335,236 @@ class ShopSimulatorGUI:
                                     width=25, state="readonly")
         metric_combo.grid(row=0, column=3, padx=5, pady=5, sticky="w")
 
+        # Адаптивный выбор точек вместо равномерной сетки с заданным шагом
+        self.adaptive_sweep_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(experiment_frame, text="Адаптивный выбор точек (шаг не используется)",
+                        variable=self.adaptive_sweep_var).grid(
+            row=1, column=2, columnspan=2, padx=5, pady=5, sticky="w")
+
+        ttk.Label(experiment_frame, text="Бюджет прогонов:").grid(
+            row=2, column=2, sticky="w", padx=5, pady=5)
+        self.adaptive_budget_var = tk.StringVar(value="12")
+        ttk.Entry(experiment_frame, textvariable=self.adaptive_budget_var, width=10).grid(
+            row=2, column=3, padx=5, pady=5, sticky="w")
+
         # Кнопка запуска эксперимента
         self.run_experiment_button = ttk.Button(experiment_frame, text="Запустить эксперимент",
                                                 command=self.run_experiment)
         self.run_experiment_button.grid(
             row=4, column=0, columnspan=2, padx=5, pady=10, sticky="w")
 
+        # Отбрасывание заведомо перегруженных точек по аналитической оценке
+        self.prune_unstable_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(experiment_frame, text="Пропускать перегруженные точки",
+                        variable=self.prune_unstable_var).grid(
+            row=4, column=2, columnspan=2, padx=5, pady=10, sticky="w")
+
+        # Сохранение результатов эксперимента вместе с метамоделью
+        ttk.Button(experiment_frame, text="Сохранить эксперимент",
+                   command=self.save_experiment).grid(
+            row=5, column=0, padx=5, pady=5, sticky="w")
+        ttk.Button(experiment_frame, text="Загрузить эксперимент",
+                   command=self.load_experiment).grid(
+            row=5, column=1, padx=5, pady=5, sticky="w")
+
+        # Подбор минимального количества касс по SLA
+        staffing_frame = ttk.LabelFrame(
+            self.tab_experiment, text="Подбор минимального количества касс (SLA)")
+        staffing_frame.pack(padx=10, pady=5, fill="x")
+
+        ttk.Label(staffing_frame, text="Целевое ожидание p95 (мин):").grid(
+            row=0, column=0, sticky="w", padx=5, pady=5)
+        self.sla_target_var = tk.StringVar(value="5")
+        ttk.Entry(staffing_frame, textvariable=self.sla_target_var, width=10).grid(
+            row=0, column=1, padx=5, pady=5, sticky="w")
+
+        ttk.Label(staffing_frame, text="Максимум касс:").grid(
+            row=0, column=2, sticky="w", padx=5, pady=5)
+        self.sla_max_desks_var = tk.StringVar(value="20")
+        ttk.Entry(staffing_frame, textvariable=self.sla_max_desks_var, width=10).grid(
+            row=0, column=3, padx=5, pady=5, sticky="w")
+
+        self.run_staffing_button = ttk.Button(staffing_frame, text="Подобрать количество касс",
+                                              command=self.run_staffing_search)
+        self.run_staffing_button.grid(
+            row=0, column=4, padx=5, pady=5, sticky="w")
+
+        # Оптимизация графика работы касс по сменам
+        schedule_frame = ttk.LabelFrame(
+            self.tab_experiment, text="Оптимизация графика работы касс")
+        schedule_frame.pack(padx=10, pady=5, fill="x")
+
+        ttk.Label(schedule_frame, text="Допустимое ожидание в каждом часе (мин):").grid(
+            row=0, column=0, sticky="w", padx=5, pady=5)
+        self.schedule_target_var = tk.StringVar(value="3")
+        ttk.Entry(schedule_frame, textvariable=self.schedule_target_var, width=10).grid(
+            row=0, column=1, padx=5, pady=5, sticky="w")
+
+        ttk.Label(schedule_frame, text="Длительность блока смены (мин):").grid(
+            row=0, column=2, sticky="w", padx=5, pady=5)
+        self.schedule_block_var = tk.StringVar(value="60")
+        ttk.Entry(schedule_frame, textvariable=self.schedule_block_var, width=10).grid(
+            row=0, column=3, padx=5, pady=5, sticky="w")
+
+        self.run_schedule_button = ttk.Button(schedule_frame, text="Оптимизировать график",
+                                              command=self.run_schedule_optimization)
+        self.run_schedule_button.grid(
+            row=0, column=4, padx=5, pady=5, sticky="w")
+
+        # Глобальный анализ чувствительности по всем параметрам модели
+        sensitivity_frame = ttk.LabelFrame(
+            self.tab_experiment, text="Анализ чувствительности (индексы Соболя)")
+        sensitivity_frame.pack(padx=10, pady=5, fill="x")
+
+        ttk.Label(sensitivity_frame, text="Базовых точек плана:").grid(
+            row=0, column=0, sticky="w", padx=5, pady=5)
+        self.sensitivity_samples_var = tk.StringVar(value="128")
+        ttk.Entry(sensitivity_frame, textvariable=self.sensitivity_samples_var, width=10).grid(
+            row=0, column=1, padx=5, pady=5, sticky="w")
+
+        ttk.Label(sensitivity_frame, text="Разброс параметров (%):").grid(
+            row=0, column=2, sticky="w", padx=5, pady=5)
+        self.sensitivity_spread_var = tk.StringVar(value="25")
+        ttk.Entry(sensitivity_frame, textvariable=self.sensitivity_spread_var, width=10).grid(
+            row=0, column=3, padx=5, pady=5, sticky="w")
+
+        self.run_sensitivity_button = ttk.Button(sensitivity_frame, text="Анализ чувствительности",
+                                                 command=self.run_sensitivity_analysis)
+        self.run_sensitivity_button.grid(
+            row=0, column=4, padx=5, pady=5, sticky="w")
+
+        # Вероятность редкого события "ожидание больше порога"
+        tail_frame = ttk.LabelFrame(
+            self.tab_experiment, text="Вероятность долгого ожидания (редкие события)")
+        tail_frame.pack(padx=10, pady=5, fill="x")
+
+        ttk.Label(tail_frame, text="Порог ожидания (мин):").grid(
+            row=0, column=0, sticky="w", padx=5, pady=5)
+        self.tail_threshold_var = tk.StringVar(value="20")
+        ttk.Entry(tail_frame, textvariable=self.tail_threshold_var, width=10).grid(
+            row=0, column=1, padx=5, pady=5, sticky="w")
+
+        self.run_tail_button = ttk.Button(tail_frame, text="Оценить вероятность",
+                                          command=self.run_tail_estimation)
+        self.run_tail_button.grid(row=0, column=2, padx=5, pady=5, sticky="w")
+
+        self.tail_result_var = tk.StringVar(value="")
+        ttk.Label(tail_frame, textvariable=self.tail_result_var).grid(
+            row=0, column=3, sticky="w", padx=5, pady=5)
+
+        # Оценка по метамодели, обученной на результатах эксперимента
+        metamodel_frame = ttk.LabelFrame(
+            self.tab_experiment, text="Оценка по метамодели эксперимента")
+        metamodel_frame.pack(padx=10, pady=5, fill="x")
+
+        ttk.Label(metamodel_frame, text="Значение параметра:").grid(
+            row=0, column=0, sticky="w", padx=5, pady=5)
+        self.metamodel_value_var = tk.StringVar(value="")
+        ttk.Entry(metamodel_frame, textvariable=self.metamodel_value_var, width=10).grid(
+            row=0, column=1, padx=5, pady=5, sticky="w")
+
+        ttk.Button(metamodel_frame, text="Оценить", command=self.predict_with_metamodel).grid(
+            row=0, column=2, padx=5, pady=5, sticky="w")
+
+        self.metamodel_result_var = tk.StringVar(value="")
+        ttk.Label(metamodel_frame, textvariable=self.metamodel_result_var).grid(
+            row=0, column=3, sticky="w", padx=5, pady=5)
+
+        # Полосы квантилей длины очереди и загрузки касс по репликациям
+        bands_frame = ttk.LabelFrame(
+            self.tab_experiment, text="Динамика очереди по репликациям")
+        bands_frame.pack(padx=10, pady=5, fill="x")
+
+        ttk.Label(bands_frame, text="Репликаций:").grid(
+            row=0, column=0, sticky="w", padx=5, pady=5)
+        self.bands_replications_var = tk.StringVar(value="50")
+        ttk.Entry(bands_frame, textvariable=self.bands_replications_var, width=10).grid(
+            row=0, column=1, padx=5, pady=5, sticky="w")
+
+        ttk.Label(bands_frame, text="Интервал (мин):").grid(
+            row=0, column=2, sticky="w", padx=5, pady=5)
+        self.bands_bin_width_var = tk.StringVar(value="10")
+        ttk.Entry(bands_frame, textvariable=self.bands_bin_width_var, width=10).grid(
+            row=0, column=3, padx=5, pady=5, sticky="w")
+
+        self.run_bands_button = ttk.Button(bands_frame, text="Построить полосы",
+                                           command=self.run_time_series_bands)
+        self.run_bands_button.grid(row=0, column=4, padx=5, pady=5, sticky="w")
+
+        self.bands_result_var = tk.StringVar(value="")
+        ttk.Label(bands_frame, textvariable=self.bands_result_var).grid(
+            row=0, column=5, sticky="w", padx=5, pady=5)
+
+        # Оценки по репликациям с контрольными переменными
+        cv_frame = ttk.LabelFrame(
+            self.tab_experiment, text="Оценки по репликациям с контрольными переменными")
+        cv_frame.pack(padx=10, pady=5, fill="x")
+
+        ttk.Label(cv_frame, text="Репликаций:").grid(
+            row=0, column=0, sticky="w", padx=5, pady=5)
+        self.cv_replications_var = tk.StringVar(value="20")
+        ttk.Entry(cv_frame, textvariable=self.cv_replications_var, width=10).grid(
+            row=0, column=1, padx=5, pady=5, sticky="w")
+
+        self.run_cv_button = ttk.Button(cv_frame, text="Оценить",
+                                        command=self.run_control_variates)
+        self.run_cv_button.grid(row=0, column=2, padx=5, pady=5, sticky="w")
+
+        self.cv_result_var = tk.StringVar(value="")
+        ttk.Label(cv_frame, textvariable=self.cv_result_var).grid(
+            row=0, column=3, sticky="w", padx=5, pady=5)
+
+        # Калибровка средних времен по наблюдаемым показателям магазина
+        calibration_frame = ttk.LabelFrame(
+            self.tab_experiment, text="Калибровка по показателям магазина (пустое поле - не учитывать)")
+        calibration_frame.pack(padx=10, pady=5, fill="x")
+
+        self.calibration_target_vars = {}
+        calibration_fields = [
+            ('avg_waiting_time', "Ожидание (мин):", "4"),
+            ('avg_queue_length', "Очередь (чел.):", ""),
+            ('avg_cash_desk_utilization', "Загрузка касс (%):", "80"),
+            ('avg_time_in_shop', "Время в магазине (мин):", ""),
+        ]
+        for column, (name, label, value) in enumerate(calibration_fields):
+            ttk.Label(calibration_frame, text=label).grid(
+                row=0, column=2 * column, sticky="w", padx=5, pady=5)
+            self.calibration_target_vars[name] = tk.StringVar(value=value)
+            ttk.Entry(calibration_frame, textvariable=self.calibration_target_vars[name],
+                      width=8).grid(row=0, column=2 * column + 1, padx=5, pady=5, sticky="w")
+
+        ttk.Label(calibration_frame, text="Репликаций на точку:").grid(
+            row=1, column=0, sticky="w", padx=5, pady=5)
+        self.calibration_replications_var = tk.StringVar(value="5")
+        ttk.Entry(calibration_frame, textvariable=self.calibration_replications_var, width=8).grid(
+            row=1, column=1, padx=5, pady=5, sticky="w")
+
+        self.run_calibration_button = ttk.Button(calibration_frame, text="Калибровать",
+                                                 command=self.run_calibration)
+        self.run_calibration_button.grid(row=1, column=2, padx=5, pady=5, sticky="w")
+
+        self.apply_calibration_button = ttk.Button(calibration_frame, text="Применить параметры",
+                                                   command=self.apply_calibration,
+                                                   state="disabled")
+        self.apply_calibration_button.grid(row=1, column=3, padx=5, pady=5, sticky="w")
+
+        self.calibration_result_var = tk.StringVar(value="")
+        ttk.Label(calibration_frame, textvariable=self.calibration_result_var).grid(
+            row=1, column=4, columnspan=4, sticky="w", padx=5, pady=5)
+
+        # Отчет с графиками по всем точкам эксперимента
+        report_frame = ttk.LabelFrame(
+            self.tab_experiment, text="Отчет по точкам эксперимента")
+        report_frame.pack(padx=10, pady=5, fill="x")
+
+        self.run_report_button = ttk.Button(report_frame, text="Построить отчет",
+                                            command=self.run_report)
+        self.run_report_button.grid(row=0, column=0, padx=5, pady=5, sticky="w")
+
+        self.report_result_var = tk.StringVar(value="")
+        ttk.Label(report_frame, textvariable=self.report_result_var).grid(
+            row=0, column=1, sticky="w", padx=5, pady=5)
+
         # Фрейм для графика эксперимента
         self.experiment_plot_frame = ttk.LabelFrame(
             self.tab_experiment, text="Результаты эксперимента")
@@ -270,24 +620,40 @@ class ShopSimulatorGUI:
                    command=lambda: self.show_plot('time_in_shop')).pack(side="left", padx=5)
         ttk.Button(plots_control, text="Загрузка касс",
                    command=lambda: self.show_plot('cash_desk_utilization')).pack(side="left", padx=5)
+        ttk.Button(plots_control, text="По интервалам",
+                   command=lambda: self.show_plot('intervals')).pack(side="left", padx=5)
 
         # Область для вывода графиков
         self.canvas_frame = ttk.Frame(self.plots_frame)
         self.canvas_frame.pack(padx=10, pady=10, fill="both", expand=True)
 
-    def _get_simulation_params(self):
-        """Получение параметров симуляции из интерфейса"""
+    def _get_simulation_params(self, quiet=False):
+        """
+        Получение параметров симуляции из интерфейса
+
+        Args:
+            quiet (bool): Не показывать сообщение об ошибке ввода
+                (при вводе значений для живого предпросмотра)
+        """
         try:
             # Преобразование русских названий в английские для модели
             shopping_dist_map = {
                 "Нормальное": "normal",
                 "Равномерное": "uniform",
-                "Экспоненциальное": "exponential"
+                "Экспоненциальное": "exponential",
+                "Логнормальное": "lognormal",
+                "Гамма": "gamma",
+                "Вейбулла": "weibull",
+                "Эмпирическое": "empirical"
             }
 
             service_dist_map = {
                 "Экспоненциальное": "exponential",
-                "Нормальное": "normal"
+                "Нормальное": "normal",
+                "Логнормальное": "lognormal",
+                "Гамма": "gamma",
+                "Вейбулла": "weibull",
+                "Эмпирическое": "empirical"
             }
 
             params = {
@@ -302,14 +668,95 @@ class ShopSimulatorGUI:
                 'num_cash_desks': int(self.cash_desks_var.get()),
                 'service_time_dist': service_dist_map[self.service_dist_var.get()],
                 'service_time_mean': float(self.service_mean_var.get()),
-                'service_time_std': float(self.service_std_var.get())
+                'service_time_std': float(self.service_std_var.get()),
+                'balk_queue_length': self._optional_value(self.balk_queue_var, int),
+                'patience_mean': self._optional_value(self.patience_mean_var, float),
+                'max_customers_in_shop': self._optional_value(self.max_in_shop_var, int)
             }
+
+            # Нулевые средние (например, при наборе "0.5") дают бесконечный поток событий
+            if min(params['simulation_time'], params['customer_arrival_mean'],
+                   params['shopping_time_mean'], params['service_time_mean']) <= 0:
+                raise ValueError("время моделирования и средние времена должны быть положительными")
+            if params['num_cash_desks'] < 1:
+                raise ValueError("нужна хотя бы одна касса")
+            if min(params['shopping_time_std'], params['service_time_std']) < 0:
+                raise ValueError("стандартное отклонение не может быть отрицательным")
+
+            # Эмпирическое распределение строится по загруженным наблюдениям
+            for prefix in ('shopping_time', 'service_time'):
+                if params[f'{prefix}_dist'] == 'empirical':
+                    if prefix not in self.observed_samples:
+                        raise ValueError(
+                            "для эмпирического распределения загрузите наблюдения")
+                    params[f'{prefix}_samples'] = self.observed_samples[prefix]
+
+            # Воспроизведение журнала: столбцы timestamp (мин) и service_time (необязательный)
+            trace_path = self.arrival_trace_var.get().strip()
+            if trace_path:
+                params['arrival_trace'] = CsvArrivalTrace(
+                    trace_path, service_column='service_time')
             return params
-        except ValueError as e:
-            messagebox.showerror(
-                "Ошибка ввода", f"Неверный формат входных данных: {str(e)}")
+        except (ValueError, OSError) as e:
+            if not quiet:
+                messagebox.showerror(
+                    "Ошибка ввода", f"Неверный формат входных данных: {str(e)}")
             return None
 
+    def _optional_value(self, var, converter):
+        """Значение необязательного поля ввода (None, если поле пустое)"""
+        value = var.get().strip()
+        return converter(value) if value else None
+
+    def _choose_arrival_trace(self):
+        """Выбор CSV-файла журнала прибытий"""
+        path = filedialog.askopenfilename(
+            title="Журнал прибытий",
+            filetypes=[("CSV", "*.csv"), ("Все файлы", "*.*")])
+        if path:
+            self.arrival_trace_var.set(path)
+
+    def _load_observations(self, prefix):
+        """
+        Подбор распределения этапа по наблюдениям из файла
+
+        Файл содержит значения (мин) в первом столбце; нечисловые строки
+        (например, заголовок) пропускаются. Поля среднего и отклонения (для
+        равномерного распределения также минимума и максимума) заполняются
+        оценками, а наблюдения сохраняются для эмпирического распределения.
+
+        Args:
+            prefix (str): 'shopping_time' или 'service_time'
+        """
+        path = filedialog.askopenfilename(
+            title="Наблюдаемые значения",
+            filetypes=[("CSV", "*.csv"), ("Текст", "*.txt"), ("Все файлы", "*.*")])
+        if not path:
+            return
+
+        dist_var = self.shopping_dist_var if prefix == 'shopping_time' else self.service_dist_var
+        labels_to_names = {label: name for name, label in DISTRIBUTION_LABELS.items()}
+        try:
+            samples = np.genfromtxt(path, delimiter=',', usecols=0, ndmin=1)
+            fitted = fit_distribution(samples, labels_to_names[dist_var.get()], prefix)
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Ошибка ввода", f"Не удалось загрузить наблюдения: {str(e)}")
+            return
+
+        samples = samples[np.isfinite(samples)].tolist()
+        self.observed_samples[prefix] = samples
+        if prefix == 'shopping_time':
+            self.shopping_mean_var.set(f"{fitted['shopping_time_mean']:.3g}")
+            self.shopping_std_var.set(f"{fitted['shopping_time_std']:.3g}")
+            if 'shopping_time_min' in fitted:
+                self.shopping_min_var.set(f"{fitted['shopping_time_min']:.3g}")
+                self.shopping_max_var.set(f"{fitted['shopping_time_max']:.3g}")
+            self.shopping_observations_var.set(f"{len(samples)} набл.")
+        else:
+            self.service_mean_var.set(f"{fitted['service_time_mean']:.3g}")
+            self.service_std_var.set(f"{fitted['service_time_std']:.3g}")
+            self.service_observations_var.set(f"{len(samples)} набл.")
+
     def run_simulation(self):
         """Запуск симуляции на основе параметров из интерфейса"""
         if self.is_simulating:
@@ -319,6 +766,16 @@ class ShopSimulatorGUI:
         if not params:
             return
 
+        try:
+            params['interval_width'] = self._optional_value(self.interval_width_var, float)
+        except ValueError as e:
+            messagebox.showerror(
+                "Ошибка ввода", f"Неверный формат входных данных: {str(e)}")
+            return
+        if params['interval_width'] is not None and params['interval_width'] <= 0:
+            messagebox.showerror("Ошибка", "Интервал статистики должен быть положительным")
+            return
+
         # Обновление статуса
         self.is_simulating = True
         self.run_button.config(state="disabled")
@@ -327,6 +784,174 @@ class ShopSimulatorGUI:
         threading.Thread(target=self._simulation_thread,
                          args=(params,), daemon=True).start()
 
+    def show_analytic_preview(self):
+        """Мгновенная аналитическая оценка показателей по параметрам из интерфейса"""
+        params = self._get_simulation_params()
+        if not params:
+            return
+
+        results = analytic_results(params)
+        if not results['stable']:
+            self.analytic_preview_var.set(
+                f"Аналитическая оценка: система перегружена (нагрузка "
+                f"{results['offered_load']:.2f} при {params['num_cash_desks']} кассах), "
+                f"очередь растет неограниченно")
+            return
+
+        self.analytic_preview_var.set(
+            f"Аналитическая оценка (M/M/c, Аллен-Каннин): "
+            f"ожидание {results['avg_waiting_time']:.2f} мин, "
+            f"p95 ожидания {results['p95_waiting_time']:.2f} мин, "
+            f"длина очереди {results['avg_queue_length']:.2f} чел., "
+            f"загрузка касс {results['avg_cash_desk_utilization']:.1%}")
+
+    def _on_live_preview_toggle(self):
+        """Включение и выключение живого предпросмотра"""
+        if self.live_preview_enabled_var.get():
+            self._start_live_preview()
+        else:
+            self._cancel_live_preview()
+            self.live_preview_var.set("")
+
+    def _on_param_change(self, *args):
+        """Отложенный пересчет предпросмотра после правки параметров"""
+        if not self.live_preview_enabled_var.get():
+            return
+        if self._preview_after_id is not None:
+            self.root.after_cancel(self._preview_after_id)
+        self._preview_after_id = self.root.after(
+            PREVIEW_DEBOUNCE_MS, self._start_live_preview)
+
+    def _cancel_live_preview(self):
+        """Отмена отложенного и выполняемого прогонов предпросмотра"""
+        if self._preview_after_id is not None:
+            self.root.after_cancel(self._preview_after_id)
+            self._preview_after_id = None
+        if self._preview_cancel is not None:
+            self._preview_cancel.set()
+            self._preview_cancel = None
+
+    def _start_live_preview(self):
+        """
+        Запуск живого предпросмотра по текущим параметрам
+
+        Выполняемый прогон предыдущих параметров отменяется. Сразу
+        показывается аналитическая оценка, затем в фоне результат
+        быстрого прогона (при длинном горизонте - укороченного до
+        PREVIEW_FAST_TIME), который уточняется репликациями полной длины.
+        """
+        self._cancel_live_preview()
+        params = self._get_simulation_params(quiet=True)
+        if not params:
+            self.live_preview_var.set("Предпросмотр: некорректные параметры")
+            return
+
+        if 'arrival_trace' not in params:
+            try:
+                analytic = analytic_results(params)
+            except (ValueError, ArithmeticError):
+                self.live_preview_var.set("Предпросмотр: некорректные параметры")
+                return
+            if not analytic['stable']:
+                self.live_preview_var.set(
+                    f"Предпросмотр: система перегружена (нагрузка "
+                    f"{analytic['offered_load']:.2f} при {params['num_cash_desks']} кассах)")
+            else:
+                self.live_preview_var.set(
+                    f"Предпросмотр (аналитическая оценка): ожидание "
+                    f"{analytic['avg_waiting_time']:.2f} мин, длина очереди "
+                    f"{analytic['avg_queue_length']:.2f} чел., загрузка касс "
+                    f"{analytic['avg_cash_desk_utilization']:.1%}")
+
+        cancel = threading.Event()
+        self._preview_cancel = cancel
+        threading.Thread(target=self._live_preview_thread,
+                         args=(dict(params, stability_guard=True), cancel),
+                         daemon=True).start()
+
+    def _run_preview_replication(self, params, cancel):
+        """
+        Прогон одной репликации предпросмотра с проверкой отмены
+
+        Событийная модель продвигается шагами PREVIEW_TIME_STEP, поэтому
+        прогон устаревших параметров прекращается почти сразу.
+
+        Returns:
+            dict: Результаты прогона или None, если прогон отменен
+        """
+        if 'arrival_trace' in params:
+            results = ShopSimulation(params).run_simulation()
+            return None if cancel.is_set() else results
+
+        simulation = EventShopSimulation(params)
+        time = PREVIEW_TIME_STEP
+        while time < simulation.simulation_time and simulation.stopped_at is None:
+            simulation.run_until(time)
+            if cancel.is_set():
+                return None
+            time += PREVIEW_TIME_STEP
+        results = simulation.run_simulation()
+        return None if cancel.is_set() else results
+
+    def _live_preview_thread(self, params, cancel):
+        """Поток предпросмотра: быстрая оценка и ее уточнение репликациями"""
+        try:
+            values = {key: [] for key in ('avg_waiting_time', 'p95_waiting_time',
+                                          'avg_queue_length', 'avg_cash_desk_utilization')}
+
+            # Быстрая оценка по укороченному прогону при длинном горизонте
+            if params['simulation_time'] > PREVIEW_FAST_TIME:
+                results = self._run_preview_replication(
+                    dict(params, simulation_time=PREVIEW_FAST_TIME), cancel)
+                if results is None:
+                    return
+                if not results.get('unstable'):
+                    fast = {key: [float(results.get(key, 0))] for key in values}
+                    text = self._format_live_preview(
+                        fast, f"быстрая оценка по первым {PREVIEW_FAST_TIME:.0f} мин")
+                    self.root.after(0, lambda: None if cancel.is_set()
+                                    else self.live_preview_var.set(text))
+
+            for replication in range(PREVIEW_REPLICATIONS):
+                results = self._run_preview_replication(
+                    replication_params(params, replication), cancel)
+                if results is None:
+                    return
+
+                if results.get('unstable'):
+                    text = (f"Предпросмотр: очередь растет неограниченно "
+                            f"(прогон остановлен на {results['stopped_at']:.0f} мин)")
+                else:
+                    for key in values:
+                        values[key].append(float(results.get(key, 0)))
+                    text = self._format_live_preview(values)
+
+                self.root.after(0, lambda text=text: None if cancel.is_set()
+                                else self.live_preview_var.set(text))
+                if results.get('unstable'):
+                    return
+        except Exception as e:
+            message = f"Предпросмотр: ошибка симуляции ({e})"
+            self.root.after(0, lambda: None if cancel.is_set()
+                            else self.live_preview_var.set(message))
+
+    def _format_live_preview(self, values, stage=None):
+        """Текст предпросмотра по значениям метрик в выполненных репликациях"""
+        count = len(values['avg_waiting_time'])
+        wait, wait_low, wait_high = confidence_interval(values['avg_waiting_time'])
+        p95 = np.mean(values['p95_waiting_time'])
+        queue = np.mean(values['avg_queue_length'])
+        utilization = np.mean(values['avg_cash_desk_utilization'])
+        if count == 1:
+            head = f"Предпросмотр ({stage or 'быстрая оценка по одному прогону'}): "
+            wait_text = f"ожидание {wait:.2f} мин"
+        else:
+            final = "итог" if count == PREVIEW_REPLICATIONS else "уточнение"
+            head = f"Предпросмотр ({final}, прогонов: {count}): "
+            wait_text = f"ожидание {wait:.2f} ± {(wait_high - wait_low) / 2:.2f} мин"
+        return (f"{head}{wait_text}, p95 ожидания {p95:.2f} мин, "
+                f"длина очереди {queue:.2f} чел., загрузка касс {utilization:.1%}")
+
     def _simulation_thread(self, params):
         """Поток симуляции для запуска без блокировки GUI"""
         try:
@@ -336,6 +961,7 @@ class ShopSimulatorGUI:
 
             # Сохранение результатов
             self.simulation_results = results
+            self.simulation_params = params
 
             # Обновление интерфейса с результатами
             self.root.after(0, self._update_simulation_results)
@@ -383,6 +1009,12 @@ class ShopSimulatorGUI:
                 conclusions.append(
                     f"Обслужено только {service_rate:.1%} прибывших покупателей. Возможно, время симуляции недостаточно для корректной оценки.")
 
+        # Анализ потерянных покупателей
+        lost = results.get('total_customers_lost', 0)
+        if arrived > 0 and lost / arrived > 0.05:
+            conclusions.append(
+                f"Потеряно {lost / arrived:.1%} прибывших покупателей из-за перегрузки касс. Рекомендуется увеличить количество касс.")
+
         # Если выводов нет, добавляем общий вывод
         if not conclusions:
             conclusions.append("Система работает в оптимальном режиме.")
@@ -422,6 +1054,7 @@ class ShopSimulatorGUI:
 Результаты:
 - Общее количество прибывших покупателей: {self.simulation_results['total_customers_arrived']}
 - Общее количество обслуженных покупателей: {self.simulation_results['total_customers_served']}
+- Потеряно покупателей: {self.simulation_results.get('total_customers_lost', 0)} (ушли из-за очереди: {self.simulation_results.get('customers_balked', 0)}, не дождались: {self.simulation_results.get('customers_reneged', 0)}, не впущены: {self.simulation_results.get('customers_rejected', 0)})
 
 - Среднее время нахождения в магазине: {self.simulation_results['avg_time_in_shop']:.2f} мин
 - Максимальное время нахождения в магазине: {self.simulation_results['max_time_in_shop']:.2f} мин
@@ -442,6 +1075,18 @@ class ShopSimulatorGUI:
         for conclusion in conclusions:
             self.stats_text.insert(tk.END, f"\n- {conclusion}")
 
+        # Сверка с аналитической моделью
+        if self.simulation_params:
+            comparison = compare_with_simulation(
+                self.simulation_results, self.simulation_params)
+            self.stats_text.insert(
+                tk.END, "\n\nСверка с аналитической моделью (симуляция / аналитика):")
+            for metric_name, (simulated, expected, deviation) in comparison.items():
+                line = f"\n- {self._get_metric_name_ru(metric_name)}: {simulated:.2f} / {expected:.2f}"
+                if not np.isnan(deviation):
+                    line += f" ({deviation:+.0%})"
+                self.stats_text.insert(tk.END, line)
+
         # Убеждаемся, что текстовое поле доступно для выделения и копирования
         self.stats_text.configure(state="normal")
 
@@ -476,6 +1121,8 @@ class ShopSimulatorGUI:
             fig = visualizer.plot_time_in_shop_histogram()
         elif plot_type == 'cash_desk_utilization':
             fig = visualizer.plot_cash_desk_utilization()
+        elif plot_type == 'intervals':
+            fig = visualizer.plot_interval_statistics()
 
         if fig:
             # Создание канваса для отображения
@@ -505,12 +1152,18 @@ class ShopSimulatorGUI:
             param_end = float(self.param_end_var.get())
             param_step = float(self.param_step_var.get())
             metric_name = self.experiment_metric_var.get()
+            adaptive_budget = (int(self.adaptive_budget_var.get())
+                               if self.adaptive_sweep_var.get() else None)
 
             # Проверка корректности значений
             if param_start > param_end or param_step <= 0:
                 messagebox.showerror(
                     "Ошибка", "Некорректные параметры эксперимента")
                 return
+            if adaptive_budget is not None and adaptive_budget < 2:
+                messagebox.showerror(
+                    "Ошибка", "Бюджет адаптивного эксперимента - не менее 2 прогонов")
+                return
 
             # Для количества касс обеспечиваем целочисленные значения
             if param_name == "Количество касс":
@@ -532,15 +1185,21 @@ class ShopSimulatorGUI:
             # Запуск эксперимента в отдельном потоке
             threading.Thread(target=self._experiment_thread,
                              args=(base_params, param_name,
-                                   param_values, metric_name),
+                                   param_values, metric_name, adaptive_budget),
                              daemon=True).start()
 
         except ValueError as e:
             messagebox.showerror(
                 "Ошибка ввода", f"Неверный формат входных данных: {str(e)}")
 
-    def _experiment_thread(self, base_params, param_name, param_values, metric_name):
-        """Поток для запуска серии экспериментов"""
+    def _experiment_thread(self, base_params, param_name, param_values, metric_name,
+                           adaptive_budget=None):
+        """
+        Поток для запуска серии экспериментов
+
+        Если задан бюджет adaptive_budget, значения параметра выбираются
+        адаптивно в диапазоне param_values (см. sweep.adaptive_sweep).
+        """
         try:
             # Словарь для преобразования русских названий в английские
             param_name_map = {
@@ -561,14 +1220,40 @@ class ShopSimulatorGUI:
             param_name_eng = param_name_map[param_name]
             metric_name_eng = metric_name_map[metric_name]
 
+            # Если меняются только параметры касс и обслуживания, прибытия и
+            # выбор товаров генерируются один раз и переиспользуются в точках
+            cached_upstream = param_name_eng not in UPSTREAM_PARAMS
+
             # Список для хранения результатов
             results = []
 
+            # Отбрасываем точки, в которых система заведомо перегружена
+            pruned_values = []
+            if self.prune_unstable_var.get():
+                param_values, pruned_values = prune_infeasible_points(
+                    base_params, param_name_eng, param_values)
+                if not param_values:
+                    self.root.after(0, lambda: messagebox.showinfo(
+                        "Информация", "Во всех точках эксперимента система перегружена"))
+                    return
+
             # Преобразуем param_values в обычный список для безопасной передачи
             param_values_list = param_values.tolist() if hasattr(
                 param_values, 'tolist') else list(param_values)
 
-            # Запуск симуляций для каждого значения параметра
+            # Адаптивный выбор точек в диапазоне (неустойчивые прогоны
+            # останавливаются досрочно)
+            if adaptive_budget is not None:
+                params = dict(base_params, stability_guard=True)
+                param_values_list, results = adaptive_sweep(
+                    params, param_name_eng, min(param_values_list), max(param_values_list),
+                    metric_name_eng, budget=adaptive_budget,
+                    integer=param_name_eng == "num_cash_desks",
+                    simulate=simulate_with_schedule if cached_upstream else None)
+                param_values = []
+
+            # Параметры симуляций для каждого значения параметра
+            params_list = []
             for value in param_values:
                 # Копирование базовых параметров и изменение нужного
                 params = base_params.copy()
@@ -579,14 +1264,30 @@ class ShopSimulatorGUI:
                 else:
                     params[param_name_eng] = float(value)
 
-                # Создание и запуск модели
-                simulation = ShopSimulation(params)
-                result = simulation.run_simulation()
-                results.append(result)
+                # Неустойчивые точки останавливаются досрочно
+                params['stability_guard'] = True
+                params_list.append(params)
 
-            # Сохранение результатов
+            # Запуск симуляций в пуле процессов: массивы по покупателям
+            # передаются через файлы, отображаемые в память
+            if params_list:
+                self.experiment_store.cleanup()
+                self.experiment_store = ResultStore()
+                results = map_simulations_shared(params_list, self.experiment_store,
+                                                 cached_upstream=cached_upstream)
+
+            # Сохранение результатов вместе с обученной на них метамоделью
+            # (прогоны, остановленные как неустойчивые, в обучение не входят)
             self.experiment_results = results
             self.experiment_param_values = param_values_list
+            stable_points = [(value, result) for value, result
+                             in zip(param_values_list, results) if not result.get('unstable')]
+            self.experiment_metamodel = SweepMetamodel(
+                param_name_eng, [value for value, _ in stable_points],
+                [result for _, result in stable_points])
+            self.experiment_pruned_values = [float(v) for v in pruned_values]
+            self.experiment_base_params = dict(base_params, stability_guard=True)
+            self.experiment_param_name = param_name_eng
 
             # Обновление интерфейса с результатами - передаем английские имена для обработки
             self.root.after(0, lambda: self._show_experiment_results(
@@ -602,117 +1303,897 @@ class ShopSimulatorGUI:
                 0, lambda: self.run_experiment_button.config(state="normal"))
             self.is_simulating = False
 
-    def _generate_experiment_conclusions(self, param_name, param_values, metric_name, experiment_results):
-        """Генерирует выводы по результатам серии экспериментов"""
-        if not experiment_results or len(param_values) == 0:
-            return ["Недостаточно данных для формирования выводов."]
-
-        conclusions = []
-
-        # Получаем значения метрики для всех экспериментов
-        metric_values = [result.get(metric_name, 0)
-                         for result in experiment_results]
+    def run_staffing_search(self):
+        """Запуск поиска минимального количества касс, удовлетворяющего SLA"""
+        if self.is_simulating:
+            return
 
-        # Находим оптимальное значение параметра
-        if metric_name in ["avg_waiting_time", "avg_time_in_shop", "avg_queue_length"]:
-            # Для этих метрик ищем минимум
-            best_idx = np.argmin(metric_values)
-            best_value = param_values[best_idx]
-            best_metric = metric_values[best_idx]
+        base_params = self._get_simulation_params()
+        if not base_params:
+            return
 
-            if param_name == "num_cash_desks":
-                conclusions.append(
-                    f"Оптимальное количество касс: {int(best_value)} (при этом {self._get_metric_name_ru(metric_name)}: {best_metric:.2f})")
+        try:
+            target_wait = float(self.sla_target_var.get())
+            max_desks = int(self.sla_max_desks_var.get())
+        except ValueError as e:
+            messagebox.showerror(
+                "Ошибка ввода", f"Неверный формат входных данных: {str(e)}")
+            return
 
-                # Анализ эффективности добавления касс
-                if len(param_values) > 1:
-                    improvements = []
-                    for i in range(1, len(param_values)):
-                        if metric_values[i] < metric_values[i-1]:
-                            improvement = (
-                                metric_values[i-1] - metric_values[i]) / metric_values[i-1]
-                            improvements.append((param_values[i], improvement))
+        if target_wait <= 0 or max_desks < 1:
+            messagebox.showerror("Ошибка", "Некорректные параметры подбора касс")
+            return
 
-                    if improvements:
-                        best_improvement = max(
-                            improvements, key=lambda x: x[1])
-                        if best_improvement[1] > 0.2:  # Если улучшение более 20%
-                            conclusions.append(
-                                f"Наибольший эффект дает увеличение количества касс до {int(best_improvement[0])} (улучшение на {best_improvement[1]:.1%})")
+        # Обновление статуса
+        self.is_simulating = True
+        self.run_staffing_button.config(state="disabled")
 
-            elif param_name == "customer_arrival_mean":
-                conclusions.append(
-                    f"При интервале прибытия покупателей {float(best_value):.1f} мин достигается минимальное {self._get_metric_name_ru(metric_name)}: {best_metric:.2f}")
+        threading.Thread(target=self._staffing_search_thread,
+                         args=(base_params, target_wait, max_desks),
+                         daemon=True).start()
 
-                # Анализ критической нагрузки
-                critical_idx = None
-                for i in range(len(param_values)-1):
-                    if param_values[i+1] > param_values[i] and metric_values[i+1] < metric_values[i] * 0.5:
-                        critical_idx = i
-                        break
+    def _staffing_search_thread(self, base_params, target_wait, max_desks):
+        """Поток поиска минимального количества касс"""
+        try:
+            search_result = find_min_cash_desks(
+                base_params, target_wait, max_desks=max_desks)
+            self.root.after(
+                0, lambda: self._show_staffing_results(search_result))
+        except Exception as e:
+            import traceback
+            error_msg = f"Ошибка подбора касс: {str(e)}\n{traceback.format_exc()}"
+            self.root.after(0, lambda: messagebox.showerror(
+                "Ошибка подбора касс", error_msg))
+        finally:
+            self.root.after(
+                0, lambda: self.run_staffing_button.config(state="normal"))
+            self.is_simulating = False
 
-                if critical_idx is not None:
-                    conclusions.append(
-                        f"Критический интервал прибытия: {float(param_values[critical_idx]):.1f} мин, при его уменьшении резко возрастает {self._get_metric_name_ru(metric_name)}")
+    def _show_staffing_results(self, search_result):
+        """Отображение результатов подбора количества касс"""
+        for widget in self.experiment_plot_frame.winfo_children():
+            widget.destroy()
 
-            else:  # Для остальных параметров
-                conclusions.append(
-                    f"Оптимальное значение параметра '{self._get_param_name_ru(param_name)}': {float(best_value):.1f}")
+        results_frame = ttk.Frame(self.experiment_plot_frame)
+        results_frame.pack(fill="both", expand=True)
 
-        elif metric_name == "avg_cash_desk_utilization":
-            # Для загрузки касс ищем оптимальное значение (не слишком низкое, не слишком высокое)
-            optimal_idx = None
-            for i, value in enumerate(metric_values):
-                if 0.7 <= value <= 0.85:
-                    optimal_idx = i
-                    break
+        plot_frame = ttk.Frame(results_frame)
+        plot_frame.pack(fill="both", expand=True, side="left", padx=5, pady=5)
 
-            if optimal_idx is not None:
-                optimal_value = param_values[optimal_idx]
-                if param_name == "num_cash_desks":
-                    conclusions.append(
-                        f"Оптимальная загрузка касс ({metric_values[optimal_idx]:.1%}) достигается при количестве касс: {int(optimal_value)}")
-                else:
-                    conclusions.append(
-                        f"Оптимальная загрузка касс ({metric_values[optimal_idx]:.1%}) достигается при значении параметра '{self._get_param_name_ru(param_name)}': {float(optimal_value):.1f}")
-            else:
-                # Если оптимальное значение не найдено, ищем ближайшее к 0.75
-                best_idx = np.argmin(np.abs(np.array(metric_values) - 0.75))
-                best_value = param_values[best_idx]
-                if param_name == "num_cash_desks":
-                    conclusions.append(
-                        f"Ближайшая к оптимальной загрузка касс ({metric_values[best_idx]:.1%}) достигается при количестве касс: {int(best_value)}")
-                else:
-                    conclusions.append(
-                        f"Ближайшая к оптимальной загрузка касс ({metric_values[best_idx]:.1%}) достигается при значении параметра '{self._get_param_name_ru(param_name)}': {float(best_value):.1f}")
+        conclusions_frame = ttk.LabelFrame(
+            results_frame, text="Выводы по подбору касс")
+        conclusions_frame.pack(fill="y", side="right", padx=5,
+                               pady=5, ipadx=5, ipady=5, anchor="ne", expand=False)
 
-        # Общий тренд
-        if len(param_values) > 2:
-            is_decreasing = True
-            is_increasing = True
+        visualizer = SimulationVisualizer({})
+        fig = visualizer.plot_staffing_search(search_result)
+        if fig:
+            canvas = FigureCanvasTkAgg(fig, plot_frame)
+            canvas.draw()
+            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
 
-            for i in range(1, len(metric_values)):
-                if metric_values[i] > metric_values[i-1]:
-                    is_decreasing = False
-                if metric_values[i] < metric_values[i-1]:
-                    is_increasing = False
+        conclusions = [
+            search_result['statement'],
+            f"Выполнено симуляций: {search_result['simulations_run']} "
+            f"(полный перебор: {search_result['full_sweep_simulations']})"
+        ]
+        self._create_conclusions_text(conclusions_frame, conclusions)
 
-            if is_decreasing:
-                conclusions.append(
-                    f"Наблюдается устойчивое снижение {self._get_metric_name_ru(metric_name)} при увеличении параметра '{self._get_param_name_ru(param_name)}'")
-            elif is_increasing:
-                conclusions.append(
-                    f"Наблюдается устойчивый рост {self._get_metric_name_ru(metric_name)} при увеличении параметра '{self._get_param_name_ru(param_name)}'")
+    def run_schedule_optimization(self):
+        """Запуск поиска самого дешевого графика работы касс"""
+        if self.is_simulating:
+            return
 
-        return conclusions
+        base_params = self._get_simulation_params()
+        if not base_params:
+            return
 
-    def _get_param_name_ru(self, param_name):
+        try:
+            target_wait = float(self.schedule_target_var.get())
+            block_length = float(self.schedule_block_var.get())
+        except ValueError as e:
+            messagebox.showerror(
+                "Ошибка ввода", f"Неверный формат входных данных: {str(e)}")
+            return
+
+        if target_wait <= 0 or block_length <= 0:
+            messagebox.showerror("Ошибка", "Некорректные параметры графика касс")
+            return
+
+        # Обновление статуса
+        self.is_simulating = True
+        self.run_schedule_button.config(state="disabled")
+
+        threading.Thread(target=self._schedule_optimization_thread,
+                         args=(base_params, target_wait, block_length),
+                         daemon=True).start()
+
+    def _schedule_optimization_thread(self, base_params, target_wait, block_length):
+        """Поток оптимизации графика работы касс"""
+        try:
+            schedule_result = optimize_desk_schedule(
+                base_params, target_wait, block_length=block_length)
+            self.root.after(
+                0, lambda: self._show_schedule_results(schedule_result))
+        except Exception as e:
+            import traceback
+            error_msg = f"Ошибка оптимизации графика: {str(e)}\n{traceback.format_exc()}"
+            self.root.after(0, lambda: messagebox.showerror(
+                "Ошибка оптимизации графика", error_msg))
+        finally:
+            self.root.after(
+                0, lambda: self.run_schedule_button.config(state="normal"))
+            self.is_simulating = False
+
+    def _show_schedule_results(self, schedule_result):
+        """Отображение найденного графика работы касс"""
+        for widget in self.experiment_plot_frame.winfo_children():
+            widget.destroy()
+
+        results_frame = ttk.Frame(self.experiment_plot_frame)
+        results_frame.pack(fill="both", expand=True)
+
+        plot_frame = ttk.Frame(results_frame)
+        plot_frame.pack(fill="both", expand=True, side="left", padx=5, pady=5)
+
+        conclusions_frame = ttk.LabelFrame(
+            results_frame, text="Выводы по графику касс")
+        conclusions_frame.pack(fill="y", side="right", padx=5,
+                               pady=5, ipadx=5, ipady=5, anchor="ne", expand=False)
+
+        visualizer = SimulationVisualizer({})
+        fig = visualizer.plot_desk_schedule(schedule_result)
+        if fig:
+            canvas = FigureCanvasTkAgg(fig, plot_frame)
+            canvas.draw()
+            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+        conclusions = []
+        if not schedule_result['feasible']:
+            conclusions.append(
+                "Даже при максимальном количестве касс SLA выполняется не во всех часах.")
+        schedule_text = ", ".join(
+            f"{int(start)}–{int(start + schedule_result['block_length'])} мин: {desks}"
+            for start, desks in schedule_result['desk_schedule'])
+        conclusions.append(f"График касс: {schedule_text}")
+        conclusions.append(
+            f"Кассо-часов: {schedule_result['cost']:.1f} (постоянное количество касс: "
+            f"{schedule_result['constant_schedule_cost']:.1f})")
+        conclusions.append(
+            f"Проверено графиков: {schedule_result['schedules_evaluated']}, "
+            f"выполнено симуляций: {schedule_result['simulations_run']}")
+        self._create_conclusions_text(conclusions_frame, conclusions)
+
+    def run_sensitivity_analysis(self):
+        """Запуск глобального анализа чувствительности по выбранной метрике"""
+        if self.is_simulating:
+            return
+
+        base_params = self._get_simulation_params()
+        if not base_params:
+            return
+        if base_params.get('arrival_trace') is not None:
+            messagebox.showerror(
+                "Ошибка", "Анализ чувствительности не поддерживает журнал прибытий")
+            return
+
+        try:
+            num_samples = int(self.sensitivity_samples_var.get())
+            spread = float(self.sensitivity_spread_var.get()) / 100
+        except ValueError as e:
+            messagebox.showerror(
+                "Ошибка ввода", f"Неверный формат входных данных: {str(e)}")
+            return
+
+        if num_samples < 2 or not 0 < spread < 1:
+            messagebox.showerror("Ошибка", "Некорректные параметры анализа чувствительности")
+            return
+
+        metric_name_map = {
+            "Среднее время ожидания": "avg_waiting_time",
+            "Среднее время в магазине": "avg_time_in_shop",
+            "Средняя длина очереди": "avg_queue_length",
+            "Средняя загрузка касс": "avg_cash_desk_utilization"
+        }
+        metric_name = metric_name_map[self.experiment_metric_var.get()]
+
+        # Обновление статуса
+        self.is_simulating = True
+        self.run_sensitivity_button.config(state="disabled")
+
+        threading.Thread(target=self._sensitivity_thread,
+                         args=(base_params, metric_name, num_samples, spread),
+                         daemon=True).start()
+
+    def _sensitivity_thread(self, base_params, metric_name, num_samples, spread):
+        """Поток анализа чувствительности"""
+        try:
+            sensitivity_result = sobol_sensitivity(
+                base_params, metric_name, num_samples=num_samples, spread=spread)
+            self.root.after(
+                0, lambda: self._show_sensitivity_results(sensitivity_result))
+        except Exception as e:
+            import traceback
+            error_msg = f"Ошибка анализа чувствительности: {str(e)}\n{traceback.format_exc()}"
+            self.root.after(0, lambda: messagebox.showerror(
+                "Ошибка анализа чувствительности", error_msg))
+        finally:
+            self.root.after(
+                0, lambda: self.run_sensitivity_button.config(state="normal"))
+            self.is_simulating = False
+
+    def _show_sensitivity_results(self, sensitivity_result):
+        """Отображение индексов чувствительности и выводов"""
+        for widget in self.experiment_plot_frame.winfo_children():
+            widget.destroy()
+
+        results_frame = ttk.Frame(self.experiment_plot_frame)
+        results_frame.pack(fill="both", expand=True)
+
+        plot_frame = ttk.Frame(results_frame)
+        plot_frame.pack(fill="both", expand=True, side="left", padx=5, pady=5)
+
+        conclusions_frame = ttk.LabelFrame(
+            results_frame, text="Выводы по чувствительности")
+        conclusions_frame.pack(fill="y", side="right", padx=5,
+                               pady=5, ipadx=5, ipady=5, anchor="ne", expand=False)
+
+        factor_labels = {name: self._get_param_name_ru(name)
+                         for name in sensitivity_result['factors']}
+
+        visualizer = SimulationVisualizer({})
+        fig = visualizer.plot_sensitivity(sensitivity_result, factor_labels)
+        if fig:
+            canvas = FigureCanvasTkAgg(fig, plot_frame)
+            canvas.draw()
+            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+        conclusions = [
+            f"Анализ чувствительности метрики "
+            f"'{self._get_metric_name_ru(sensitivity_result['metric_name'])}' "
+            f"({sensitivity_result['evaluations']} прогонов, доверительная "
+            f"вероятность {sensitivity_result['confidence']:.0%})"
+        ]
+
+        # Факторы по убыванию полного индекса
+        ranked = sorted(zip(sensitivity_result['factors'], sensitivity_result['first_order'],
+                            sensitivity_result['first_order_ci'], sensitivity_result['total'],
+                            sensitivity_result['total_ci']), key=lambda x: -x[3])
+        for name, first, first_ci, total, total_ci in ranked:
+            conclusions.append(
+                f"{factor_labels[name]}: первый порядок {first:.3f} "
+                f"[{first_ci[0]:.3f}; {first_ci[1]:.3f}], полный {total:.3f} "
+                f"[{total_ci[0]:.3f}; {total_ci[1]:.3f}]")
+
+        negligible = [factor_labels[name] for name, _, _, _, total_ci in ranked
+                      if total_ci[1] < 0.01]
+        if negligible:
+            conclusions.append(
+                "Практически не влияют на метрику: " + ", ".join(negligible))
+
+        interactions = sum(sensitivity_result['total']) - sum(sensitivity_result['first_order'])
+        if interactions > 0.2:
+            conclusions.append(
+                f"Значительная доля дисперсии ({interactions:.0%}) объясняется "
+                f"взаимодействием параметров, а не их отдельным влиянием")
+
+        self._create_conclusions_text(conclusions_frame, conclusions)
+
+    def run_tail_estimation(self):
+        """Запуск оценки вероятности превышения порога ожидания"""
+        if self.is_simulating:
+            return
+
+        base_params = self._get_simulation_params()
+        if not base_params:
+            return
+
+        try:
+            threshold = float(self.tail_threshold_var.get())
+        except ValueError as e:
+            messagebox.showerror(
+                "Ошибка ввода", f"Неверный формат входных данных: {str(e)}")
+            return
+
+        if threshold <= 0:
+            messagebox.showerror("Ошибка", "Порог ожидания должен быть положительным")
+            return
+
+        # Обновление статуса
+        self.is_simulating = True
+        self.run_tail_button.config(state="disabled")
+        self.tail_result_var.set("Выполняется оценка...")
+
+        threading.Thread(target=self._tail_estimation_thread,
+                         args=(base_params, threshold), daemon=True).start()
+
+    def _tail_estimation_thread(self, base_params, threshold):
+        """Поток оценки вероятности превышения порога ожидания"""
+        try:
+            tail = estimate_tail_probability(base_params, threshold, num_cycles=4000)
+            text = (f"P(ожидание > {threshold:g} мин) = {tail['probability']:.2e} "
+                    f"[{tail['ci_lower']:.2e}; {tail['ci_upper']:.2e}], "
+                    f"смоделировано покупателей: {tail['customers_simulated']}")
+            if tail['brute_force_customers']:
+                text += (f" (прямому моделированию для той же точности потребовалось бы около "
+                         f"{tail['brute_force_customers']})")
+            self.root.after(0, lambda: self.tail_result_var.set(text))
+        except ValueError as e:
+            message = str(e)
+            self.root.after(0, lambda: self.tail_result_var.set(message))
+        except Exception as e:
+            import traceback
+            error_msg = f"Ошибка оценки вероятности: {str(e)}\n{traceback.format_exc()}"
+            self.root.after(0, lambda: messagebox.showerror(
+                "Ошибка оценки вероятности", error_msg))
+        finally:
+            self.root.after(
+                0, lambda: self.run_tail_button.config(state="normal"))
+            self.is_simulating = False
+
+    def run_time_series_bands(self):
+        """Запуск построения полос квантилей динамики очереди по репликациям"""
+        if self.is_simulating:
+            return
+
+        base_params = self._get_simulation_params()
+        if not base_params:
+            return
+
+        try:
+            num_replications = int(self.bands_replications_var.get())
+            bin_width = float(self.bands_bin_width_var.get())
+        except ValueError as e:
+            messagebox.showerror(
+                "Ошибка ввода", f"Неверный формат входных данных: {str(e)}")
+            return
+
+        if num_replications < 2 or bin_width <= 0:
+            messagebox.showerror("Ошибка", "Некорректные параметры построения полос")
+            return
+
+        # Обновление статуса
+        self.is_simulating = True
+        self.run_bands_button.config(state="disabled")
+        self.bands_result_var.set("Выполняются репликации...")
+
+        threading.Thread(target=self._time_series_bands_thread,
+                         args=(base_params, num_replications, bin_width),
+                         daemon=True).start()
+
+    def _time_series_bands_thread(self, base_params, num_replications, bin_width):
+        """Поток построения полос квантилей по репликациям"""
+        try:
+            def progress(done):
+                text = f"Готово репликаций: {done} из {num_replications}"
+                self.root.after(0, lambda: self.bands_result_var.set(text))
+
+            series_result = replicate_time_series(
+                base_params, num_replications, bin_width, progress_callback=progress)
+            self.root.after(0, lambda: self._show_time_series_bands(series_result))
+        except Exception as e:
+            import traceback
+            error_msg = f"Ошибка построения полос: {str(e)}\n{traceback.format_exc()}"
+            self.root.after(0, lambda: messagebox.showerror(
+                "Ошибка построения полос", error_msg))
+        finally:
+            self.root.after(
+                0, lambda: self.run_bands_button.config(state="normal"))
+            self.is_simulating = False
+
+    def _show_time_series_bands(self, series_result):
+        """Отображение полос квантилей длины очереди и загрузки касс"""
+        for widget in self.experiment_plot_frame.winfo_children():
+            widget.destroy()
+
+        results_frame = ttk.Frame(self.experiment_plot_frame)
+        results_frame.pack(fill="both", expand=True)
+
+        plot_frame = ttk.Frame(results_frame)
+        plot_frame.pack(fill="both", expand=True, side="left", padx=5, pady=5)
+
+        conclusions_frame = ttk.LabelFrame(
+            results_frame, text="Выводы по динамике очереди")
+        conclusions_frame.pack(fill="y", side="right", padx=5,
+                               pady=5, ipadx=5, ipady=5, anchor="ne", expand=False)
+
+        visualizer = SimulationVisualizer({})
+        fig = visualizer.plot_time_series_bands(series_result)
+        if fig:
+            canvas = FigureCanvasTkAgg(fig, plot_frame)
+            canvas.draw()
+            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+        probabilities = sorted(series_result['probabilities'])
+        high = series_result['queue_length'][probabilities[-1]]
+        median = series_result['queue_length'][min(probabilities, key=lambda p: abs(p - 0.5))]
+        peak = int(np.argmax(high))
+        times = series_result['times']
+        conclusions = [
+            f"Репликаций: {series_result['replications']}, "
+            f"интервал сетки: {series_result['bin_width']:g} мин",
+            f"Наибольшая медианная очередь: {max(median):.1f} чел. "
+            f"(около {times[int(np.argmax(median))]:.0f} мин)",
+            f"Верхняя граница полосы ({probabilities[-1]:.0%}) максимальна около "
+            f"{times[peak]:.0f} мин: {high[peak]:.1f} чел.",
+        ]
+        self.bands_result_var.set(f"Готово репликаций: {series_result['replications']}")
+        self._create_conclusions_text(conclusions_frame, conclusions)
+
+    def run_control_variates(self):
+        """Запуск оценок по репликациям с контрольными переменными"""
+        if self.is_simulating:
+            return
+
+        base_params = self._get_simulation_params()
+        if not base_params:
+            return
+
+        try:
+            num_replications = int(self.cv_replications_var.get())
+        except ValueError as e:
+            messagebox.showerror(
+                "Ошибка ввода", f"Неверный формат входных данных: {str(e)}")
+            return
+
+        if num_replications < 5:
+            messagebox.showerror("Ошибка", "Нужно не меньше 5 репликаций")
+            return
+
+        # Обновление статуса
+        self.is_simulating = True
+        self.run_cv_button.config(state="disabled")
+        self.cv_result_var.set("Выполняются репликации...")
+
+        threading.Thread(target=self._control_variates_thread,
+                         args=(base_params, num_replications), daemon=True).start()
+
+    def _control_variates_thread(self, base_params, num_replications):
+        """Поток оценок с контрольными переменными"""
+        try:
+            cv_result = control_variate_estimates(base_params, num_replications)
+            self.root.after(0, lambda: self._show_control_variates(cv_result))
+        except Exception as e:
+            import traceback
+            error_msg = f"Ошибка оценки: {str(e)}\n{traceback.format_exc()}"
+            self.root.after(0, lambda: messagebox.showerror(
+                "Ошибка оценки", error_msg))
+        finally:
+            self.root.after(
+                0, lambda: self.run_cv_button.config(state="normal"))
+            self.is_simulating = False
+
+    def _show_control_variates(self, cv_result):
+        """Отображение оценок с контрольными переменными"""
+        self.cv_result_var.set(f"Готово репликаций: {cv_result['replications']}")
+
+        for widget in self.experiment_plot_frame.winfo_children():
+            widget.destroy()
+
+        results_frame = ttk.Frame(self.experiment_plot_frame)
+        results_frame.pack(fill="both", expand=True)
+
+        plot_frame = ttk.Frame(results_frame)
+        plot_frame.pack(fill="both", expand=True, side="left", padx=5, pady=5)
+
+        conclusions_frame = ttk.LabelFrame(
+            results_frame, text="Выводы по контрольным переменным")
+        conclusions_frame.pack(fill="y", side="right", padx=5,
+                               pady=5, ipadx=5, ipady=5, anchor="ne", expand=False)
+
+        metric_labels = {name: self._get_metric_name_ru(name).capitalize()
+                         for name in cv_result['estimates']}
+        visualizer = SimulationVisualizer({})
+        fig = visualizer.plot_control_variates(cv_result, metric_labels)
+        if fig:
+            canvas = FigureCanvasTkAgg(fig, plot_frame)
+            canvas.draw()
+            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+        if cv_result['controls']:
+            controls = ", ".join(self._get_param_name_ru(name).lower()
+                                 for name in cv_result['controls'])
+            conclusions = [f"Контрольные переменные: {controls}"]
+        else:
+            conclusions = ["Нет входных величин с точно известным средним, "
+                           "оценки не уточнялись"]
+        for name, estimate in cv_result['estimates'].items():
+            raw_mean, raw_lower, raw_upper = estimate['raw']
+            mean, lower, upper = estimate['adjusted']
+            conclusions.append(
+                f"{metric_labels[name]}: {mean:.2f} [{lower:.2f}; {upper:.2f}] "
+                f"вместо {raw_mean:.2f} [{raw_lower:.2f}; {raw_upper:.2f}]; "
+                f"для той же точности достаточно около "
+                f"{estimate['replications_ratio']:.0%} репликаций")
+        self._create_conclusions_text(conclusions_frame, conclusions)
+
+    def run_calibration(self):
+        """Запуск калибровки средних времен по наблюдаемым показателям"""
+        if self.is_simulating:
+            return
+
+        base_params = self._get_simulation_params()
+        if not base_params:
+            return
+
+        try:
+            targets = {}
+            for name, var in self.calibration_target_vars.items():
+                text = var.get().strip()
+                if text:
+                    value = float(text)
+                    targets[name] = value / 100 if name == 'avg_cash_desk_utilization' else value
+            replications = int(self.calibration_replications_var.get())
+        except ValueError as e:
+            messagebox.showerror(
+                "Ошибка ввода", f"Неверный формат входных данных: {str(e)}")
+            return
+
+        if not targets or replications < 1 or any(value < 0 for value in targets.values()):
+            messagebox.showerror("Ошибка", "Укажите хотя бы один неотрицательный показатель")
+            return
+        if base_params.get('arrival_trace'):
+            messagebox.showerror("Ошибка", "Калибровка недоступна для журнала прибытий")
+            return
+
+        # Обновление статуса
+        self.is_simulating = True
+        self.run_calibration_button.config(state="disabled")
+        self.calibration_result_var.set("Выполняется калибровка...")
+
+        threading.Thread(target=self._calibration_thread,
+                         args=(base_params, targets, replications),
+                         daemon=True).start()
+
+    def _calibration_thread(self, base_params, targets, replications):
+        """Поток калибровки параметров"""
+        try:
+            def progress(iteration, value):
+                text = f"Итерация {iteration}, целевая функция {value:.2e}"
+                self.root.after(0, lambda: self.calibration_result_var.set(text))
+
+            calibration_result = calibrate_parameters(
+                base_params, targets, replications=replications, progress_callback=progress)
+            self.root.after(0, lambda: self._show_calibration_results(calibration_result))
+        except Exception as e:
+            import traceback
+            error_msg = f"Ошибка калибровки: {str(e)}\n{traceback.format_exc()}"
+            self.root.after(0, lambda: messagebox.showerror(
+                "Ошибка калибровки", error_msg))
+        finally:
+            self.root.after(
+                0, lambda: self.run_calibration_button.config(state="normal"))
+            self.is_simulating = False
+
+    def _show_calibration_results(self, calibration_result):
+        """Отображение результатов калибровки"""
+        self.calibration_result = calibration_result
+        self.apply_calibration_button.config(state="normal")
+        self.calibration_result_var.set(
+            f"Готово: {calibration_result['iterations']} итераций, "
+            f"{calibration_result['simulations_run']} прогонов")
+
+        for widget in self.experiment_plot_frame.winfo_children():
+            widget.destroy()
+
+        results_frame = ttk.Frame(self.experiment_plot_frame)
+        results_frame.pack(fill="both", expand=True)
+
+        plot_frame = ttk.Frame(results_frame)
+        plot_frame.pack(fill="both", expand=True, side="left", padx=5, pady=5)
+
+        conclusions_frame = ttk.LabelFrame(
+            results_frame, text="Выводы по калибровке")
+        conclusions_frame.pack(fill="y", side="right", padx=5,
+                               pady=5, ipadx=5, ipady=5, anchor="ne", expand=False)
+
+        kpi_labels = {name: self._get_metric_name_ru(name)
+                      for name in calibration_result['targets']}
+        visualizer = SimulationVisualizer({})
+        fig = visualizer.plot_calibration(calibration_result, kpi_labels)
+        if fig:
+            canvas = FigureCanvasTkAgg(fig, plot_frame)
+            canvas.draw()
+            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+        conclusions = []
+        for name, value in calibration_result['params'].items():
+            initial = calibration_result['initial_params'][name]
+            conclusions.append(f"{self._get_param_name_ru(name)}: {value:.2f} мин "
+                               f"(было {initial:.2f})")
+        for name, target in calibration_result['targets'].items():
+            value = calibration_result['kpis'][name]
+            if name == 'avg_cash_desk_utilization':
+                conclusions.append(f"{kpi_labels[name].capitalize()}: {value:.1%} "
+                                   f"(наблюдается {target:.1%})")
+            else:
+                conclusions.append(f"{kpi_labels[name].capitalize()}: {value:.2f} "
+                                   f"(наблюдается {target:.2f})")
+        if not calibration_result['converged']:
+            conclusions.append("Поиск остановлен по числу итераций, точность может быть недостаточной")
+        if 'avg_time_in_shop' not in calibration_result['targets']:
+            conclusions.append("Без наблюдаемого времени в магазине среднее время выбора "
+                               "товаров определяется неточно")
+        conclusions.append(f"Оценено точек: {calibration_result['points_evaluated']}, "
+                           f"прогонов: {calibration_result['simulations_run']}")
+        self._create_conclusions_text(conclusions_frame, conclusions)
+
+    def apply_calibration(self):
+        """Перенос найденных параметров на вкладку симуляции"""
+        if not self.calibration_result:
+            return
+        params = self.calibration_result['params']
+        variables = {
+            'customer_arrival_mean': self.arrival_mean_var,
+            'shopping_time_mean': self.shopping_mean_var,
+            'service_time_mean': self.service_mean_var,
+        }
+        for name, var in variables.items():
+            if name in params:
+                var.set(f"{params[name]:.2f}")
+
+    def run_report(self):
+        """Построение отчета с графиками и показателями по точкам эксперимента"""
+        if self.is_simulating:
+            return
+        if not self.experiment_results or self.experiment_base_params is None:
+            messagebox.showinfo("Информация", "Сначала проведите эксперимент")
+            return
+
+        directory = filedialog.askdirectory(title="Каталог для отчета")
+        if not directory:
+            return
+
+        param_name = self.experiment_param_name
+        scenarios = []
+        for value in self.experiment_param_values:
+            params = self.experiment_base_params.copy()
+            params[param_name] = int(value) if param_name == "num_cash_desks" else float(value)
+            scenarios.append((f"{self._get_param_name_ru(param_name)} = {value:g}", params))
+
+        self.is_simulating = True
+        self.run_report_button.config(state="disabled")
+        self.report_result_var.set("Построение отчета...")
+        threading.Thread(target=self._report_thread, args=(scenarios, directory),
+                         daemon=True).start()
+
+    def _report_thread(self, scenarios, directory):
+        """Поток построения отчета (графики строятся в рабочих процессах)"""
+        try:
+            done = []
+
+            def progress(entry):
+                done.append(entry)
+                text = f"Построено сценариев: {len(done)} из {len(scenarios)}"
+                self.root.after(0, lambda: self.report_result_var.set(text))
+
+            path = generate_report(scenarios, directory, progress_callback=progress)
+            self.root.after(0, lambda: self.report_result_var.set(f"Отчет сохранен: {path}"))
+        except Exception as e:
+            import traceback
+            error_msg = f"Ошибка построения отчета: {str(e)}\n{traceback.format_exc()}"
+            self.root.after(0, lambda: messagebox.showerror(
+                "Ошибка построения отчета", error_msg))
+        finally:
+            self.root.after(
+                0, lambda: self.run_report_button.config(state="normal"))
+            self.is_simulating = False
+
+    def save_experiment(self):
+        """
+        Сохранение результатов эксперимента и обученной метамодели в JSON
+
+        Сохраняются сводки показателей по точкам (без массивов по
+        покупателям), базовые параметры и метамодель, поэтому после загрузки
+        прогнозы 'что если' доступны без повторного обучения и симуляций.
+        """
+        if not self.experiment_results or self.experiment_base_params is None:
+            messagebox.showinfo("Информация", "Сначала проведите эксперимент")
+            return
+
+        path = filedialog.asksaveasfilename(
+            title="Сохранить эксперимент", defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("Все файлы", "*.*")])
+        if not path:
+            return
+
+        # Журнал прибытий сохраняется путем к файлу
+        base_params = dict(self.experiment_base_params)
+        trace = base_params.pop('arrival_trace', None)
+        if trace is not None:
+            base_params['arrival_trace_path'] = trace.path
+
+        data = {
+            'param_name': self.experiment_param_name,
+            'metric_name': self.experiment_metric_name,
+            'param_values': [float(value) for value in self.experiment_param_values],
+            'pruned_values': self.experiment_pruned_values,
+            'base_params': base_params,
+            'results': [dict(summarize_results(result), unstable=bool(result.get('unstable')))
+                        for result in self.experiment_results],
+            'metamodel': self.experiment_metamodel.to_dict(),
+        }
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, default=float)
+        except OSError as e:
+            messagebox.showerror("Ошибка сохранения", f"Не удалось сохранить эксперимент: {str(e)}")
+
+    def load_experiment(self):
+        """Загрузка сохраненного эксперимента с метамоделью и вывод его результатов"""
+        if self.is_simulating:
+            return
+
+        path = filedialog.askopenfilename(
+            title="Загрузить эксперимент",
+            filetypes=[("JSON", "*.json"), ("Все файлы", "*.*")])
+        if not path:
+            return
+
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            base_params = data['base_params']
+            trace_path = base_params.pop('arrival_trace_path', None)
+            if trace_path is not None:
+                base_params['arrival_trace'] = CsvArrivalTrace(
+                    trace_path, service_column='service_time')
+            metamodel = SweepMetamodel.from_dict(data['metamodel'])
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("Ошибка загрузки", f"Не удалось загрузить эксперимент: {str(e)}")
+            return
+
+        param_name = data['param_name']
+        param_values = data['param_values']
+        if param_name == "num_cash_desks":
+            param_values = [int(value) for value in param_values]
+
+        self.experiment_results = data['results']
+        self.experiment_param_values = param_values
+        self.experiment_metamodel = metamodel
+        self.experiment_pruned_values = data['pruned_values']
+        self.experiment_base_params = base_params
+        self.experiment_param_name = param_name
+        self._show_experiment_results(param_name, param_values, data['metric_name'])
+
+    def predict_with_metamodel(self):
+        """Мгновенная оценка метрики по метамодели для заданного значения параметра"""
+        metamodel = self.experiment_metamodel
+        if metamodel is None or not metamodel.is_fitted(self.experiment_metric_name):
+            messagebox.showinfo(
+                "Информация", "Сначала проведите эксперимент минимум с двумя значениями параметра")
+            return
+
+        try:
+            value = float(self.metamodel_value_var.get())
+        except ValueError as e:
+            messagebox.showerror(
+                "Ошибка ввода", f"Неверный формат входных данных: {str(e)}")
+            return
+
+        estimate, std = metamodel.predict(value, self.experiment_metric_name)
+        metric_label = self._get_metric_name_ru(self.experiment_metric_name)
+        self.metamodel_result_var.set(
+            f"{metric_label}: {estimate:.2f} ± {2 * std:.2f}")
+
+    def _generate_experiment_conclusions(self, param_name, param_values, metric_name, experiment_results):
+        """Генерирует выводы по результатам серии экспериментов"""
+        if not experiment_results or len(param_values) == 0:
+            return ["Недостаточно данных для формирования выводов."]
+
+        conclusions = []
+
+        # Получаем значения метрики для всех экспериментов
+        metric_values = [result.get(metric_name, 0)
+                         for result in experiment_results]
+
+        # Находим оптимальное значение параметра
+        if metric_name in ["avg_waiting_time", "avg_time_in_shop", "avg_queue_length"]:
+            # Для этих метрик ищем минимум
+            best_idx = np.argmin(metric_values)
+            best_value = param_values[best_idx]
+            best_metric = metric_values[best_idx]
+
+            if param_name == "num_cash_desks":
+                conclusions.append(
+                    f"Оптимальное количество касс: {int(best_value)} (при этом {self._get_metric_name_ru(metric_name)}: {best_metric:.2f})")
+
+                # Анализ эффективности добавления касс
+                if len(param_values) > 1:
+                    improvements = []
+                    for i in range(1, len(param_values)):
+                        if metric_values[i] < metric_values[i-1]:
+                            improvement = (
+                                metric_values[i-1] - metric_values[i]) / metric_values[i-1]
+                            improvements.append((param_values[i], improvement))
+
+                    if improvements:
+                        best_improvement = max(
+                            improvements, key=lambda x: x[1])
+                        if best_improvement[1] > 0.2:  # Если улучшение более 20%
+                            conclusions.append(
+                                f"Наибольший эффект дает увеличение количества касс до {int(best_improvement[0])} (улучшение на {best_improvement[1]:.1%})")
+
+            elif param_name == "customer_arrival_mean":
+                conclusions.append(
+                    f"При интервале прибытия покупателей {float(best_value):.1f} мин достигается минимальное {self._get_metric_name_ru(metric_name)}: {best_metric:.2f}")
+
+                # Анализ критической нагрузки
+                critical_idx = None
+                for i in range(len(param_values)-1):
+                    if param_values[i+1] > param_values[i] and metric_values[i+1] < metric_values[i] * 0.5:
+                        critical_idx = i
+                        break
+
+                if critical_idx is not None:
+                    conclusions.append(
+                        f"Критический интервал прибытия: {float(param_values[critical_idx]):.1f} мин, при его уменьшении резко возрастает {self._get_metric_name_ru(metric_name)}")
+
+            else:  # Для остальных параметров
+                conclusions.append(
+                    f"Оптимальное значение параметра '{self._get_param_name_ru(param_name)}': {float(best_value):.1f}")
+
+        elif metric_name == "avg_cash_desk_utilization":
+            # Для загрузки касс ищем оптимальное значение (не слишком низкое, не слишком высокое)
+            optimal_idx = None
+            for i, value in enumerate(metric_values):
+                if 0.7 <= value <= 0.85:
+                    optimal_idx = i
+                    break
+
+            if optimal_idx is not None:
+                optimal_value = param_values[optimal_idx]
+                if param_name == "num_cash_desks":
+                    conclusions.append(
+                        f"Оптимальная загрузка касс ({metric_values[optimal_idx]:.1%}) достигается при количестве касс: {int(optimal_value)}")
+                else:
+                    conclusions.append(
+                        f"Оптимальная загрузка касс ({metric_values[optimal_idx]:.1%}) достигается при значении параметра '{self._get_param_name_ru(param_name)}': {float(optimal_value):.1f}")
+            else:
+                # Если оптимальное значение не найдено, ищем ближайшее к 0.75
+                best_idx = np.argmin(np.abs(np.array(metric_values) - 0.75))
+                best_value = param_values[best_idx]
+                if param_name == "num_cash_desks":
+                    conclusions.append(
+                        f"Ближайшая к оптимальной загрузка касс ({metric_values[best_idx]:.1%}) достигается при количестве касс: {int(best_value)}")
+                else:
+                    conclusions.append(
+                        f"Ближайшая к оптимальной загрузка касс ({metric_values[best_idx]:.1%}) достигается при значении параметра '{self._get_param_name_ru(param_name)}': {float(best_value):.1f}")
+
+        # Общий тренд
+        if len(param_values) > 2:
+            is_decreasing = True
+            is_increasing = True
+
+            for i in range(1, len(metric_values)):
+                if metric_values[i] > metric_values[i-1]:
+                    is_decreasing = False
+                if metric_values[i] < metric_values[i-1]:
+                    is_increasing = False
+
+            if is_decreasing:
+                conclusions.append(
+                    f"Наблюдается устойчивое снижение {self._get_metric_name_ru(metric_name)} при увеличении параметра '{self._get_param_name_ru(param_name)}'")
+            elif is_increasing:
+                conclusions.append(
+                    f"Наблюдается устойчивый рост {self._get_metric_name_ru(metric_name)} при увеличении параметра '{self._get_param_name_ru(param_name)}'")
+
+        return conclusions
+
+    def _get_param_name_ru(self, param_name):
         """Возвращает русское название параметра"""
         param_labels = {
             "num_cash_desks": "Количество касс",
             "customer_arrival_mean": "Интервал прибытия покупателей",
             "shopping_time_mean": "Среднее время выбора товаров",
-            "service_time_mean": "Среднее время обслуживания"
+            "service_time_mean": "Среднее время обслуживания",
+            "simulation_time": "Время моделирования",
+            "shopping_time_dist": "Распределение времени выбора товаров",
+            "shopping_time_std": "Отклонение времени выбора товаров",
+            "shopping_time_min": "Минимальное время выбора товаров",
+            "shopping_time_max": "Максимальное время выбора товаров",
+            "service_time_dist": "Распределение времени обслуживания",
+            "service_time_std": "Отклонение времени обслуживания"
         }
         return param_labels.get(param_name, param_name)
 
@@ -722,7 +2203,8 @@ class ShopSimulatorGUI:
             "avg_waiting_time": "среднее время ожидания",
             "avg_time_in_shop": "среднее время в магазине",
             "avg_queue_length": "средняя длина очереди",
-            "avg_cash_desk_utilization": "средняя загрузка касс"
+            "avg_cash_desk_utilization": "средняя загрузка касс",
+            "p95_waiting_time": "95-й перцентиль времени ожидания"
         }
         return metric_labels.get(metric_name, metric_name)
 
@@ -749,10 +2231,13 @@ class ShopSimulatorGUI:
         conclusions_frame.pack(fill="y", side="right", padx=5,
                                pady=5, ipadx=5, ipady=5, anchor="ne", expand=False)
 
+        self.experiment_metric_name = metric_name
+
         # Создание визуализатора и построение графика эксперимента
         visualizer = SimulationVisualizer({})
         fig = visualizer.plot_comparative_experiment(
-            self.experiment_results, param_name, param_values, metric_name)
+            self.experiment_results, param_name, param_values, metric_name,
+            metamodel=self.experiment_metamodel)
 
         if fig:
             # Создание канваса для отображения графика
@@ -764,39 +2249,71 @@ class ShopSimulatorGUI:
             conclusions = self._generate_experiment_conclusions(
                 param_name, param_values, metric_name, self.experiment_results)
 
-            # Создаем текстовое поле для выводов с возможностью копирования
-            conclusions_text = tk.Text(
-                conclusions_frame, width=40, height=15, wrap=tk.WORD)
-            conclusions_text.pack(fill="both", expand=True, padx=5, pady=5)
+            # Точки, отброшенные до симуляции по аналитической оценке
+            if self.experiment_pruned_values:
+                pruned_text = ", ".join(
+                    f"{value:g}" for value in self.experiment_pruned_values)
+                conclusions.append(
+                    f"Без симуляции пропущены перегруженные значения параметра "
+                    f"'{self._get_param_name_ru(param_name)}': {pruned_text}")
+
+            # Точки, остановленные досрочно из-за неограниченного роста очереди
+            unstable_values = [value for value, result in zip(param_values, self.experiment_results)
+                               if result.get('unstable')]
+            if unstable_values:
+                unstable_text = ", ".join(f"{float(value):g}" for value in unstable_values)
+                conclusions.append(
+                    f"Система неустойчива (очередь неограниченно растет, прогон остановлен "
+                    f"досрочно) при значениях параметра '{self._get_param_name_ru(param_name)}': "
+                    f"{unstable_text}")
+
+            # Рекомендация следующей точки по неопределенности метамодели
+            metamodel = self.experiment_metamodel
+            if metamodel is not None and metamodel.is_fitted(metric_name):
+                next_point = metamodel.recommend_next_point(metric_name)
+                if next_point is not None:
+                    conclusions.append(
+                        f"Наиболее информативное следующее значение параметра "
+                        f"'{self._get_param_name_ru(param_name)}': {next_point[0]:.2f} "
+                        f"(неопределенность прогноза ± {2 * next_point[1]:.2f})")
 
-            # Добавляем скроллбар
-            scrollbar = ttk.Scrollbar(
-                conclusions_frame, command=conclusions_text.yview)
-            scrollbar.pack(side="right", fill="y")
-            conclusions_text.config(yscrollcommand=scrollbar.set)
+            self._create_conclusions_text(conclusions_frame, conclusions)
+        else:
+            label = ttk.Label(plot_frame, text="Нет данных для отображения")
+            label.pack(padx=20, pady=20)
 
-            # Вставляем выводы
-            for conclusion in conclusions:
-                conclusions_text.insert(tk.END, f"• {conclusion}\n\n")
+    def _create_conclusions_text(self, conclusions_frame, conclusions):
+        """Создает текстовое поле с выводами и возможностью копирования"""
+        conclusions_text = tk.Text(
+            conclusions_frame, width=40, height=15, wrap=tk.WORD)
+        conclusions_text.pack(fill="both", expand=True, padx=5, pady=5)
 
-            # Делаем текст доступным для копирования, но не для редактирования
-            conclusions_text.configure(state="normal")
+        # Добавляем скроллбар
+        scrollbar = ttk.Scrollbar(
+            conclusions_frame, command=conclusions_text.yview)
+        scrollbar.pack(side="right", fill="y")
+        conclusions_text.config(yscrollcommand=scrollbar.set)
 
-            # Добавляем контекстное меню для копирования
-            conclusions_menu = tk.Menu(conclusions_text, tearoff=0)
-            conclusions_menu.add_command(
-                label="Копировать", command=lambda: self._copy_conclusions_text(conclusions_text))
+        # Вставляем выводы
+        for conclusion in conclusions:
+            conclusions_text.insert(tk.END, f"• {conclusion}\n\n")
 
-            # Привязываем контекстное меню к правой кнопке мыши
-            conclusions_text.bind(
-                "<Button-3>", lambda event: self._show_conclusions_menu(event, conclusions_menu))
+        # Делаем текст доступным для копирования, но не для редактирования
+        conclusions_text.configure(state="normal")
 
-            # Привязываем стандартные сочетания клавиш для копирования
-            conclusions_text.bind(
-                "<Control-c>", lambda event: self._copy_conclusions_text(conclusions_text, event))
-        else:
-            label = ttk.Label(plot_frame, text="Нет данных для отображения")
-            label.pack(padx=20, pady=20)
+        # Добавляем контекстное меню для копирования
+        conclusions_menu = tk.Menu(conclusions_text, tearoff=0)
+        conclusions_menu.add_command(
+            label="Копировать", command=lambda: self._copy_conclusions_text(conclusions_text))
+
+        # Привязываем контекстное меню к правой кнопке мыши
+        conclusions_text.bind(
+            "<Button-3>", lambda event: self._show_conclusions_menu(event, conclusions_menu))
+
+        # Привязываем стандартные сочетания клавиш для копирования
+        conclusions_text.bind(
+            "<Control-c>", lambda event: self._copy_conclusions_text(conclusions_text, event))
+        return conclusions_text
 
     def _copy_conclusions_text(self, text_widget, event=None):
         """Копирование выделенного текста из выводов по экспериментам"""
@@ -849,7 +2366,9 @@ def main():
     root = tk.Tk()
     app = ShopSimulatorGUI(root)
     root.mainloop()
+    app.experiment_store.cleanup()
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
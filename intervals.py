@@ -0,0 +1,169 @@
+import numpy as np
+
+from events import ARRIVAL, DEPARTURE, QUEUE_JOIN, REJECT, RENEGE, SERVICE_END, SERVICE_START
+from sketches import StreamingQuantile
+
+
+class IntervalStats:
+    """
+    Онлайн-статистика по интервалам модельного времени
+
+    Накапливает по интервалам ширины bin_width количество прибытий и
+    обслуженных покупателей, среднее и 95-й процентиль ожидания (по
+    интервалу постановки в очередь), среднюю по времени длину очереди
+    (ожидающие и обслуживаемые покупатели) и время занятости каждой кассы.
+    Статистика обновляется по событиям модели (см. events.py) за O(1) на
+    событие и не требует хранения данных по отдельным покупателям;
+    интервалы добавляются по мере продвижения модельного времени.
+    """
+
+    def __init__(self, bin_width=60.0, horizon=0.0):
+        """
+        Args:
+            bin_width (float): Ширина интервала (мин)
+            horizon (float): Ожидаемая длительность прогона (мин): интервалы
+                до нее создаются заранее
+        """
+        if bin_width <= 0:
+            raise ValueError("Ширина интервала должна быть положительной")
+        self.bin_width = float(bin_width)
+        self.num_bins = 0
+        self.arrivals = []
+        self.completions = []
+        self.wait_counts = []
+        self.wait_sums = []
+        self.wait_p95 = []
+        self.queue_area = []
+        # Время занятости по кассам: номер кассы -> список по интервалам
+        self.desk_busy = {}
+        # Текущая длина очереди и момент ее последнего изменения
+        self.queue_length = 0
+        self.queue_since = 0.0
+        # Моменты начала текущего обслуживания на кассах
+        self.desk_started = {}
+        self._grow(int(horizon // self.bin_width))
+
+    def _grow(self, index):
+        """Добавление интервалов до номера index включительно"""
+        missing = index + 1 - self.num_bins
+        if missing <= 0:
+            return
+        for values in (self.arrivals, self.completions, self.wait_counts):
+            values.extend([0] * missing)
+        for values in (self.wait_sums, self.queue_area, *self.desk_busy.values()):
+            values.extend([0.0] * missing)
+        self.wait_p95.extend([None] * missing)
+        self.num_bins = index + 1
+
+    def _add_span(self, values, start, end, weight=1.0):
+        """Распределение отрезка [start, end) по интервалам с весом weight"""
+        width = self.bin_width
+        index = int(start // width)
+        last = int(end // width)
+        if last == index:
+            # Отрезок внутри одного интервала (основной случай)
+            values[index] += (end - start) * weight
+            return
+        if last >= self.num_bins:
+            self._grow(last)
+        while start < end:
+            stop = min(end, (index + 1) * width)
+            values[index] += (stop - start) * weight
+            start = stop
+            index += 1
+
+    def record(self, time, kind, desk_id=None, value=None):
+        """
+        Учет одного события модели
+
+        Args:
+            time (float): Момент события
+            kind (str): Тип события (константа из events.py)
+            desk_id: Номер кассы (для событий обслуживания)
+            value: Время ожидания для SERVICE_START
+        """
+        index = int(time // self.bin_width)
+        if index >= self.num_bins:
+            self._grow(index)
+
+        if kind == QUEUE_JOIN or kind == DEPARTURE or kind == RENEGE:
+            # Площадь под графиком длины очереди до текущего момента
+            if self.queue_length:
+                self._add_span(self.queue_area, self.queue_since, time, self.queue_length)
+            self.queue_since = time
+            if kind == QUEUE_JOIN:
+                self.queue_length += 1
+                return
+            self.queue_length -= 1
+            if kind == DEPARTURE:
+                self.completions[index] += 1
+        elif kind == SERVICE_START:
+            # Ожидание относится к интервалу постановки в очередь
+            index = int((time - value) // self.bin_width)
+            self.wait_counts[index] += 1
+            self.wait_sums[index] += value
+            quantile = self.wait_p95[index]
+            if quantile is None:
+                quantile = self.wait_p95[index] = StreamingQuantile(0.95)
+            quantile.add(value)
+            self.desk_started[desk_id] = time
+        elif kind == SERVICE_END:
+            busy = self.desk_busy.get(desk_id)
+            if busy is None:
+                busy = self.desk_busy[desk_id] = [0.0] * self.num_bins
+            self._add_span(busy, self.desk_started.pop(desk_id), time)
+        elif kind == ARRIVAL or kind == REJECT:
+            self.arrivals[index] += 1
+
+    def results(self, end_time, num_desks=0):
+        """
+        Статистика по интервалам на момент end_time в виде массивов
+
+        Незавершенные обслуживания и текущая длина очереди учитываются до
+        end_time; накопленное состояние не изменяется, поэтому модель
+        можно продолжить.
+
+        Args:
+            end_time (float): Момент окончания наблюдения
+            num_desks (int): Минимальное количество касс в результатах
+
+        Returns:
+            dict: Массивы по интервалам с ключами 'interval_*'
+        """
+        width = self.bin_width
+        num_bins = max(1, int(np.ceil(end_time / width)))
+        self._grow(num_bins)
+
+        queue_area = list(self.queue_area)
+        if self.queue_length:
+            self._add_span(queue_area, self.queue_since, end_time, self.queue_length)
+
+        desks = max([num_desks, *(desk + 1 for desk in self.desk_busy),
+                     *(desk + 1 for desk in self.desk_started)])
+        busy = np.zeros((desks, num_bins))
+        for desk, values in self.desk_busy.items():
+            busy[desk] = values[:num_bins]
+        for desk, start in self.desk_started.items():
+            span = [0.0] * self.num_bins
+            self._add_span(span, start, end_time)
+            busy[desk] += span[:num_bins]
+
+        # Длительность наблюдения в каждом интервале (последний может быть неполным)
+        edges = np.minimum(np.arange(num_bins + 1) * width, end_time)
+        observed = np.diff(edges)
+        counts = np.array(self.wait_counts[:num_bins], dtype=np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_wait = np.where(counts > 0, np.array(self.wait_sums[:num_bins]) / counts, 0.0)
+            avg_queue = np.where(observed > 0, np.array(queue_area[:num_bins]) / observed, 0.0)
+
+        return {
+            'interval_width': width,
+            'interval_arrivals': np.array(self.arrivals[:num_bins], dtype=np.int64),
+            'interval_completions': np.array(self.completions[:num_bins], dtype=np.int64),
+            'interval_avg_waiting_time': avg_wait,
+            'interval_p95_waiting_time': np.array(
+                [q.value() if q is not None else 0.0 for q in self.wait_p95[:num_bins]]),
+            'interval_avg_queue_length': avg_queue,
+            'interval_desk_busy_time': busy,
+            'interval_observed_time': observed,
+        }
@@ -7,7 +7,9 @@
 Главный модуль для запуска приложения.
 """
 
+import multiprocessing
 import tkinter as tk
+
 from gui import ShopSimulatorGUI
 
 
@@ -16,7 +18,12 @@ def main():
     root = tk.Tk()
     app = ShopSimulatorGUI(root)
     root.mainloop()
+    # Удаление файлов результатов экспериментов
+    app.experiment_store.cleanup()
 
 
 if __name__ == "__main__":
+    # В собранном exe (ShopSimulator.spec) рабочие процессы пулов запускают
+    # тот же файл: freeze_support выполняет в них задание вместо окна программы
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,200 @@
+import numpy as np
+
+
+# Метрики, для которых строится метамодель
+METAMODEL_METRICS = [
+    'avg_waiting_time',
+    'avg_time_in_shop',
+    'avg_queue_length',
+    'avg_cash_desk_utilization',
+    'p95_waiting_time',
+]
+
+
+class GaussianProcessModel:
+    """Одномерная гауссовская регрессия с квадратично-экспоненциальным ядром"""
+
+    # Сетка гиперпараметров (в нормированных координатах) для подбора
+    LENGTH_SCALES = (0.05, 0.1, 0.2, 0.35, 0.5, 1.0, 2.0)
+    NOISE_LEVELS = (1e-4, 1e-3, 1e-2, 5e-2, 0.1, 0.3)
+
+    def __init__(self, x_values, y_values):
+        """
+        Обучение модели по точкам эксперимента
+
+        Args:
+            x_values: значения параметра
+            y_values: значения метрики
+        """
+        x = np.asarray(x_values, dtype=float)
+        y = np.asarray(y_values, dtype=float)
+
+        # Нормировка входа на [0, 1] и выхода к нулевому среднему и единичной дисперсии
+        self.x_min = float(np.min(x))
+        self.x_scale = float(np.max(x) - np.min(x)) or 1.0
+        self.y_mean = float(np.mean(y))
+        self.y_scale = float(np.std(y)) or 1.0
+
+        self.x_train = (x - self.x_min) / self.x_scale
+        y_norm = (y - self.y_mean) / self.y_scale
+
+        # Подбор гиперпараметров по максимуму правдоподобия на сетке
+        best = None
+        for length_scale in self.LENGTH_SCALES:
+            for noise in self.NOISE_LEVELS:
+                fitted = self._fit(length_scale, noise, y_norm)
+                if fitted is not None and (best is None or fitted[0] > best[0]):
+                    best = fitted
+        _, self.length_scale, self.noise, self.cholesky, self.alpha = best
+
+    def _kernel(self, a, b, length_scale):
+        """Квадратично-экспоненциальное ядро"""
+        diff = np.subtract.outer(a, b)
+        return np.exp(-0.5 * (diff / length_scale) ** 2)
+
+    def _fit(self, length_scale, noise, y_norm):
+        """Разложение Холецкого и логарифм правдоподобия для гиперпараметров"""
+        n = len(self.x_train)
+        k = self._kernel(self.x_train, self.x_train,
+                         length_scale) + noise * np.eye(n)
+        try:
+            cholesky = np.linalg.cholesky(k)
+        except np.linalg.LinAlgError:
+            return None
+        alpha = np.linalg.solve(cholesky.T, np.linalg.solve(cholesky, y_norm))
+        log_likelihood = (-0.5 * y_norm @ alpha
+                          - np.sum(np.log(np.diag(cholesky)))
+                          - 0.5 * n * np.log(2 * np.pi))
+        return log_likelihood, length_scale, noise, cholesky, alpha
+
+    def predict(self, x_values):
+        """
+        Прогноз метрики с неопределенностью
+
+        Returns:
+            tuple: (массив средних, массив стандартных отклонений)
+        """
+        x = (np.atleast_1d(np.asarray(x_values, dtype=float)) -
+             self.x_min) / self.x_scale
+        k_star = self._kernel(x, self.x_train, self.length_scale)
+        mean = k_star @ self.alpha
+        v = np.linalg.solve(self.cholesky, k_star.T)
+        variance = np.maximum(1.0 - np.sum(v ** 2, axis=0), 0.0)
+        return (mean * self.y_scale + self.y_mean,
+                np.sqrt(variance) * self.y_scale)
+
+    def to_dict(self):
+        """Сериализация обученной модели"""
+        return {
+            'x_min': self.x_min,
+            'x_scale': self.x_scale,
+            'y_mean': self.y_mean,
+            'y_scale': self.y_scale,
+            'x_train': self.x_train.tolist(),
+            'length_scale': self.length_scale,
+            'noise': self.noise,
+            'cholesky': self.cholesky.tolist(),
+            'alpha': self.alpha.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Восстановление модели без повторного обучения"""
+        model = cls.__new__(cls)
+        model.x_min = data['x_min']
+        model.x_scale = data['x_scale']
+        model.y_mean = data['y_mean']
+        model.y_scale = data['y_scale']
+        model.x_train = np.asarray(data['x_train'], dtype=float)
+        model.length_scale = data['length_scale']
+        model.noise = data['noise']
+        model.cholesky = np.asarray(data['cholesky'], dtype=float)
+        model.alpha = np.asarray(data['alpha'], dtype=float)
+        return model
+
+
+class SweepMetamodel:
+    """Метамодель результатов эксперимента для мгновенных оценок 'что если'"""
+
+    def __init__(self, param_name, param_values, experiment_results, metrics=None):
+        """
+        Обучение метамоделей по завершенным запускам эксперимента
+
+        Args:
+            param_name: имя изменяемого параметра
+            param_values: список значений параметра
+            experiment_results: список словарей с результатами
+            metrics: список метрик (по умолчанию METAMODEL_METRICS)
+        """
+        self.param_name = param_name
+        self.param_values = [float(value) for value in param_values]
+        self.models = {}
+
+        if len(self.param_values) < 2:
+            return
+
+        for metric_name in metrics or METAMODEL_METRICS:
+            values = [result.get(metric_name) for result in experiment_results]
+            if any(value is None for value in values):
+                continue
+            self.models[metric_name] = GaussianProcessModel(
+                self.param_values, [float(value) for value in values])
+
+    def is_fitted(self, metric_name):
+        """Проверяет, обучена ли модель для метрики"""
+        return metric_name in self.models
+
+    def predict(self, value, metric_name):
+        """
+        Прогноз метрики для произвольного значения параметра
+
+        Returns:
+            tuple: (оценка, стандартное отклонение)
+        """
+        mean, std = self.models[metric_name].predict(value)
+        return float(mean[0]), float(std[0])
+
+    def predict_curve(self, values, metric_name):
+        """Прогноз метрики на сетке значений параметра"""
+        return self.models[metric_name].predict(values)
+
+    def recommend_next_point(self, metric_name, num_candidates=200):
+        """
+        Рекомендация следующей точки для симуляции
+
+        Выбирается точка диапазона с наибольшей неопределенностью прогноза,
+        не совпадающая с уже просчитанными.
+        """
+        low, high = min(self.param_values), max(self.param_values)
+        if self.param_name == "num_cash_desks":
+            candidates = np.arange(int(low), int(high) + 1, dtype=float)
+        else:
+            candidates = np.linspace(low, high, num_candidates)
+
+        known = np.asarray(self.param_values)
+        candidates = np.array([c for c in candidates
+                               if np.min(np.abs(known - c)) > 1e-9])
+        if len(candidates) == 0:
+            return None
+
+        _, std = self.models[metric_name].predict(candidates)
+        best_idx = int(np.argmax(std))
+        return float(candidates[best_idx]), float(std[best_idx])
+
+    def to_dict(self):
+        """Сериализация метамодели для хранения вместе с результатами"""
+        return {
+            'param_name': self.param_name,
+            'param_values': self.param_values,
+            'models': {name: model.to_dict() for name, model in self.models.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Восстановление метамодели из сохраненного словаря"""
+        metamodel = cls.__new__(cls)
+        metamodel.param_name = data['param_name']
+        metamodel.param_values = list(data['param_values'])
+        metamodel.models = {name: GaussianProcessModel.from_dict(model)
+                            for name, model in data['models'].items()}
+        return metamodel
@@ -0,0 +1,337 @@
+import math
+
+import numpy as np
+
+from analytic import service_time_moments
+from parallel import map_in_processes
+from replications import run_replications, confidence_interval, replication_params
+from upstream import simulate_with_schedule
+
+
+def _stability_lower_bound(params):
+    """
+    Минимальное количество касс, при котором очередь стабильна
+
+    Число касс должно превышать предлагаемую нагрузку
+    (интенсивность прибытия * среднее время обслуживания),
+    иначе очередь в среднем растет без ограничений.
+    """
+    arrival_mean = float(params.get('customer_arrival_mean', 5))
+    if arrival_mean <= 0:
+        return 1
+    mean_service, _ = service_time_moments(params)
+    offered_load = mean_service / arrival_mean
+    return int(math.floor(offered_load)) + 1
+
+
+def find_min_cash_desks(base_params, target_wait, metric_name='p95_waiting_time',
+                        min_desks=1, max_desks=20, confidence=0.95,
+                        initial_replications=3, max_replications=15,
+                        use_load_bound=True, progress_callback=None):
+    """
+    Поиск минимального количества касс, удовлетворяющего SLA по ожиданию
+
+    Использует монотонность метрики ожидания по числу касс: сначала
+    находится интервал, содержащий границу допустимости (удвоение шага),
+    затем граница уточняется делением пополам. Репликации запускаются
+    только в проверяемых точках и добавляются последовательно, пока
+    доверительный интервал не окажется целиком по одну сторону от цели
+    (процедура ранжирования и отбора).
+
+    Args:
+        base_params (dict): Базовые параметры модели
+        target_wait (float): Целевое значение метрики ожидания (мин)
+        metric_name (str): Метрика для проверки SLA
+        min_desks (int): Минимальное рассматриваемое количество касс
+        max_desks (int): Максимальное рассматриваемое количество касс
+        confidence (float): Доверительная вероятность
+        initial_replications (int): Число репликаций в новой точке
+        max_replications (int): Предельное число репликаций в точке
+        use_load_bound (bool): Отбрасывать без симуляции нестабильные точки
+        progress_callback (callable): Вызывается с числом касс перед проверкой
+
+    Returns:
+        dict: Минимальное допустимое число касс и сведения о поиске
+    """
+    evaluations = {}
+
+    def evaluate(num_desks):
+        """Последовательная проверка допустимости одной точки"""
+        if progress_callback:
+            progress_callback(num_desks)
+
+        params = base_params.copy()
+        params['num_cash_desks'] = int(num_desks)
+
+        entry = evaluations.setdefault(num_desks, {'values': []})
+        while 'decision' not in entry or (entry['decision'] == 'uncertain' and
+                                          len(entry['values']) < max_replications):
+            batch = min(initial_replications,
+                        max_replications - len(entry['values']))
+            entry['values'].extend(run_replications(
+                params, batch, metric_name, start=len(entry['values'])))
+
+            mean, lower, upper = confidence_interval(
+                entry['values'], confidence)
+            entry.update({'mean': mean, 'ci': (float(lower), float(upper)),
+                          'replications': len(entry['values'])})
+
+            if upper <= target_wait:
+                entry['decision'] = 'feasible'
+            elif lower > target_wait:
+                entry['decision'] = 'infeasible'
+            else:
+                entry['decision'] = 'uncertain'
+
+        # При исчерпании репликаций решаем по точечной оценке
+        return entry['mean'] <= target_wait
+
+    # Нижняя граница: точки ниже порога стабильности заведомо недопустимы
+    lower = int(min_desks)
+    if use_load_bound:
+        lower = max(lower, _stability_lower_bound(base_params))
+
+    # Этап 1: поиск интервала с удвоением шага
+    infeasible = lower - 1
+    feasible = None
+    candidate = lower
+    step = 1
+    while candidate <= max_desks:
+        if evaluate(candidate):
+            feasible = candidate
+            break
+        infeasible = candidate
+        candidate = infeasible + step
+        step *= 2
+        if candidate > max_desks and infeasible < max_desks:
+            candidate = max_desks
+
+    # Этап 2: деление пополам внутри найденного интервала
+    if feasible is not None:
+        while feasible - infeasible > 1:
+            middle = (feasible + infeasible) // 2
+            if evaluate(middle):
+                feasible = middle
+            else:
+                infeasible = middle
+
+    simulations_run = sum(entry['replications']
+                          for entry in evaluations.values())
+    full_sweep_simulations = (int(max_desks) - int(min_desks) + 1) * \
+        max(initial_replications, max(
+            (entry['replications'] for entry in evaluations.values()), default=0))
+
+    result = {
+        'num_cash_desks': feasible,
+        'metric_name': metric_name,
+        'target_wait': target_wait,
+        'confidence': confidence,
+        'evaluations': {desks: {k: v for k, v in entry.items() if k != 'values'}
+                        for desks, entry in sorted(evaluations.items())},
+        'simulations_run': simulations_run,
+        'full_sweep_simulations': full_sweep_simulations,
+    }
+    result['statement'] = _confidence_statement(
+        result, infeasible, int(min_desks))
+    return result
+
+
+def _confidence_statement(result, infeasible, min_desks):
+    """Формирует текстовое заключение о найденном числе касс"""
+    feasible = result['num_cash_desks']
+    target = result['target_wait']
+    level = result['confidence']
+    evaluations = result['evaluations']
+
+    if feasible is None:
+        return (f"Ни одно количество касс в заданном диапазоне не обеспечивает "
+                f"ожидание не более {target:.1f} мин.")
+
+    entry = evaluations[feasible]
+    lower, upper = entry['ci']
+    if entry['decision'] == 'feasible':
+        statement = (f"Минимальное количество касс: {feasible}. С доверительной "
+                     f"вероятностью {level:.0%} метрика не превышает {target:.1f} мин "
+                     f"(оценка {entry['mean']:.2f}, интервал [{lower:.2f}; {upper:.2f}], "
+                     f"{entry['replications']} репл.).")
+    else:
+        statement = (f"Минимальное количество касс: {feasible} (по точечной оценке "
+                     f"{entry['mean']:.2f} мин; интервал [{lower:.2f}; {upper:.2f}] "
+                     f"содержит цель {target:.1f} мин, требуется больше репликаций).")
+
+    if infeasible in evaluations:
+        below = evaluations[infeasible]
+        if below['decision'] == 'infeasible':
+            statement += (f" При {infeasible} кассах цель нарушается с той же "
+                          f"доверительной вероятностью (оценка {below['mean']:.2f} мин).")
+        else:
+            statement += (f" При {infeasible} кассах цель нарушается по точечной "
+                          f"оценке ({below['mean']:.2f} мин).")
+    elif infeasible >= min_desks:
+        statement += (f" При {infeasible} кассах и меньше система перегружена "
+                      f"(нагрузка не меньше числа касс).")
+    return statement
+
+
+def _simulate_schedule(task):
+    """Прогон одной репликации графика касс в рабочем процессе"""
+    params, metric_name = task
+    return simulate_with_schedule(params)[metric_name]
+
+
+def blocks_to_desk_schedule(blocks, block_length):
+    """Перевод количества касс по блокам смен в график (момент, количество касс)"""
+    return [(i * block_length, int(desks)) for i, desks in enumerate(blocks)]
+
+
+class ScheduleEvaluator:
+    """
+    Оценка графиков работы касс по почасовому SLA
+
+    Каждый график прогоняется в нескольких репликациях с общими случайными
+    числами (одинаковые seed для всех графиков), репликации разных графиков
+    выполняются параллельно в пуле процессов, а результаты кэшируются.
+    """
+
+    def __init__(self, base_params, target_wait, block_length=60, replications=3,
+                 metric_name='hourly_avg_waiting_time', max_workers=None):
+        """
+        Args:
+            base_params (dict): Базовые параметры модели
+            target_wait (float): Допустимое значение метрики в каждом часе (мин)
+            block_length (float): Длительность блока смены (мин)
+            replications (int): Количество репликаций на график
+            metric_name (str): Почасовая метрика ожидания из результатов
+            max_workers (int): Количество рабочих процессов
+        """
+        self.base_params = base_params
+        self.target_wait = target_wait
+        self.block_length = block_length
+        self.replications = replications
+        self.metric_name = metric_name
+        self.max_workers = max_workers
+        self.cache = {}
+        self.simulations_run = 0
+
+    def evaluate_many(self, schedules):
+        """
+        Почасовые значения метрики для набора графиков
+
+        Returns:
+            list: Для каждого графика - список значений метрики по часам
+        """
+        pending = [s for s in dict.fromkeys(tuple(s) for s in schedules)
+                   if s not in self.cache]
+        tasks = []
+        for blocks in pending:
+            params = self.base_params.copy()
+            params['desk_schedule'] = blocks_to_desk_schedule(
+                blocks, self.block_length)
+            for replication in range(self.replications):
+                tasks.append((replication_params(params, replication),
+                              self.metric_name))
+
+        outputs = map_in_processes(_simulate_schedule, tasks,
+                                   max_workers=self.max_workers)
+        self.simulations_run += len(tasks)
+
+        for i, blocks in enumerate(pending):
+            runs = outputs[i * self.replications:(i + 1) * self.replications]
+            self.cache[blocks] = [float(v) for v in np.mean(runs, axis=0)]
+
+        return [self.cache[tuple(s)] for s in schedules]
+
+    def violations(self, hourly_values):
+        """Номера часов, в которых SLA нарушено"""
+        return [hour for hour, value in enumerate(hourly_values)
+                if value > self.target_wait]
+
+
+def optimize_desk_schedule(base_params, target_wait, block_length=60, desk_hour_cost=1.0,
+                           min_desks=1, max_desks=20, replications=3,
+                           metric_name='hourly_avg_waiting_time', max_workers=None,
+                           max_iterations=100):
+    """
+    Поиск самого дешевого графика работы касс, выполняющего SLA в каждом часе
+
+    Рабочий день делится на блоки смен длительностью block_length, в каждом
+    блоке открыто целое число касс. Сначала график строится от нижней
+    границы стабильности и наращивается в блоках с нарушением SLA, затем
+    локальным поиском снимаются кассы по одной, пока SLA выполняется.
+    Все соседние графики одной итерации оцениваются параллельно.
+
+    Args:
+        base_params (dict): Базовые параметры модели
+        target_wait (float): Допустимое ожидание в каждом часе (мин)
+        block_length (float): Длительность блока смены (мин)
+        desk_hour_cost (float): Стоимость одного часа работы кассы
+        min_desks, max_desks (int): Границы количества касс в блоке
+        replications (int): Количество репликаций на график
+        metric_name (str): Почасовая метрика ожидания
+        max_workers (int): Количество рабочих процессов
+        max_iterations (int): Предельное число итераций каждого этапа
+
+    Returns:
+        dict: Найденный график, его стоимость и почасовые значения метрики
+    """
+    evaluator = ScheduleEvaluator(base_params, target_wait, block_length,
+                                  replications, metric_name, max_workers)
+    simulation_time = float(base_params.get('simulation_time', 480))
+    num_blocks = int(math.ceil(simulation_time / block_length))
+
+    def cost(blocks):
+        return sum(blocks) * block_length / 60 * desk_hour_cost
+
+    lower = max(int(min_desks), _stability_lower_bound(base_params))
+    blocks = tuple([min(lower, int(max_desks))] * num_blocks)
+
+    # Этап 1: наращивание касс в блоках с нарушением SLA
+    for _ in range(max_iterations):
+        hourly = evaluator.evaluate_many([blocks])[0]
+        violated_hours = evaluator.violations(hourly)
+        if not violated_hours:
+            break
+        # Все блоки, пересекающиеся с часом [hour * 60, (hour + 1) * 60)
+        violated_blocks = {min(block, num_blocks - 1)
+                           for hour in violated_hours
+                           for block in range(int(hour * 60 // block_length),
+                                              int(math.ceil((hour + 1) * 60 / block_length)))}
+        repaired = tuple(min(d + 1, int(max_desks)) if i in violated_blocks else d
+                         for i, d in enumerate(blocks))
+        if repaired == blocks:
+            break
+        blocks = repaired
+
+    hourly = evaluator.evaluate_many([blocks])[0]
+    feasible = not evaluator.violations(hourly)
+
+    # Этап 2: локальный поиск - снятие одной кассы в одном из блоков
+    if feasible:
+        for _ in range(max_iterations):
+            neighbours = [blocks[:i] + (d - 1,) + blocks[i + 1:]
+                          for i, d in enumerate(blocks) if d > min_desks]
+            if not neighbours:
+                break
+            candidates = [(max(values), neighbour) for neighbour, values in
+                          zip(neighbours, evaluator.evaluate_many(neighbours))
+                          if not evaluator.violations(values)]
+            if not candidates:
+                break
+            # Из допустимых соседей выбираем графики с наибольшим запасом по SLA
+            blocks = min(candidates)[1]
+        hourly = evaluator.evaluate_many([blocks])[0]
+
+    constant_desks = max(blocks)
+    return {
+        'feasible': feasible,
+        'blocks': list(blocks),
+        'block_length': block_length,
+        'desk_schedule': blocks_to_desk_schedule(blocks, block_length),
+        'cost': cost(blocks),
+        'constant_schedule_cost': cost([constant_desks] * num_blocks),
+        'hourly_values': hourly,
+        'metric_name': metric_name,
+        'target_wait': target_wait,
+        'schedules_evaluated': len(evaluator.cache),
+        'simulations_run': evaluator.simulations_run,
+    }
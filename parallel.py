@@ -0,0 +1,179 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from shared_results import ResultStore
+from simulation import ShopSimulation
+
+
+# Скалярные показатели, которые возвращаются из рабочих процессов
+SUMMARY_KEYS = [
+    'total_customers_arrived',
+    'total_customers_served',
+    'avg_time_in_shop',
+    'max_time_in_shop',
+    'avg_waiting_time',
+    'max_waiting_time',
+    'p95_waiting_time',
+    'avg_queue_length',
+    'max_queue_length',
+    'avg_cash_desk_utilization',
+    'customers_balked',
+    'customers_reneged',
+    'customers_rejected',
+    'total_customers_lost',
+]
+
+
+def summarize_results(results):
+    """
+    Компактная сводка результатов симуляции
+
+    Отбрасывает списки по отдельным покупателям и временные ряды,
+    оставляя только скалярные показатели (приведенные к float).
+    """
+    return {key: float(results[key]) for key in SUMMARY_KEYS if key in results}
+
+
+def run_simulation_summary(params, keep_stats=True):
+    """
+    Запуск одной симуляции и возврат компактной сводки
+
+    Функция верхнего уровня, чтобы ее можно было передать в пул процессов.
+
+    Args:
+        params (dict): Параметры модели
+        keep_stats (bool): Хранить данные по отдельным покупателям. При
+            False память процесса не растет с количеством покупателей, а
+            95-й процентиль ожидания - оценка P² (см. use_streaming_stats)
+    """
+    simulation = ShopSimulation(params)
+    if not keep_stats:
+        simulation.use_streaming_stats()
+    return summarize_results(simulation.run_simulation())
+
+
+def run_simulation_shared(task):
+    """
+    Запуск одной симуляции с передачей массивов через файлы
+
+    Args:
+        task: (параметры модели, каталог ResultStore, использовать ли
+               кэш расписаний этапов до касс)
+
+    Returns:
+        dict: Результаты, в которых массивы по покупателям заменены ссылками
+    """
+    params, directory, cached_upstream = task
+    if cached_upstream:
+        # Импорт здесь: upstream.py зависит от engine.py, который импортирует parallel.py
+        from upstream import simulate_with_schedule
+        results = simulate_with_schedule(params)
+    else:
+        results = ShopSimulation(params).run_simulation()
+    return ResultStore(directory).export(results)
+
+
+def map_simulations_shared(params_list, store, max_workers=None, cached_upstream=False):
+    """
+    Параллельный запуск симуляций с полными результатами
+
+    Массивы по покупателям и временные ряды записываются рабочими
+    процессами в каталог store и открываются отображением в память,
+    через pickle передаются только скалярные показатели и ссылки.
+
+    Args:
+        params_list: список словарей параметров
+        store (ResultStore): хранилище массивов результатов
+        max_workers: количество процессов
+        cached_upstream (bool): Точки различаются только параметрами касс и
+            обслуживания: прибытия и выбор товаров генерируются один раз на
+            рабочий процесс (см. upstream.py)
+
+    Returns:
+        list: Результаты симуляций в порядке параметров
+    """
+    tasks = [(params, store.directory, cached_upstream) for params in params_list]
+    chunksize = None
+    if cached_upstream:
+        # Каждый процесс получает один непрерывный пакет точек и
+        # генерирует общее расписание один раз
+        workers = max_workers or default_workers()
+        chunksize = max(1, -(-len(tasks) // workers))
+    return [store.load(exported) for exported in
+            map_in_processes(run_simulation_shared, tasks, max_workers=max_workers,
+                             chunksize=chunksize)]
+
+
+def default_workers():
+    """Количество рабочих процессов по умолчанию"""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def map_in_processes(func, items, max_workers=None, chunksize=None):
+    """
+    Параллельное применение функции к списку заданий в пуле процессов
+
+    Результаты возвращаются в порядке заданий. Задания группируются
+    в пакеты, чтобы снизить накладные расходы на передачу между процессами.
+
+    Args:
+        func: функция верхнего уровня (должна сериализоваться pickle)
+        items: список заданий
+        max_workers: количество процессов (по умолчанию default_workers())
+        chunksize: размер пакета (по умолчанию подбирается по числу заданий)
+
+    Returns:
+        list: Результаты func для каждого задания
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    max_workers = max_workers or default_workers()
+    if max_workers == 1 or len(items) == 1:
+        return [func(item) for item in items]
+
+    if chunksize is None:
+        chunksize = max(1, len(items) // (max_workers * 4))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(func, items, chunksize=chunksize))
+
+
+def imap_in_processes(func, items, max_workers=None):
+    """
+    Параллельное применение функции с выдачей результатов по мере готовности
+
+    В отличие от map_in_processes результаты не накапливаются: в работе
+    находится не более 2 * max_workers заданий, и каждый результат
+    передается вызывающему коду сразу после завершения (порядок
+    завершения может не совпадать с порядком заданий).
+
+    Args:
+        func: функция верхнего уровня (должна сериализоваться pickle)
+        items: итерируемые задания
+        max_workers: количество процессов (по умолчанию default_workers())
+
+    Yields:
+        Результаты func в порядке завершения
+    """
+    items = iter(items)
+    max_workers = max_workers or default_workers()
+    if max_workers == 1:
+        for item in items:
+            yield func(item)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        running = set()
+        for item in items:
+            running.add(executor.submit(func, item))
+            if len(running) >= 2 * max_workers:
+                break
+        while running:
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                for item in items:
+                    running.add(executor.submit(func, item))
+                    break
+                yield future.result()
@@ -0,0 +1,217 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+from analytic import waiting_tail_decay
+from parallel import map_in_processes
+from replications import replication_params
+from simulation import ShopSimulation
+
+
+def splitting_levels(params, threshold, splits=2):
+    """
+    Уровни расщепления по времени ожидания
+
+    Уровни расставляются с шагом ln(splits) / decay, где decay - скорость
+    убывания хвоста ожидания из аналитической оценки, поэтому вероятность
+    подняться на следующий уровень примерно равна 1 / splits, и количество
+    траекторий остается примерно постоянным по уровням.
+
+    Returns:
+        list: Возрастающие уровни ниже порога
+    """
+    # При одной копии шаг уровней нулевой: расщепления не происходит
+    if splits < 2:
+        raise ValueError("Количество копий траектории splits должно быть не меньше 2")
+    decay = waiting_tail_decay(params)
+    if decay is None:
+        raise ValueError(
+            "Система перегружена: стационарной вероятности превышения не существует")
+    step = math.log(splits) / decay
+    return [step * k for k in range(1, int(threshold / step) + 1) if step * k < threshold]
+
+
+def _simulate_cycles(task):
+    """
+    Моделирование циклов регенерации очереди к кассам методом RESTART
+
+    Очередь к кассам в стационарном режиме рассматривается как M/G/c:
+    поток после этапа выбора товаров (система с бесконечным числом
+    каналов) остается пуассоновским. Время ожидания считается по
+    рекурсии Кифера-Вольфовица для вектора остаточной работы касс.
+    Цикл начинается с прибытия в пустую систему и заканчивается,
+    когда следующий покупатель застает все кассы свободными.
+
+    Область траектории - количество уровней ниже ожидания очередного
+    покупателя. При каждом подъеме в область k создаются splits - 1
+    повторных траекторий уровня k, которые продолжаются из того же
+    состояния, пока ожидание не опустится до уровня k, и затем
+    отбрасываются: спуск к пустой системе моделирует только исходная
+    траектория. В верхней области присутствует в среднем splits ** L
+    траекторий, поэтому каждое превышение порога учитывается с весом
+    splits ** -L. Исходная траектория не отличается от прямого
+    моделирования, по ней считается длина цикла.
+
+    Для оценки затрат прямого моделирования накапливаются суммы числа
+    превышений Y и его квадрата по пребываниям траекторий в верхней
+    области: превышения в прямом моделировании идут сериями, и
+    E[Y^2] / E[Y] во столько же раз увеличивает его дисперсию по
+    сравнению с независимыми покупателями.
+
+    Args:
+        task: (params, порог ожидания, уровни, splits, количество циклов)
+
+    Returns:
+        tuple: (массив взвешенного числа превышений порога в циклах,
+                массив количества покупателей в циклах,
+                общее количество смоделированных покупателей,
+                сумма Y и сумма Y^2 по пребываниям в верхней области)
+    """
+    params, threshold, levels, splits, num_cycles = task
+    simulation = ShopSimulation(params)
+    rng = simulation.arrival_rng
+    service_sampler = simulation.service_sampler
+    num_servers = simulation.num_cash_desks
+    arrival_mean = simulation.customer_arrival_mean
+    num_levels = len(levels)
+    top_weight = float(splits) ** -num_levels
+
+    exceedances = np.zeros(num_cycles)
+    customers = np.zeros(num_cycles, dtype=np.int64)
+    simulated = 0
+    cluster_sum = cluster_square_sum = 0
+    for cycle in range(num_cycles):
+        # Траектории: (остаточная работа касс, уровень отбрасывания, область, исходная ли)
+        trials = [([0.0] * num_servers, 0, 0, True)]
+        while trials:
+            work, kill_level, region, is_root = trials.pop()
+            cluster = 0
+            while True:
+                # Покупатель становится к кассе, освобождающейся первой
+                wait = work[0]
+                current = region
+                while current < num_levels and wait > levels[current]:
+                    current += 1
+                while current > 0 and wait <= levels[current - 1]:
+                    current -= 1
+                if current < kill_level:
+                    break
+
+                # Повторные траектории для каждого пересеченного вверх уровня
+                # (при скачке через несколько уровней - вложенно)
+                for level in range(region + 1, current + 1):
+                    for _ in range(splits ** (level - region - 1) * (splits - 1)):
+                        trials.append((list(work), level, current, False))
+                if region == num_levels and current < num_levels and cluster:
+                    cluster_sum += cluster
+                    cluster_square_sum += cluster ** 2
+                    cluster = 0
+                region = current
+
+                simulated += 1
+                if is_root:
+                    customers[cycle] += 1
+                if wait > threshold:
+                    exceedances[cycle] += 1
+                    cluster += 1
+                work[0] = wait + service_sampler.draw()
+
+                interarrival = rng.exponential(arrival_mean)
+                work = sorted(max(w - interarrival, 0.0) for w in work)
+                if work[-1] == 0.0:
+                    break
+            cluster_sum += cluster
+            cluster_square_sum += cluster ** 2
+    return exceedances * top_weight, customers, simulated, cluster_sum, cluster_square_sum
+
+
+def _regenerative_estimate(exceedances, customers):
+    """
+    Регенеративная оценка отношения средних по циклам
+
+    Returns:
+        tuple: (оценка вероятности, стандартная ошибка)
+    """
+    mean_customers = float(np.mean(customers))
+    probability = float(np.mean(exceedances)) / mean_customers
+    residuals = exceedances - probability * customers
+    standard_error = math.sqrt(np.var(residuals, ddof=1) / len(residuals)) / mean_customers
+    return probability, standard_error
+
+
+def estimate_tail_probability(params, threshold, num_cycles=20000, splits=2,
+                              confidence=0.95, num_batches=None, max_workers=None):
+    """
+    Оценка вероятности редкого события "ожидание в очереди больше порога"
+
+    Используется многоуровневое расщепление траекторий по времени ожидания
+    (RESTART) внутри циклов регенерации очереди к кассам: траектории,
+    поднявшиеся к порогу, размножаются, а копии, опустившиеся ниже уровня
+    своего создания, отбрасываются. Превышения наблюдаются на порядки
+    чаще, чем при прямом моделировании, а затрат на спуск копий к пустой
+    системе нет. Вероятность для случайного покупателя - отношение
+    ожидаемого числа превышений в цикле к ожидаемому числу покупателей в
+    цикле, доверительный интервал строится регенеративным методом
+    (дельта-метод для отношения средних).
+
+    Оценка относится к стационарному режиму очереди к кассам без ухода
+    покупателей (при перегрузке стационарного режима нет).
+
+    Args:
+        params (dict): Параметры модели (как у ShopSimulation)
+        threshold (float): Порог времени ожидания (мин)
+        num_cycles (int): Количество циклов регенерации
+        splits (int): Количество копий траектории на каждом уровне
+        confidence (float): Доверительная вероятность
+        num_batches (int): Количество заданий для пула процессов
+        max_workers (int): Количество рабочих процессов
+
+    Returns:
+        dict: Вероятность, доверительный интервал, уровни расщепления,
+              количество смоделированных покупателей и оценка количества
+              покупателей, которое потребовалось бы прямому моделированию
+    """
+    levels = splitting_levels(params, threshold, splits)
+
+    num_batches = num_batches or max(1, min(num_cycles // 500, 32))
+    sizes = [num_cycles // num_batches + (1 if i < num_cycles % num_batches else 0)
+             for i in range(num_batches)]
+    tasks = [(replication_params(params, i), threshold, levels, splits, size)
+             for i, size in enumerate(sizes) if size > 0]
+    outputs = map_in_processes(_simulate_cycles, tasks, max_workers=max_workers)
+
+    exceedances = np.concatenate([out[0] for out in outputs])
+    customers = np.concatenate([out[1] for out in outputs])
+    simulated = sum(out[2] for out in outputs)
+    cluster_sum = sum(out[3] for out in outputs)
+    cluster_square_sum = sum(out[4] for out in outputs)
+
+    probability, standard_error = _regenerative_estimate(exceedances, customers)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    half_width = z * standard_error
+
+    # Количество покупателей, на котором прямое моделирование дало бы ту же
+    # точность. Превышения идут сериями, поэтому дисперсия доли превышений
+    # в E[Y^2] / E[Y] раз больше, чем у независимых покупателей (серии,
+    # разделенные спуском ниже верхнего уровня, считаются независимыми,
+    # поэтому оценка занижена)
+    brute_force_customers = None
+    if cluster_sum > 0 and standard_error > 0:
+        clustering = cluster_square_sum / cluster_sum
+        brute_force_customers = int(probability * (1 - probability) * clustering /
+                                    standard_error ** 2)
+
+    return {
+        'threshold': threshold,
+        'probability': probability,
+        'ci_lower': max(probability - half_width, 0.0),
+        'ci_upper': probability + half_width,
+        'confidence': confidence,
+        'levels': levels,
+        'splits': splits,
+        'cycles': len(customers),
+        'cycles_with_exceedance': int(np.count_nonzero(exceedances)),
+        'customers_simulated': int(simulated),
+        'brute_force_customers': brute_force_customers,
+    }
@@ -0,0 +1,346 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+from analytic import input_means
+from parallel import imap_in_processes, map_in_processes
+from simulation import ShopSimulation
+from sketches import BinnedQuantiles
+from upstream import simulate_with_schedule
+
+
+def replication_params(params, replication):
+    """
+    Параметры для заданной репликации: отличается только seed
+
+    Одинаковые номера репликаций для разных конфигураций дают общие
+    случайные числа (common random numbers), что уменьшает дисперсию
+    при сравнении конфигураций между собой.
+
+    Args:
+        params (dict): Базовые параметры модели
+        replication (int): Номер репликации (с нуля)
+    """
+    rep_params = params.copy()
+    rep_params['seed'] = int(params.get('seed', 42)) + replication
+    return rep_params
+
+
+def run_replications(params, num_replications, metric_name, start=0):
+    """
+    Последовательный запуск репликаций и сбор значений одной метрики
+
+    Прибытия и выбор товаров каждой репликации берутся из кэша расписаний
+    (см. upstream.py), поэтому повторные запуски с другими параметрами касс
+    и обслуживания (например, при подборе количества касс) генерируют
+    только этап обслуживания.
+
+    Args:
+        params (dict): Базовые параметры модели
+        num_replications (int): Количество репликаций
+        metric_name (str): Ключ метрики в словаре результатов
+        start (int): Номер первой репликации (для догоняющих запусков)
+
+    Returns:
+        list: Значения метрики по репликациям
+    """
+    values = []
+    for replication in range(start, start + num_replications):
+        results = simulate_with_schedule(replication_params(params, replication))
+        values.append(float(results.get(metric_name, 0)))
+    return values
+
+
+# Число степеней свободы, до которого квантиль Стьюдента вычисляется точно
+EXACT_T_DEGREES = 30
+
+
+def _t_cdf(t, degrees_of_freedom):
+    """
+    Функция распределения Стьюдента для целого числа степеней свободы
+
+    Конечные ряды по степеням cos(theta), theta = arctan(t / sqrt(df))
+    (Абрамовиц и Стиган, 26.7.3 и 26.7.4).
+    """
+    theta = math.atan(abs(t) / math.sqrt(degrees_of_freedom))
+    sin, cos2 = math.sin(theta), math.cos(theta) ** 2
+    if degrees_of_freedom % 2 == 1:
+        term = total = 0.0
+        if degrees_of_freedom > 1:
+            term = total = math.cos(theta)
+            for k in range(3, degrees_of_freedom - 1, 2):
+                term *= cos2 * (k - 1) / k
+                total += term
+        central = 2 / math.pi * (theta + sin * total)
+    else:
+        term = total = 1.0
+        for k in range(2, degrees_of_freedom - 1, 2):
+            term *= cos2 * (k - 1) / k
+            total += term
+        central = sin * total
+    return 0.5 + math.copysign(central / 2, t)
+
+
+def t_quantile(probability, degrees_of_freedom):
+    """
+    Квантиль распределения Стьюдента
+
+    При df <= EXACT_T_DEGREES квантиль находится делением пополам по точной
+    функции распределения, при больших df используется разложение
+    Корниша-Фишера от нормального квантиля (погрешность меньше 1e-4).
+    """
+    if degrees_of_freedom <= 0:
+        return float('inf')
+    if degrees_of_freedom <= EXACT_T_DEGREES:
+        degrees_of_freedom = int(degrees_of_freedom)
+        if probability < 0.5:
+            return -t_quantile(1 - probability, degrees_of_freedom)
+        high = 1.0
+        while _t_cdf(high, degrees_of_freedom) < probability:
+            high *= 2
+        low = 0.0
+        for _ in range(100):
+            middle = (low + high) / 2
+            if _t_cdf(middle, degrees_of_freedom) < probability:
+                low = middle
+            else:
+                high = middle
+        return (low + high) / 2
+
+    z = NormalDist().inv_cdf(probability)
+    nu = float(degrees_of_freedom)
+    return (z
+            + (z ** 3 + z) / (4 * nu)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * nu ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * nu ** 3))
+
+
+def confidence_interval(values, confidence=0.95):
+    """
+    Среднее и доверительный интервал по выборке репликаций
+
+    Returns:
+        tuple: (среднее, нижняя граница, верхняя граница)
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return 0.0, 0.0, 0.0
+    mean = float(np.mean(values))
+    if len(values) < 2:
+        return mean, float('-inf'), float('inf')
+    half_width = t_quantile(0.5 + confidence / 2, len(values) - 1) * \
+        float(np.std(values, ddof=1)) / np.sqrt(len(values))
+    return mean, mean - half_width, mean + half_width
+
+
+# Показатели, для которых строятся оценки с контрольными переменными
+CONTROL_VARIATE_METRICS = ('avg_waiting_time', 'avg_time_in_shop', 'avg_queue_length')
+
+
+def control_variate_interval(values, controls, confidence=0.95):
+    """
+    Оценка среднего с контрольными переменными и доверительный интервал
+
+    Значения метрики регрессируются на отклонения контрольных переменных
+    от их точных средних (метод наименьших квадратов со свободным членом),
+    оценка - свободный член регрессии, то есть среднее метрики, очищенное
+    от случайных отклонений входных величин. Дисперсия оценки и интервал
+    строятся по остаткам регрессии с n - q - 1 степенями свободы
+    (Лавенберг и Уэлч).
+
+    Args:
+        values: значения метрики по репликациям (n)
+        controls: отклонения контрольных переменных от точных средних (n × q)
+        confidence (float): Доверительная вероятность
+
+    Returns:
+        tuple: (оценка, нижняя граница, верхняя граница, коэффициенты регрессии)
+    """
+    values = np.asarray(values, dtype=float)
+    controls = np.asarray(controls, dtype=float).reshape(len(values), -1)
+    n, q = controls.shape
+    if n - q - 1 < 1:
+        raise ValueError(f"Для {q} контрольных переменных нужно не меньше {q + 2} репликаций")
+
+    control_means = controls.mean(axis=0)
+    centered = controls - control_means
+    deviations = values - values.mean()
+    coefficients = np.linalg.lstsq(centered, deviations, rcond=None)[0]
+    estimate = float(values.mean() - control_means @ coefficients)
+
+    residuals = deviations - centered @ coefficients
+    residual_variance = float(residuals @ residuals) / (n - q - 1)
+    variance = residual_variance * (
+        1 / n + control_means @ np.linalg.pinv(centered.T @ centered) @ control_means)
+    half_width = t_quantile(0.5 + confidence / 2, n - q - 1) * float(np.sqrt(variance))
+    return estimate, estimate - half_width, estimate + half_width, coefficients
+
+
+def _replication_with_controls(task):
+    """Метрики и выборочные средние входных величин одной репликации"""
+    params, metric_names = task
+    results = ShopSimulation(params).run_simulation()
+    return ([float(results.get(name, 0)) for name in metric_names],
+            results['input_sample_means'])
+
+
+def control_variate_estimates(params, num_replications=20, metric_names=CONTROL_VARIATE_METRICS,
+                              confidence=0.95, max_workers=None):
+    """
+    Оценки метрик по репликациям с контрольными переменными
+
+    Точные средние интервала между прибытиями, времени выбора товаров и
+    времени обслуживания известны по параметрам (analytic.input_means), а
+    их выборочные средние в каждой репликации получаются бесплатно. Если
+    в репликации покупатели приходили чаще обычного, ожидание в ней тоже
+    больше: вычитая эту объяснимую часть разброса, получаем оценку с
+    меньшей дисперсией, то есть ту же точность при меньшем числе репликаций.
+
+    Args:
+        params (dict): Параметры модели
+        num_replications (int): Количество репликаций
+        metric_names: Оцениваемые метрики
+        confidence (float): Доверительная вероятность
+        max_workers (int): Количество рабочих процессов
+
+    Returns:
+        dict: Для каждой метрики - обычная оценка и оценка с контрольными
+              переменными с доверительными интервалами
+    """
+    metric_names = list(metric_names)
+    known_means = input_means(params)
+    tasks = [(replication_params(params, replication), metric_names)
+             for replication in range(num_replications)]
+    outputs = map_in_processes(_replication_with_controls, tasks, max_workers=max_workers)
+
+    # Контрольные переменные - входные величины с точно известным средним,
+    # значения которых генерировались во всех репликациях
+    names = [name for name in known_means
+             if all(sample_means.get(name) is not None for _, sample_means in outputs)]
+    names = names[:max(0, num_replications - 3)]
+    controls = np.array([[sample_means[name] - known_means[name] for name in names]
+                         for _, sample_means in outputs]).reshape(num_replications, len(names))
+
+    estimates = {}
+    for j, metric_name in enumerate(metric_names):
+        values = [metric_values[j] for metric_values, _ in outputs]
+        raw = confidence_interval(values, confidence)
+        if names:
+            *adjusted, coefficients = control_variate_interval(values, controls, confidence)
+        else:
+            adjusted, coefficients = raw, np.zeros(0)
+        raw_width = raw[2] - raw[1]
+        estimates[metric_name] = {
+            'raw': tuple(float(v) for v in raw),
+            'adjusted': tuple(float(v) for v in adjusted),
+            'coefficients': dict(zip(names, coefficients.tolist())),
+            # Доля репликаций, достаточная для той же точности с контрольными переменными
+            'replications_ratio': ((adjusted[2] - adjusted[1]) / raw_width) ** 2
+            if raw_width > 0 else 1.0,
+        }
+
+    return {
+        'replications': num_replications,
+        'confidence': confidence,
+        'controls': {name: known_means[name] for name in names},
+        'estimates': estimates,
+    }
+
+
+def _binned_series(task):
+    """
+    Длина очереди и загрузка касс одной репликации на сетке интервалов
+
+    Выполняется в рабочем процессе, в родительский процесс передаются
+    только два массива по числу интервалов.
+
+    Args:
+        task: (параметры репликации, границы интервалов сетки)
+
+    Returns:
+        tuple: (средняя длина очереди, доля занятого времени касс) по интервалам
+    """
+    params, edges = task
+    simulation = ShopSimulation(params)
+    simulation.run_simulation()
+    num_bins = len(edges) - 1
+
+    # Средняя длина очереди по ежеминутным отсчетам интервала; интервалы
+    # без отсчетов получают значение предыдущего интервала
+    samples = simulation.stats['queue_lengths']
+    times = np.fromiter(samples.keys(), dtype=float, count=len(samples))
+    lengths = np.fromiter(samples.values(), dtype=float, count=len(samples))
+    index = np.clip(np.searchsorted(edges, times, side='right') - 1, 0, num_bins - 1)
+    counts = np.bincount(index, minlength=num_bins)
+    sums = np.bincount(index, weights=lengths, minlength=num_bins)
+    filled = np.maximum.accumulate(np.where(counts > 0, np.arange(num_bins), 0))
+    queue = np.where(counts > 0, sums / np.maximum(counts, 1), 0.0)[filled]
+
+    # Занятое время касс в интервале: разность накопленного занятого
+    # времени B(t) = сумма min(max(t - начало, 0), длительность) на границах
+    intervals = [interval for usage in simulation.stats['cash_desk_usage'].values()
+                 for interval in usage]
+    if intervals:
+        starts, ends = np.array(intervals, dtype=float).T
+        busy = np.clip(edges[:, None] - starts[None, :], 0.0,
+                       (ends - starts)[None, :]).sum(axis=1)
+        utilization = np.diff(busy) / (np.diff(edges) * simulation.num_cash_desks)
+    else:
+        utilization = np.zeros(num_bins)
+    return queue, utilization
+
+
+def replicate_time_series(params, num_replications=20, bin_width=10.0,
+                          probabilities=(0.05, 0.5, 0.95), max_workers=None,
+                          progress_callback=None):
+    """
+    Временные ряды длины очереди и загрузки касс по многим репликациям
+
+    Репликации выполняются в пуле процессов, ряды каждой репликации
+    переводятся на общую сетку интервалов ширины bin_width и по мере
+    поступления добавляются в потоковые оценки квантилей по интервалам
+    (BinnedQuantiles). Ряды отдельных репликаций не хранятся, поэтому
+    память - O(интервалов), а не O(репликаций × длины ряда).
+
+    Args:
+        params (dict): Параметры модели
+        num_replications (int): Количество репликаций
+        bin_width (float): Ширина интервала сетки (мин)
+        probabilities: Вероятности квантилей (полосы и медиана)
+        max_workers (int): Количество рабочих процессов
+        progress_callback (callable): Вызывается с количеством готовых репликаций
+
+    Returns:
+        dict: Середины интервалов, квантили и средние по интервалам
+              для длины очереди и загрузки касс
+    """
+    simulation_time = float(params.get('simulation_time', 480))
+    edges = np.arange(0.0, simulation_time + bin_width, bin_width)
+    edges[-1] = min(edges[-1], simulation_time)
+    if len(edges) < 2 or edges[-1] <= edges[-2]:
+        edges = edges[:-1]
+    num_bins = len(edges) - 1
+
+    queue_sketch = BinnedQuantiles(num_bins, probabilities)
+    utilization_sketch = BinnedQuantiles(num_bins, probabilities)
+
+    tasks = ((replication_params(params, replication), edges)
+             for replication in range(num_replications))
+    for done, (queue, utilization) in enumerate(
+            imap_in_processes(_binned_series, tasks, max_workers=max_workers), 1):
+        queue_sketch.update(queue)
+        utilization_sketch.update(utilization)
+        if progress_callback:
+            progress_callback(done)
+
+    return {
+        'times': ((edges[:-1] + edges[1:]) / 2).tolist(),
+        'bin_width': bin_width,
+        'replications': num_replications,
+        'probabilities': list(probabilities),
+        'queue_length': {p: q.tolist() for p, q in queue_sketch.quantiles().items()},
+        'queue_length_mean': queue_sketch.mean.tolist(),
+        'utilization': {p: q.tolist() for p, q in utilization_sketch.quantiles().items()},
+        'utilization_mean': utilization_sketch.mean.tolist(),
+    }
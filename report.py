@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Пакетное построение отчетов по сценариям без графического интерфейса
+
+Для каждого сценария рабочий процесс запускает симуляцию, строит все
+графики SimulationVisualizer на бэкенде Agg, сохраняет их в PNG и/или SVG
+и сразу закрывает фигуры, поэтому память не растет с числом сценариев.
+По сводкам результатов строится общий HTML-отчет с таблицей показателей
+и ссылками на графики.
+
+Пример запуска (сценарий в формате batch.py):
+    python report.py scenario.json reports --workers 8 --formats png svg
+"""
+import argparse
+import html
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from parallel import SUMMARY_KEYS, default_workers, summarize_results
+from simulation import ShopSimulation
+
+
+# Графики отчета: имя файла и метод SimulationVisualizer
+REPORT_PLOTS = {
+    'dashboard': 'create_summary_dashboard',
+    'queue_length': 'plot_queue_length_over_time',
+    'waiting_time': 'plot_waiting_time_histogram',
+    'time_in_shop': 'plot_time_in_shop_histogram',
+    'cash_desk_utilization': 'plot_cash_desk_utilization',
+}
+
+REPORT_FORMATS = ('png', 'svg')
+
+# Подписи показателей в таблице отчета
+SUMMARY_LABELS = {
+    'total_customers_arrived': 'Прибыло',
+    'total_customers_served': 'Обслужено',
+    'avg_time_in_shop': 'Среднее время в магазине',
+    'max_time_in_shop': 'Макс. время в магазине',
+    'avg_waiting_time': 'Среднее ожидание',
+    'max_waiting_time': 'Макс. ожидание',
+    'p95_waiting_time': '95-й процентиль ожидания',
+    'avg_queue_length': 'Средняя очередь',
+    'max_queue_length': 'Макс. очередь',
+    'avg_cash_desk_utilization': 'Загрузка касс',
+    'customers_balked': 'Ушли из-за очереди',
+    'customers_reneged': 'Ушли из очереди',
+    'customers_rejected': 'Не впущены',
+    'total_customers_lost': 'Потеряно',
+}
+
+
+def _init_worker():
+    """Переключение рабочего процесса на бэкенд без окон"""
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+
+
+def _file_stem(label):
+    """Имя файла по названию сценария"""
+    return re.sub(r'[^\w.-]+', '_', str(label)).strip('_') or 'scenario'
+
+
+def render_scenario(task):
+    """
+    Симуляция и построение графиков одного сценария (в рабочем процессе)
+
+    Args:
+        task: (название, префикс имен файлов, параметры модели, каталог,
+               форматы, имена графиков)
+
+    Returns:
+        dict: Название, параметры, сводка результатов и пути к файлам графиков
+    """
+    import matplotlib.pyplot as plt
+    from visualization import SimulationVisualizer
+
+    label, stem, params, directory, formats, plots = task
+    results = ShopSimulation(params).run_simulation()
+    visualizer = SimulationVisualizer(results)
+
+    files = {}
+    for plot in plots:
+        fig = getattr(visualizer, REPORT_PLOTS[plot])()
+        if fig is None:
+            continue
+        try:
+            files[plot] = []
+            for fmt in formats:
+                name = f"{stem}_{plot}.{fmt}"
+                fig.savefig(os.path.join(directory, name), format=fmt,
+                            dpi=100)
+                files[plot].append(name)
+        finally:
+            plt.close(fig)
+
+    return {
+        'label': str(label),
+        'stem': stem,
+        'params': params,
+        'summary': summarize_results(results),
+        'unstable': bool(results.get('unstable')),
+        'files': files,
+    }
+
+
+def _format_value(key, value):
+    if key == 'avg_cash_desk_utilization':
+        return f"{value:.1%}"
+    if key.startswith(('total_', 'customers_')):
+        return f"{value:.0f}"
+    return f"{value:.2f}"
+
+
+def write_html_summary(path, entries, title="Отчет по сценариям моделирования"):
+    """
+    Запись общего HTML-отчета
+
+    Args:
+        path (str): Путь к файлу отчета (графики - в том же каталоге)
+        entries (list): Результаты render_scenario
+        title (str): Заголовок отчета
+    """
+    keys = [key for key in SUMMARY_KEYS if any(key in e['summary'] for e in entries)]
+    rows = []
+    for entry in entries:
+        cells = ''.join(
+            f"<td>{_format_value(key, entry['summary'][key])}</td>"
+            if key in entry['summary'] else "<td></td>" for key in keys)
+        label = html.escape(entry['label'])
+        if entry['unstable']:
+            label += ' <span class="unstable">(неустойчиво)</span>'
+        rows.append(f'<tr><td><a href="#{entry["stem"]}">{label}</a></td>{cells}</tr>')
+
+    sections = []
+    for entry in entries:
+        params = html.escape(json.dumps(entry['params'], ensure_ascii=False, sort_keys=True))
+        images = []
+        for names in entry['files'].values():
+            # Для просмотра используется растровый файл, если он есть
+            preview = next((n for n in names if n.endswith('.png')), names[0])
+            links = ' '.join(f'<a href="{html.escape(n)}">{n.rsplit(".", 1)[1].upper()}</a>'
+                             for n in names)
+            images.append(f'<figure><img src="{html.escape(preview)}" loading="lazy">'
+                          f'<figcaption>{links}</figcaption></figure>')
+        sections.append(
+            f'<section id="{entry["stem"]}"><h2>{html.escape(entry["label"])}</h2>'
+            f'<p><code>{params}</code></p>{"".join(images)}</section>')
+
+    header = ''.join(f"<th>{SUMMARY_LABELS.get(key, key)}</th>" for key in keys)
+    document = f"""<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<style>
+body {{ font-family: sans-serif; margin: 20px; }}
+table {{ border-collapse: collapse; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 8px; text-align: right; }}
+td:first-child {{ text-align: left; }}
+.unstable {{ color: #c00; }}
+figure {{ display: inline-block; margin: 5px; }}
+img {{ max-width: 480px; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(title)}</h1>
+<table>
+<tr><th>Сценарий</th>{header}</tr>
+{chr(10).join(rows)}
+</table>
+{chr(10).join(sections)}
+</body>
+</html>
+"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(document)
+
+
+def generate_report(scenarios, directory, formats=REPORT_FORMATS, plots=None,
+                    max_workers=None, progress_callback=None):
+    """
+    Построение отчета по списку сценариев в пуле процессов
+
+    Рабочие процессы всегда используют бэкенд Agg, поэтому функцию можно
+    вызывать и из графического интерфейса: окна графиков не создаются.
+
+    Args:
+        scenarios: список пар (название, параметры модели)
+        directory (str): Каталог отчета
+        formats: форматы файлов графиков ('png', 'svg')
+        plots: имена графиков из REPORT_PLOTS (по умолчанию все)
+        max_workers (int): Количество рабочих процессов
+        progress_callback (callable): Вызывается с результатом каждого сценария
+
+    Returns:
+        str: Путь к HTML-отчету
+    """
+    os.makedirs(directory, exist_ok=True)
+    plots = list(plots or REPORT_PLOTS)
+    # Номер сценария в имени файлов исключает совпадения имен
+    tasks = [(label, f"{index:04d}_{_file_stem(label)}", params, directory,
+              tuple(formats), plots)
+             for index, (label, params) in enumerate(scenarios)]
+
+    entries = []
+    max_workers = max_workers or default_workers()
+    with ProcessPoolExecutor(max_workers=min(max_workers, max(1, len(tasks))),
+                             initializer=_init_worker) as executor:
+        for entry in executor.map(render_scenario, tasks):
+            entries.append(entry)
+            if progress_callback:
+                progress_callback(entry)
+
+    path = os.path.join(directory, 'index.html')
+    write_html_summary(path, entries)
+    return path
+
+
+def main():
+    """Построение отчета из командной строки"""
+    from batch import expand_manifest
+
+    parser = argparse.ArgumentParser(description="Пакетное построение отчетов по сценариям")
+    parser.add_argument('manifest', help="файл сценария (JSON, как у batch.py)")
+    parser.add_argument('directory', help="каталог отчета")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="количество рабочих процессов")
+    parser.add_argument('--formats', nargs='+', default=list(REPORT_FORMATS),
+                        choices=REPORT_FORMATS, help="форматы файлов графиков")
+    args = parser.parse_args()
+
+    with open(args.manifest, encoding='utf-8') as f:
+        manifest = json.load(f)
+    tasks = expand_manifest(manifest, os.path.dirname(os.path.abspath(args.manifest)))
+    sweep_names = list(manifest.get('sweep', {}))
+
+    scenarios = []
+    for task in tasks:
+        parts = [task['store_id']] if task['store_id'] else []
+        parts += [f"{name}={task['params'][name]}" for name in sweep_names]
+        if manifest.get('replications', 1) > 1:
+            parts.append(f"rep{task['replication']}")
+        scenarios.append(('_'.join(map(str, parts)) or task['task_id'], task['params']))
+
+    path = generate_report(scenarios, args.directory, args.formats, max_workers=args.workers,
+                           progress_callback=lambda e: print(f"- {e['label']}"))
+    print(f"Отчет: {path}")
+
+
+if __name__ == "__main__":
+    main()
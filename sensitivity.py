@@ -0,0 +1,134 @@
+import numpy as np
+
+from engine import EventShopSimulation
+from parallel import map_in_processes
+
+
+# Факторы анализа чувствительности: числовые параметры варьируются
+# в диапазоне ± spread от базового значения, для распределений
+# выбирается один из вариантов с равной вероятностью. Seed фиксирован
+# (общие случайные числа), поэтому модель - детерминированная функция факторов.
+SENSITIVITY_FACTORS = {
+    'simulation_time': 'float',
+    'customer_arrival_mean': 'float',
+    'shopping_time_dist': ['normal', 'uniform', 'exponential'],
+    'shopping_time_mean': 'float',
+    'shopping_time_std': 'float',
+    'shopping_time_min': 'float',
+    'shopping_time_max': 'float',
+    'num_cash_desks': 'int',
+    'service_time_dist': ['exponential', 'normal', 'lognormal', 'gamma'],
+    'service_time_mean': 'float',
+    'service_time_std': 'float',
+}
+
+
+def _factor_values(name, kind, base_value, unit_values, spread):
+    """Перевод равномерных на [0, 1) значений в значения фактора"""
+    if isinstance(kind, list):
+        return [kind[int(u * len(kind))] for u in unit_values]
+    low, high = base_value * (1 - spread), base_value * (1 + spread)
+    values = low + (high - low) * unit_values
+    if kind == 'int':
+        return [max(1, int(round(v))) for v in values]
+    return values.tolist()
+
+
+def _evaluate_point(task):
+    """Значение метрики в одной точке плана (выполняется в рабочем процессе)"""
+    params, metric_name = task
+    return float(EventShopSimulation(params).run_simulation().get(metric_name, 0.0))
+
+
+def _sobol_indices(f_a, f_b, f_ab):
+    """
+    Оценки индексов Соболя по выходам матриц A, B и A_B^i
+
+    Используются оценки Сальтелли (2010) для индексов первого порядка
+    и Янсена для полных индексов.
+    """
+    variance = np.var(np.concatenate([f_a, f_b]))
+    if variance <= 0:
+        zeros = np.zeros(f_ab.shape[0])
+        return zeros, zeros
+    first_order = np.mean(f_b * (f_ab - f_a), axis=1) / variance
+    total = 0.5 * np.mean((f_a - f_ab) ** 2, axis=1) / variance
+    return first_order, total
+
+
+def sobol_sensitivity(base_params, metric_name='avg_waiting_time', num_samples=256,
+                      spread=0.25, factors=None, num_bootstrap=200, confidence=0.95,
+                      max_workers=None, seed=0):
+    """
+    Глобальный анализ чувствительности по индексам Соболя (схема Сальтелли)
+
+    Строятся две случайные матрицы A и B по num_samples точек и для каждого
+    фактора i матрица A_B^i (матрица A со столбцом i из B), всего
+    num_samples * (k + 2) прогонов для k факторов. Прогоны выполняются
+    в пуле процессов. Доверительные интервалы индексов оцениваются
+    бутстрепом по строкам плана без дополнительных прогонов.
+
+    Args:
+        base_params (dict): Базовые параметры модели
+        metric_name (str): Анализируемая метрика
+        num_samples (int): Количество строк в матрицах A и B
+        spread (float): Относительный диапазон числовых факторов (0.25 = ±25%)
+        factors (dict): Факторы и их типы (по умолчанию SENSITIVITY_FACTORS)
+        num_bootstrap (int): Количество бутстреп-выборок
+        confidence (float): Доверительная вероятность интервалов
+        max_workers (int): Количество рабочих процессов
+        seed (int): Seed генератора плана эксперимента
+
+    Returns:
+        dict: Факторы, индексы первого порядка и полные индексы
+              с доверительными интервалами, количество прогонов
+    """
+    factors = factors or SENSITIVITY_FACTORS
+    names = list(factors)
+    k = len(names)
+    rng = np.random.default_rng(seed)
+    unit_a = rng.random((num_samples, k))
+    unit_b = rng.random((num_samples, k))
+
+    def rows(unit):
+        columns = [_factor_values(name, factors[name], base_params.get(name),
+                                  unit[:, j], spread)
+                   for j, name in enumerate(names)]
+        return [dict(base_params, **dict(zip(names, row))) for row in zip(*columns)]
+
+    plans = [rows(unit_a), rows(unit_b)]
+    for i in range(k):
+        unit_ab = unit_a.copy()
+        unit_ab[:, i] = unit_b[:, i]
+        plans.append(rows(unit_ab))
+
+    tasks = [(params, metric_name) for plan in plans for params in plan]
+    outputs = np.array(map_in_processes(_evaluate_point, tasks, max_workers=max_workers))
+    outputs = outputs.reshape(k + 2, num_samples)
+    f_a, f_b, f_ab = outputs[0], outputs[1], outputs[2:]
+
+    first_order, total = _sobol_indices(f_a, f_b, f_ab)
+
+    # Бутстреп по строкам плана
+    boot_first = np.empty((num_bootstrap, k))
+    boot_total = np.empty((num_bootstrap, k))
+    for b in range(num_bootstrap):
+        index = rng.integers(0, num_samples, num_samples)
+        boot_first[b], boot_total[b] = _sobol_indices(
+            f_a[index], f_b[index], f_ab[:, index])
+    tail = (1 - confidence) / 2 * 100
+    first_ci = np.percentile(boot_first, [tail, 100 - tail], axis=0).T
+    total_ci = np.percentile(boot_total, [tail, 100 - tail], axis=0).T
+
+    return {
+        'factors': names,
+        'metric_name': metric_name,
+        'first_order': first_order.tolist(),
+        'first_order_ci': [tuple(ci) for ci in first_ci.tolist()],
+        'total': total.tolist(),
+        'total_ci': [tuple(ci) for ci in total_ci.tolist()],
+        'mean': float(np.mean(np.concatenate([f_a, f_b]))),
+        'variance': float(np.var(np.concatenate([f_a, f_b]))),
+        'evaluations': len(tasks),
+        'confidence': confidence,
+    }
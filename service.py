@@ -0,0 +1,470 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Локальный сервис заданий моделирования (HTTP/JSON на asyncio)
+
+Сервис принимает задания на симуляцию и эксперимент (серию прогонов по
+значениям параметра), ставит их в очередь и выполняет в общем пуле
+процессов, который запускается один раз и остается "прогретым" для всех
+клиентов. Запуск:
+
+    python service.py --port 8765 --workers 4 --max-jobs 2
+
+Завершенные задания хранятся --finished-ttl секунд после завершения (по
+умолчанию час), но не более --max-finished последних заданий.
+
+Конечные точки:
+    GET    /health              - состояние сервиса
+    POST   /jobs                - новое задание (JSON), ответ 202 с job_id
+    GET    /jobs                - список заданий
+    GET    /jobs/<id>           - статус и прогресс задания
+    GET    /jobs/<id>/result    - результат завершенного задания
+    DELETE /jobs/<id>           - отмена задания
+
+Тело POST /jobs:
+    {"kind": "simulation", "params": {...}}
+    {"kind": "sweep", "params": {...}, "param_name": "num_cash_desks",
+     "values": [1, 2, 3]}
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+from parallel import default_workers, run_simulation_summary
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Состояния задания
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+JOB_KINDS = ('simulation', 'sweep')
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Ограничение размера тела запроса (байт)
+MAX_BODY_SIZE = 1 << 20
+
+# Хранение завершенных заданий: время (с) и количество
+DEFAULT_FINISHED_TTL = 3600
+DEFAULT_MAX_FINISHED = 1000
+
+
+class ServiceError(Exception):
+    """Ошибка запроса к сервису (с кодом ответа HTTP)"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    """Задание сервиса: параметры, состояние, прогресс и результат"""
+
+    def __init__(self, spec):
+        self.job_id = uuid.uuid4().hex
+        self.spec = spec
+        self.kind = spec['kind']
+        self.status = QUEUED
+        self.completed = 0
+        self.total = len(spec['values']) if self.kind == 'sweep' else 1
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    def to_dict(self):
+        """Статус задания для ответа сервиса"""
+        return {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'status': self.status,
+            'completed': self.completed,
+            'total': self.total,
+            'progress': self.completed / self.total if self.total else 1.0,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+def _validate_spec(spec):
+    """Проверка описания задания из тела запроса"""
+    if not isinstance(spec, dict):
+        raise ServiceError(HTTPStatus.BAD_REQUEST, "Тело запроса должно быть объектом JSON")
+    if spec.get('kind') not in JOB_KINDS:
+        raise ServiceError(HTTPStatus.BAD_REQUEST,
+                           f"Тип задания должен быть одним из: {', '.join(JOB_KINDS)}")
+    if not isinstance(spec.get('params', {}), dict):
+        raise ServiceError(HTTPStatus.BAD_REQUEST, "params должен быть объектом")
+    if spec['kind'] == 'sweep':
+        if not isinstance(spec.get('param_name'), str):
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Не задан param_name")
+        values = spec.get('values')
+        if not isinstance(values, list) or not values:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "values должен быть непустым списком")
+    return spec
+
+
+class SimulationService:
+    """
+    Очередь заданий моделирования с общим пулом процессов
+
+    Одновременно выполняется не более max_jobs заданий, в очереди
+    находится не более max_queued; прогоны всех заданий выполняются
+    в одном пуле из workers процессов. Завершенные задания удаляются
+    через finished_ttl секунд, а сверх max_finished - начиная с самых
+    старых, поэтому память сервиса не растет с числом запросов.
+    """
+
+    def __init__(self, workers=None, max_jobs=2, max_queued=100,
+                 finished_ttl=DEFAULT_FINISHED_TTL, max_finished=DEFAULT_MAX_FINISHED):
+        """
+        Args:
+            workers (int): Количество рабочих процессов (по умолчанию default_workers())
+            max_jobs (int): Количество одновременно выполняемых заданий
+            max_queued (int): Максимальное количество ожидающих заданий
+            finished_ttl (float): Время хранения завершенного задания (с)
+            max_finished (int): Максимальное количество хранимых завершенных заданий
+        """
+        self.workers = workers or default_workers()
+        self.max_jobs = max_jobs
+        self.max_queued = max_queued
+        self.finished_ttl = finished_ttl
+        self.max_finished = max_finished
+        self.jobs = {}
+        self._executor = None
+        self._job_slots = None
+
+    def start(self):
+        """Запуск пула процессов"""
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._job_slots = asyncio.Semaphore(self.max_jobs)
+
+    def shutdown(self):
+        """Отмена заданий и остановка пула процессов"""
+        for job in self.jobs.values():
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def evict_finished(self, now=None):
+        """
+        Удаление устаревших завершенных заданий
+
+        Returns:
+            int: Количество удаленных заданий
+        """
+        now = time.time() if now is None else now
+        finished = sorted((job for job in self.jobs.values()
+                           if job.status in FINISHED and job.finished_at is not None),
+                          key=lambda job: job.finished_at)
+        excess = max(len(finished) - self.max_finished, 0)
+        evicted = 0
+        for index, job in enumerate(finished):
+            if index < excess or now - job.finished_at > self.finished_ttl:
+                del self.jobs[job.job_id]
+                evicted += 1
+        return evicted
+
+    def submit(self, spec):
+        """
+        Постановка задания в очередь
+
+        Returns:
+            Job: Созданное задание
+        """
+        spec = _validate_spec(spec)
+        queued = sum(1 for job in self.jobs.values() if job.status == QUEUED)
+        if queued >= self.max_queued:
+            raise ServiceError(HTTPStatus.SERVICE_UNAVAILABLE, "Очередь заданий заполнена")
+        job = Job(spec)
+        self.jobs[job.job_id] = job
+        job.task = asyncio.get_running_loop().create_task(self._run_job(job))
+        return job
+
+    def get(self, job_id):
+        """Задание по идентификатору"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"Задание {job_id} не найдено")
+        return job
+
+    def cancel(self, job_id):
+        """Отмена задания (прогоны, еще не начатые в пуле, не выполняются)"""
+        job = self.get(job_id)
+        if job.status in (QUEUED, RUNNING):
+            job.task.cancel()
+            job.status = CANCELLED
+            job.finished_at = time.time()
+        return job
+
+    async def _run_point(self, job, params):
+        """Прогон одной точки задания в пуле процессов"""
+        loop = asyncio.get_running_loop()
+        summary = await loop.run_in_executor(self._executor, run_simulation_summary, params)
+        job.completed += 1
+        return summary
+
+    async def _run_job(self, job):
+        """Выполнение задания после освобождения места в очереди"""
+        try:
+            async with self._job_slots:
+                job.status = RUNNING
+                job.started_at = time.time()
+                spec = job.spec
+                params = spec.get('params', {})
+                if job.kind == 'simulation':
+                    job.result = await self._run_point(job, params)
+                else:
+                    points = [dict(params, **{spec['param_name']: value})
+                              for value in spec['values']]
+                    summaries = await asyncio.gather(
+                        *(self._run_point(job, point) for point in points))
+                    job.result = {
+                        'param_name': spec['param_name'],
+                        'values': spec['values'],
+                        'results': summaries,
+                    }
+                job.status = DONE
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+        except Exception as e:
+            job.status = FAILED
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            job.finished_at = time.time()
+
+    def handle(self, method, path, body):
+        """
+        Обработка запроса к API
+
+        Returns:
+            tuple: (код ответа HTTP, объект JSON)
+        """
+        self.evict_finished()
+        parts = [part for part in path.split('?')[0].split('/') if part]
+        if parts == ['health'] and method == 'GET':
+            return HTTPStatus.OK, {'status': 'ok', 'workers': self.workers,
+                                   'max_jobs': self.max_jobs, 'jobs': len(self.jobs)}
+        if parts == ['jobs'] and method == 'GET':
+            return HTTPStatus.OK, [job.to_dict() for job in self.jobs.values()]
+        if parts == ['jobs'] and method == 'POST':
+            try:
+                spec = json.loads(body or b'null')
+            except ValueError:
+                raise ServiceError(HTTPStatus.BAD_REQUEST, "Некорректный JSON")
+            return HTTPStatus.ACCEPTED, self.submit(spec).to_dict()
+        if len(parts) == 2 and parts[0] == 'jobs':
+            if method == 'GET':
+                return HTTPStatus.OK, self.get(parts[1]).to_dict()
+            if method == 'DELETE':
+                return HTTPStatus.OK, self.cancel(parts[1]).to_dict()
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'result' and method == 'GET':
+            job = self.get(parts[1])
+            if job.status != DONE:
+                raise ServiceError(HTTPStatus.CONFLICT,
+                                   f"Задание в состоянии {job.status}, результата нет")
+            return HTTPStatus.OK, {'job_id': job.job_id, 'result': job.result}
+        raise ServiceError(HTTPStatus.NOT_FOUND, f"Неизвестный запрос {method} {path}")
+
+    async def handle_connection(self, reader, writer):
+        """Обработка одного соединения HTTP/1.1 (один запрос на соединение)"""
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            try:
+                if len(request_line) < 2:
+                    raise ServiceError(HTTPStatus.BAD_REQUEST, "Некорректная строка запроса")
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_SIZE:
+                    raise ServiceError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                       "Слишком большое тело запроса")
+                body = await reader.readexactly(length) if length else b''
+                status, payload = self.handle(request_line[0].upper(), request_line[1], body)
+            except ServiceError as e:
+                status, payload = e.status, {'error': str(e)}
+            except Exception as e:
+                status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            writer.write(
+                f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + data)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, max_jobs=2,
+                max_queued=100, finished_ttl=DEFAULT_FINISHED_TTL,
+                max_finished=DEFAULT_MAX_FINISHED):
+    """
+    Запуск сервиса и обработка запросов до отмены
+
+    Args:
+        host (str): Адрес (по умолчанию только локальный)
+        port (int): Порт
+        workers (int): Количество рабочих процессов
+        max_jobs (int): Количество одновременно выполняемых заданий
+        max_queued (int): Максимальное количество ожидающих заданий
+        finished_ttl (float): Время хранения завершенного задания (с)
+        max_finished (int): Максимальное количество хранимых завершенных заданий
+    """
+    service = SimulationService(workers, max_jobs, max_queued, finished_ttl, max_finished)
+    service.start()
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.shutdown()
+
+
+class ServiceClient:
+    """
+    Асинхронный клиент сервиса заданий
+
+    Пример:
+        client = ServiceClient()
+        job_id = await client.submit_simulation({'num_cash_desks': 3})
+        results = await client.wait(job_id)
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+
+    async def request(self, method, path, payload=None):
+        """
+        Запрос к сервису
+
+        Returns:
+            Объект JSON из ответа
+
+        Raises:
+            ServiceError: Если сервис вернул код ошибки
+        """
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(
+                f"{method} {path} HTTP/1.1\r\n"
+                f"Host: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        head, _, data = response.partition(b'\r\n\r\n')
+        status = int(head.split(None, 2)[1])
+        result = json.loads(data.decode('utf-8')) if data else None
+        if status >= 400:
+            message = result.get('error') if isinstance(result, dict) else None
+            raise ServiceError(HTTPStatus(status), message or f"Ошибка {status}")
+        return result
+
+    async def submit_simulation(self, params):
+        """Задание на одну симуляцию, возвращает идентификатор задания"""
+        job = await self.request('POST', '/jobs', {'kind': 'simulation', 'params': params})
+        return job['job_id']
+
+    async def submit_sweep(self, params, param_name, values):
+        """Задание на серию прогонов по значениям параметра"""
+        job = await self.request('POST', '/jobs', {
+            'kind': 'sweep', 'params': params,
+            'param_name': param_name, 'values': list(values)})
+        return job['job_id']
+
+    async def status(self, job_id):
+        """Статус и прогресс задания"""
+        return await self.request('GET', f'/jobs/{job_id}')
+
+    async def result(self, job_id):
+        """Результат завершенного задания"""
+        return (await self.request('GET', f'/jobs/{job_id}/result'))['result']
+
+    async def cancel(self, job_id):
+        """Отмена задания"""
+        return await self.request('DELETE', f'/jobs/{job_id}')
+
+    async def wait(self, job_id, poll_interval=0.5, progress_callback=None):
+        """
+        Ожидание завершения задания
+
+        Args:
+            job_id (str): Идентификатор задания
+            poll_interval (float): Интервал опроса статуса (с)
+            progress_callback (callable): Вызывается со статусом при каждом опросе
+
+        Returns:
+            Результат задания
+
+        Raises:
+            ServiceError: Если задание завершилось с ошибкой или отменено
+        """
+        while True:
+            status = await self.status(job_id)
+            if progress_callback:
+                progress_callback(status)
+            if status['status'] == DONE:
+                return await self.result(job_id)
+            if status['status'] in (FAILED, CANCELLED):
+                raise ServiceError(HTTPStatus.CONFLICT,
+                                   status['error'] or f"Задание {status['status']}")
+            await asyncio.sleep(poll_interval)
+
+
+def main():
+    """Запуск сервиса из командной строки"""
+    parser = argparse.ArgumentParser(description="Сервис заданий моделирования магазина")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="адрес сервиса")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="порт сервиса")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="количество рабочих процессов")
+    parser.add_argument('--max-jobs', type=int, default=2,
+                        help="количество одновременно выполняемых заданий")
+    parser.add_argument('--max-queued', type=int, default=100,
+                        help="максимальное количество ожидающих заданий")
+    parser.add_argument('--finished-ttl', type=float, default=DEFAULT_FINISHED_TTL,
+                        help="время хранения завершенного задания (с)")
+    parser.add_argument('--max-finished', type=int, default=DEFAULT_MAX_FINISHED,
+                        help="максимальное количество хранимых завершенных заданий")
+    args = parser.parse_args()
+
+    print(f"Сервис заданий: http://{args.host}:{args.port}")
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_jobs,
+                          args.max_queued, args.finished_ttl, args.max_finished))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import uuid
+
+import numpy as np
+
+
+# Результаты с данными по отдельным покупателям и временными рядами:
+# именно их передача между процессами дороже самой симуляции
+ARRAY_KEYS = [
+    'waiting_time_distribution',
+    'time_in_shop_distribution',
+    'queue_length_time_series',
+]
+
+
+class ArrayHandle:
+    """
+    Ссылка на массив результатов в файле .npy
+
+    Передается между процессами вместо самого массива (pickle сериализует
+    только путь и размер), а массив открывается отображением в память.
+    """
+
+    def __init__(self, path, length):
+        self.path = path
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def open(self):
+        """Массив, отображенный в память только для чтения (без копирования)"""
+        # Пустой массив нельзя отобразить в память
+        return np.load(self.path, mmap_mode='r' if self.length else None)
+
+
+class ResultStore:
+    """
+    Каталог для передачи массивов результатов из рабочих процессов
+
+    Рабочий процесс записывает массивы результатов в файлы каталога и
+    возвращает компактный словарь, в котором массивы заменены ссылками
+    ArrayHandle. Родительский процесс открывает их отображением в память,
+    поэтому данные по покупателям не проходят через pickle и не копируются.
+    Каталог удаляется методом cleanup() (или при выходе из with), когда
+    результаты больше не нужны.
+    """
+
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory (str): Каталог для файлов (по умолчанию временный)
+        """
+        self.directory = directory or tempfile.mkdtemp(prefix='shop_results_')
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
+
+    def export(self, results):
+        """
+        Запись массивов результатов в файлы и замена их ссылками
+
+        Args:
+            results (dict): Результаты симуляции
+
+        Returns:
+            dict: Результаты, в которых массивы ARRAY_KEYS заменены ArrayHandle
+        """
+        exported = dict(results)
+        prefix = uuid.uuid4().hex
+        for key in ARRAY_KEYS:
+            if key not in results:
+                continue
+            values = np.asarray(results[key], dtype=np.float64)
+            if key == 'queue_length_time_series':
+                # Пары (время, длина), упорядоченные по времени
+                values = values.reshape(-1, 2)
+                values = values[np.argsort(values[:, 0], kind='stable')]
+            path = os.path.join(self.directory, f'{prefix}_{key}.npy')
+            np.save(path, values)
+            exported[key] = ArrayHandle(path, len(values))
+        return exported
+
+    def load(self, exported):
+        """
+        Открытие массивов результатов, записанных export()
+
+        Returns:
+            dict: Результаты с массивами, отображенными в память
+        """
+        return {key: value.open() if isinstance(value, ArrayHandle) else value
+                for key, value in exported.items()}
+
+    def cleanup(self):
+        """Удаление каталога с файлами результатов"""
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -1,7 +1,29 @@
+import heapq
 import simpy
 import random
 import numpy as np
-from collections import defaultdict
+from collections import defaultdict, deque
+
+import events
+from distributions import make_sampler
+from intervals import IntervalStats
+from sketches import IntervalTotal, LastValueSeries, StreamingSummary
+from stability import StabilityGuard
+
+
+def working_time(intervals, until=None):
+    """
+    Суммарное время занятости кассы по ее интервалам обслуживания
+
+    Args:
+        intervals: Список интервалов (начало, конец) или IntervalTotal
+        until (float): Момент окончания наблюдения (интервалы отсекаются по нему)
+    """
+    if isinstance(intervals, IntervalTotal):
+        return intervals.total(until)
+    if until is None:
+        return sum(end - start for start, end in intervals)
+    return sum(min(end, until) - start for start, end in intervals)
 
 
 class ShopSimulation:
@@ -45,6 +67,26 @@ class ShopSimulation:
         # количество касс - преобразуем в int для безопасности
         self.num_cash_desks = int(params.get('num_cash_desks', 3))
 
+        # Ограничения при перегрузке (None - ограничение не действует):
+        # уход при длине очереди не меньше заданной (balking)
+        self.balk_queue_length = params.get('balk_queue_length')
+        # среднее терпение покупателя в очереди (мин), после которого он уходит
+        self.patience_mean = params.get('patience_mean')
+        # максимальное количество покупателей в магазине (не впускать сверх него)
+        self.max_customers_in_shop = params.get('max_customers_in_shop')
+
+        # Наблюдаемые значения для эмпирических распределений
+        self.shopping_time_samples = params.get('shopping_time_samples')
+        self.service_time_samples = params.get('service_time_samples')
+
+        self._init_random_streams()
+        self._create_samplers()
+
+        # Журнал прибытий для воспроизведения (итерируемый источник пар
+        # (время прибытия, время обслуживания или None), см. arrivals.py).
+        # Если не задан, прибытия генерируются по экспоненциальному закону
+        self.arrival_trace = params.get('arrival_trace')
+
         # Создание среды моделирования
         self.env = simpy.Environment()
 
@@ -67,55 +109,188 @@ class ShopSimulation:
             # занятость каждой кассы (время начала:время окончания)
             'cash_desk_usage': defaultdict(list),
             'current_time': 0,       # текущее время симуляции
+            'customers_balked': 0,   # ушли, увидев длинную очередь
+            'customers_reneged': 0,  # ушли из очереди, не дождавшись
+            'customers_rejected': 0,  # не впущены в магазин
         }
 
+        # Хранить ли данные по отдельным покупателям (см. iter_events)
+        self.keep_stats = True
+
+        # Количество покупателей в магазине в текущий момент
+        self.customers_in_shop = 0
+
+        # Этап выбора товаров - система с бесконечным числом каналов:
+        # покупатели в торговом зале хранятся в куче моментов окончания
+        # выбора (момент, номер, время прибытия, время обслуживания),
+        # их обслуживает один процесс shopping_stage
+        self._shopping_due = []
+        self._shopping_next_due = None
+        self._shopping_wakeup = None
+
+        # Контроль устойчивости: при неограниченном росте очереди прогон
+        # останавливается досрочно и помечается как неустойчивый
+        self.stability_guard = (StabilityGuard(params)
+                                if params.get('stability_guard') else None)
+        # Момент досрочной остановки (None - прогон до конца)
+        self.stopped_at = None
+
+        # Очередь событий для потокового чтения (см. iter_events),
+        # None - события не формируются
+        self._event_sink = None
+
+        # Статистика по интервалам модельного времени (параметр
+        # 'interval_width' - ширина интервала в минутах). По умолчанию не
+        # собирается: учет каждого события заметно замедляет короткие прогоны
+        interval_width = params.get('interval_width')
+        self.interval_stats = (IntervalStats(interval_width, self.simulation_time)
+                               if interval_width else None)
+
         # Результаты симуляции
         self.results = {}
 
+    def _init_random_streams(self):
+        """Создание потоков случайных чисел из seed
+
+        Отдельные потоки для прибытий, выбора товаров и обслуживания:
+        изменение одного этапа не сдвигает случайные числа остальных.
+        """
+        arrival_seq, shopping_seq, service_seq, patience_seq = np.random.SeedSequence(
+            self.seed).spawn(4)
+        self.arrival_rng = np.random.default_rng(arrival_seq)
+        self.shopping_rng = np.random.default_rng(shopping_seq)
+        self.service_rng = np.random.default_rng(service_seq)
+        self.patience_rng = np.random.default_rng(patience_seq)
+
+    def _create_samplers(self):
+        """Создание генераторов случайных величин по реестру распределений"""
+        # Интервалы между прибытиями - экспоненциальное распределение
+        self.interarrival_sampler = make_sampler(
+            'exponential', self.arrival_rng, mean=self.customer_arrival_mean)
+
+        # Время выбора товаров: ограничение снизу минимумом, для нормального
+        # распределения также сверху максимумом, равномерное - на [мин, макс]
+        self.shopping_sampler = make_sampler(
+            self.shopping_time_dist, self.shopping_rng,
+            mean=self.shopping_time_mean, std=self.shopping_time_std,
+            lower=None if self.shopping_time_dist == 'uniform' else self.shopping_time_min,
+            upper=self.shopping_time_max if self.shopping_time_dist == 'normal' else None,
+            low=self.shopping_time_min, high=self.shopping_time_max,
+            samples=self.shopping_time_samples)
+
+        # Время обслуживания: не меньше 0.5 мин
+        self.service_sampler = make_sampler(
+            self.service_time_dist, self.service_rng,
+            mean=self.service_time_mean, std=self.service_time_std,
+            lower=0.5, samples=self.service_time_samples)
+
+        # Терпение в очереди - экспоненциальное распределение
+        self.patience_sampler = None
+        if self.patience_mean:
+            self.patience_sampler = make_sampler(
+                'exponential', self.patience_rng, mean=self.patience_mean)
+
     def generate_shopping_time(self):
         """Генерирует время выбора товаров согласно заданному распределению"""
-        if self.shopping_time_dist == 'normal':
-            # Нормальное распределение с ограничением снизу
-            time = max(self.shopping_time_min,
-                       np.random.normal(self.shopping_time_mean, self.shopping_time_std))
-            return min(time, self.shopping_time_max)  # с ограничением сверху
-        elif self.shopping_time_dist == 'uniform':
-            # Равномерное распределение
-            return np.random.uniform(self.shopping_time_min, self.shopping_time_max)
-        else:
-            # По умолчанию используем экспоненциальное распределение
-            return max(self.shopping_time_min, np.random.exponential(self.shopping_time_mean))
+        return self.shopping_sampler.draw()
 
     def generate_service_time(self):
         """Генерирует время обслуживания на кассе согласно заданному распределению"""
-        if self.service_time_dist == 'normal':
-            # Нормальное распределение с ограничением снизу
-            return max(0.5, np.random.normal(self.service_time_mean, self.service_time_std))
-        else:
-            # По умолчанию используем экспоненциальное распределение
-            return max(0.5, np.random.exponential(self.service_time_mean))
+        return self.service_sampler.draw()
 
-    def customer_process(self, customer_id):
-        """Процесс движения покупателя по магазину"""
-        # Фиксируем время прибытия
-        arrival_time = self.env.now
+    def start_shopping(self, customer_id, service_time=None):
+        """Покупатель входит в торговый зал и начинает выбор товаров
 
+        Args:
+            customer_id: номер покупателя
+            service_time: наблюдаемое время обслуживания из журнала (если есть)
+        """
         # Запись времени для статистики очереди
         self.stats['queue_lengths'][int(self.env.now)] = len(
             self.cash_desks.queue) + len(self.cash_desks.users)
 
-        # Процесс выбора товаров
-        shopping_time = self.generate_shopping_time()
-        yield self.env.timeout(shopping_time)
+        due = self.env.now + self.generate_shopping_time()
+        heapq.heappush(self._shopping_due, (due, customer_id, self.env.now, service_time))
+        if self._shopping_next_due is None or due < self._shopping_next_due:
+            self._set_shopping_timer(due)
+
+    def _set_shopping_timer(self, due):
+        """Таймер пробуждения этапа выбора товаров к моменту due
+
+        Таймеры SimPy нельзя отменить, поэтому таймер, ставший лишним
+        после появления более раннего момента, при срабатывании ничего
+        не делает (в куче нет покупателей, закончивших выбор).
+        """
+        self._shopping_next_due = due
+        timer = self.env.timeout(due - self.env.now)
+        timer.callbacks.append(self._wake_shopping_stage)
+
+    def _wake_shopping_stage(self, timer):
+        """Пробуждение процесса этапа, если есть покупатели, закончившие выбор"""
+        wakeup = self._shopping_wakeup
+        if (wakeup is not None and not wakeup.triggered and self._shopping_due
+                and self._shopping_due[0][0] <= self.env.now):
+            wakeup.succeed()
+
+    def shopping_stage(self):
+        """Процесс этапа выбора товаров
+
+        Вместо отдельного процесса на каждого покупателя в торговом зале
+        один процесс ждет ближайшего момента окончания выбора из кучи
+        и передает покупателей в очередь к кассам (customer_process).
+        """
+        due_heap = self._shopping_due
+        while True:
+            self._shopping_wakeup = self.env.event()
+            yield self._shopping_wakeup
+
+            while due_heap and due_heap[0][0] <= self.env.now:
+                _, customer_id, arrival_time, service_time = heapq.heappop(due_heap)
+                self.env.process(self.customer_process(
+                    customer_id, arrival_time, service_time))
+
+            if due_heap:
+                self._set_shopping_timer(due_heap[0][0])
+            else:
+                self._shopping_next_due = None
 
-        # Покупатель встает в очередь к кассе
+    def customer_process(self, customer_id, arrival_time, service_time=None):
+        """Процесс покупателя у касс: очередь, обслуживание и уход из магазина
+
+        Args:
+            customer_id: номер покупателя
+            arrival_time: момент прибытия в магазин
+            service_time: наблюдаемое время обслуживания из журнала (если есть)
+        """
+        # Покупатель закончил выбор товаров и встает в очередь к кассе
         queue_join_time = self.env.now
         self.stats['queue_lengths'][int(self.env.now)] = len(
             self.cash_desks.queue) + len(self.cash_desks.users)
 
+        # Уход при слишком длинной очереди
+        if self.balk_queue_length and len(self.cash_desks.queue) >= self.balk_queue_length:
+            self.stats['customers_balked'] += 1
+            self.customers_in_shop -= 1
+            self._emit(events.BALK, customer_id)
+            return
+        self._emit(events.QUEUE_JOIN, customer_id)
+
         # Процесс ожидания в очереди и обслуживания на кассе
         with self.cash_desks.request() as request:
-            yield request
+            if self.patience_sampler is not None:
+                # Ожидание ограничено терпением покупателя
+                patience = self.env.timeout(self.patience_sampler.draw())
+                yield request | patience
+                if not request.triggered:
+                    # Запрос отменяется при выходе из блока with
+                    self.stats['customers_reneged'] += 1
+                    self.customers_in_shop -= 1
+                    self.stats['queue_lengths'][int(self.env.now)] = len(
+                        self.cash_desks.queue) + len(self.cash_desks.users) - 1
+                    self._emit(events.RENEGE, customer_id)
+                    return
+            else:
+                yield request
 
             # Покупатель дождался своей очереди
             queue_exit_time = self.env.now
@@ -123,7 +298,8 @@ class ShopSimulation:
             self.stats['waiting_times'].append(waiting_time)
 
             # Обслуживание на кассе
-            service_time = self.generate_service_time()
+            if service_time is None:
+                service_time = self.generate_service_time()
 
             # Выбираем доступную кассу из пула
             cash_desk_id = None
@@ -140,46 +316,99 @@ class ShopSimulation:
             # Запись интервала занятости кассы
             self.stats['cash_desk_usage'][cash_desk_id].append(
                 (self.env.now, self.env.now + service_time))
+            self._emit(events.SERVICE_START, customer_id, cash_desk_id, waiting_time)
 
             yield self.env.timeout(service_time)
 
             # Освобождаем кассу
             if cash_desk_id is not None:
                 self.cash_desk_active[cash_desk_id] = False
+            self._emit(events.SERVICE_END, customer_id, cash_desk_id)
 
         # Покупатель покидает магазин
         exit_time = self.env.now
         total_time = exit_time - arrival_time
         self.stats['total_time_in_shop'].append(total_time)
         self.stats['customers_served'] += 1
+        self.customers_in_shop -= 1
+        self._emit(events.DEPARTURE, customer_id, value=total_time)
 
         # Обновление статистики очереди
         self.stats['queue_lengths'][int(self.env.now)] = len(
             self.cash_desks.queue) + len(self.cash_desks.users)
 
+    def _admit_customer(self, customer_id):
+        """Проверка ограничения на количество покупателей в магазине"""
+        if self.max_customers_in_shop and self.customers_in_shop >= self.max_customers_in_shop:
+            self.stats['customers_rejected'] += 1
+            self._emit(events.REJECT, customer_id)
+            return False
+        self.customers_in_shop += 1
+        self._emit(events.ARRIVAL, customer_id)
+        return True
+
+    def _emit(self, kind, customer_id, desk_id=None, value=None):
+        """Передача события статистике по интервалам и в поток iter_events"""
+        time = self._current_time()
+        if self.interval_stats is not None:
+            self.interval_stats.record(time, kind, desk_id, value)
+        if self._event_sink is not None:
+            self._event_sink.append(events.SimulationEvent(
+                time, kind, customer_id, desk_id, value))
+
     def customer_generator(self):
         """Генератор потока покупателей"""
+        if self.arrival_trace is not None:
+            yield from self.trace_customer_generator()
+            return
+
         customer_id = 0
 
         while True:
             # Генерация интервала прибытия (экспоненциальное распределение)
-            interarrival_time = np.random.exponential(
-                self.customer_arrival_mean)
+            interarrival_time = self.interarrival_sampler.draw()
             yield self.env.timeout(interarrival_time)
 
             # Создание нового покупателя
             customer_id += 1
             self.stats['customer_arrivals'] += 1
-            self.env.process(self.customer_process(customer_id))
+            if self._admit_customer(customer_id):
+                self.start_shopping(customer_id)
+
+    def trace_customer_generator(self):
+        """Генератор потока покупателей по журналу прибытий
+
+        Записи журнала читаются лениво по мере продвижения модельного времени,
+        поэтому память не зависит от длины журнала.
+        """
+        customer_id = 0
+
+        for arrival_time, service_time in self.arrival_trace:
+            if arrival_time > self.simulation_time:
+                break
+            if arrival_time > self.env.now:
+                yield self.env.timeout(arrival_time - self.env.now)
+
+            customer_id += 1
+            self.stats['customer_arrivals'] += 1
+            if self._admit_customer(customer_id):
+                self.start_shopping(customer_id, service_time)
+
+    def _start_processes(self):
+        """Запуск процессов модели в среде SimPy"""
+        # Запуск этапа выбора товаров
+        self.env.process(self.shopping_stage())
 
-    def run_simulation(self):
-        """Запуск симуляции магазина"""
         # Запуск генератора покупателей
         self.env.process(self.customer_generator())
 
         # Запуск процесса мониторинга длины очереди
         self.env.process(self.monitor_queue())
 
+    def run_simulation(self):
+        """Запуск симуляции магазина"""
+        self._start_processes()
+
         # Запуск симуляции
         self.env.run(until=self.simulation_time)
 
@@ -188,21 +417,199 @@ class ShopSimulation:
 
         return self.results
 
+    def iter_events(self, kinds=None, keep_stats=True):
+        """
+        Потоковое выполнение симуляции с выдачей событий
+
+        Модель продвигается по одному событию календаря только тогда,
+        когда потребитель запрашивает следующее событие, поэтому поток
+        можно читать лениво, фильтровать и передавать в файл или сокет
+        (см. events.write_events_jsonl) во время симуляции. После
+        исчерпания потока результаты доступны в self.results, как после
+        run_simulation().
+
+        Args:
+            kinds: типы событий для выдачи (по умолчанию все events.EVENT_KINDS)
+            keep_stats (bool): Хранить данные по отдельным покупателям. При
+                False память не растет с количеством покупателей (см.
+                use_streaming_stats)
+
+        Yields:
+            events.SimulationEvent: События в порядке модельного времени
+        """
+        if not keep_stats:
+            self.use_streaming_stats()
+        wanted = set(kinds) if kinds is not None else None
+        sink = self._event_sink = deque()
+        try:
+            self._start_processes()
+            while self.env.peek() < self.simulation_time:
+                try:
+                    self.env.step()
+                except simpy.core.StopSimulation:
+                    break
+                while sink:
+                    event = sink.popleft()
+                    if wanted is None or event.kind in wanted:
+                        yield event
+            if self.stopped_at is None:
+                self.env.run(until=self.simulation_time)
+        finally:
+            self._event_sink = None
+        self.calculate_results()
+
+    def use_streaming_stats(self):
+        """
+        Переход к статистике без хранения данных по отдельным покупателям
+
+        Списки времени ожидания и нахождения в магазине, интервалы
+        занятости касс и отсчеты длины очереди заменяются накопителями
+        (sketches.py): в результатах остаются скалярные показатели
+        (95-й процентиль ожидания - оценка P²), а распределения и ряд
+        длины очереди пусты. Уже собранные данные переносятся в накопители.
+        """
+        if not self.keep_stats:
+            return
+        self.keep_stats = False
+        stats = self.stats
+        for key in ('waiting_times', 'total_time_in_shop'):
+            summary = StreamingSummary()
+            for value in stats[key]:
+                summary.append(value)
+            stats[key] = summary
+        usage = defaultdict(IntervalTotal)
+        for desk_id, intervals in stats['cash_desk_usage'].items():
+            for interval in intervals:
+                usage[desk_id].append(interval)
+        stats['cash_desk_usage'] = usage
+        series = LastValueSeries()
+        for time, length in stats['queue_lengths'].items():
+            series[time] = length
+        stats['queue_lengths'] = series
+
     def monitor_queue(self):
         """Процесс мониторинга длины очереди через равные интервалы"""
         while True:
             # Запись текущей длины очереди
-            self.stats['queue_lengths'][int(self.env.now)] = len(
-                self.cash_desks.queue) + len(self.cash_desks.users)
+            queue_length = len(self.cash_desks.queue) + len(self.cash_desks.users)
+            self.stats['queue_lengths'][int(self.env.now)] = queue_length
+            if self._check_stability(queue_length):
+                # Досрочная остановка симуляции в текущий момент
+                self.stats['current_time'] = self.env.now
+                stop = self.env.event()
+                stop.callbacks.append(simpy.core.StopSimulation.callback)
+                stop.succeed()
+                return
             yield self.env.timeout(1)  # мониторинг каждую минуту
             self.stats['current_time'] = self.env.now
 
+    def _check_stability(self, queue_length):
+        """
+        Передача отсчета длины очереди контролю устойчивости
+
+        Returns:
+            bool: Нужно ли остановить прогон (режим признан неустойчивым)
+        """
+        if self.stability_guard is None or self.stopped_at is not None:
+            return False
+        if self.stability_guard.observe(self._current_time(), queue_length):
+            self.stopped_at = self._current_time()
+            return True
+        return False
+
+    def _current_time(self):
+        """Текущий момент модельного времени"""
+        return self.env.now
+
+    def observed_time(self):
+        """Фактическая длительность прогона (с учетом досрочной остановки)"""
+        return self.stopped_at if self.stopped_at is not None else self.simulation_time
+
     def calculate_results(self):
         """Расчет результатов симуляции по собранной статистике"""
         # Общие показатели
         self.results['total_customers_arrived'] = self.stats['customer_arrivals']
         self.results['total_customers_served'] = self.stats['customers_served']
 
+        # Потерянные покупатели
+        self.results['customers_balked'] = self.stats['customers_balked']
+        self.results['customers_reneged'] = self.stats['customers_reneged']
+        self.results['customers_rejected'] = self.stats['customers_rejected']
+        self.results['total_customers_lost'] = (self.stats['customers_balked'] +
+                                                self.stats['customers_reneged'] +
+                                                self.stats['customers_rejected'])
+
+        if self.keep_stats:
+            self._distribution_results()
+        else:
+            self._streaming_results()
+
+        # Коэффициент загрузки кассовых узлов
+        total_working_time = 0
+        cash_desk_utilization = {}
+
+        # Обрабатываем только реальные кассы (их количество ограничено num_cash_desks)
+        for cash_desk_id, intervals in self.stats['cash_desk_usage'].items():
+            # Проверяем, что cash_desk_id является числом и находится в диапазоне касс
+            if isinstance(cash_desk_id, (int, np.integer)) and 0 <= cash_desk_id < self.num_cash_desks:
+                desk_working_time = working_time(intervals)
+                utilization = desk_working_time / self.observed_time()
+                cash_desk_utilization[cash_desk_id] = utilization
+                total_working_time += desk_working_time
+
+        # Убедимся, что есть запись для каждой кассы, даже если она не использовалась
+        for i in range(self.num_cash_desks):
+            if i not in cash_desk_utilization:
+                cash_desk_utilization[i] = 0.0
+
+        self.results['cash_desk_utilization'] = cash_desk_utilization
+
+        if self.num_cash_desks > 0:
+            self.results['avg_cash_desk_utilization'] = total_working_time / \
+                (self.observed_time() * self.num_cash_desks)
+        else:
+            self.results['avg_cash_desk_utilization'] = 0
+
+        # Выборочные средние входных величин (для контрольных переменных)
+        self.results['input_sample_means'] = {
+            'customer_arrival_mean': self.interarrival_sampler.drawn_mean(),
+            'shopping_time_mean': self.shopping_sampler.drawn_mean(),
+            'service_time_mean': self.service_sampler.drawn_mean(),
+        }
+
+        # Статистика по интервалам модельного времени
+        if self.interval_stats is not None:
+            self.results.update(self.interval_stats.results(
+                self._current_time(), self.num_cash_desks))
+
+        # Результаты контроля устойчивости
+        guard = self.stability_guard
+        self.results['unstable'] = guard is not None and guard.unstable
+        self.results['stopped_at'] = self.stopped_at
+        if guard is not None:
+            self.results['offered_load'] = guard.offered_load
+            self.results['queue_trend'] = guard.trend
+
+    def _streaming_results(self):
+        """Скалярные показатели по накопителям (см. use_streaming_stats)"""
+        time_in_shop = self.stats['total_time_in_shop']
+        self.results['avg_time_in_shop'] = time_in_shop.mean()
+        self.results['max_time_in_shop'] = time_in_shop.maximum
+        self.results['time_in_shop_distribution'] = []
+
+        waiting_times = self.stats['waiting_times']
+        self.results['avg_waiting_time'] = waiting_times.mean()
+        self.results['max_waiting_time'] = waiting_times.maximum
+        self.results['p95_waiting_time'] = waiting_times.quantile.value()
+        self.results['waiting_time_distribution'] = []
+
+        queue_lengths = self.stats['queue_lengths']
+        self.results['avg_queue_length'] = queue_lengths.mean()
+        self.results['max_queue_length'] = queue_lengths.max()
+        self.results['queue_length_time_series'] = []
+
+    def _distribution_results(self):
+        """Показатели и распределения по данным отдельных покупателей"""
         # Время нахождения в магазине
         if self.stats['total_time_in_shop']:
             self.results['avg_time_in_shop'] = np.mean(
@@ -221,10 +628,14 @@ class ShopSimulation:
                 self.stats['waiting_times'])
             self.results['max_waiting_time'] = np.max(
                 self.stats['waiting_times'])
+            # 95-й перцентиль времени ожидания (для проверки SLA)
+            self.results['p95_waiting_time'] = np.percentile(
+                self.stats['waiting_times'], 95)
             self.results['waiting_time_distribution'] = self.stats['waiting_times']
         else:
             self.results['avg_waiting_time'] = 0
             self.results['max_waiting_time'] = 0
+            self.results['p95_waiting_time'] = 0
             self.results['waiting_time_distribution'] = []
 
         # Длина очереди
@@ -240,29 +651,3 @@ class ShopSimulation:
             self.results['avg_queue_length'] = 0
             self.results['max_queue_length'] = 0
             self.results['queue_length_time_series'] = []
-
-        # Коэффициент загрузки кассовых узлов
-        total_working_time = 0
-        cash_desk_utilization = {}
-
-        # Обрабатываем только реальные кассы (их количество ограничено num_cash_desks)
-        for cash_desk_id, intervals in self.stats['cash_desk_usage'].items():
-            # Проверяем, что cash_desk_id является числом и находится в диапазоне касс
-            if isinstance(cash_desk_id, (int, np.integer)) and 0 <= cash_desk_id < self.num_cash_desks:
-                working_time = sum(end - start for start, end in intervals)
-                utilization = working_time / self.simulation_time
-                cash_desk_utilization[cash_desk_id] = utilization
-                total_working_time += working_time
-
-        # Убедимся, что есть запись для каждой кассы, даже если она не использовалась
-        for i in range(self.num_cash_desks):
-            if i not in cash_desk_utilization:
-                cash_desk_utilization[i] = 0.0
-
-        self.results['cash_desk_utilization'] = cash_desk_utilization
-
-        if self.num_cash_desks > 0:
-            self.results['avg_cash_desk_utilization'] = total_working_time / \
-                (self.simulation_time * self.num_cash_desks)
-        else:
-            self.results['avg_cash_desk_utilization'] = 0
@@ -0,0 +1,333 @@
+import numpy as np
+
+
+class BinnedQuantiles:
+    """
+    Потоковые оценки квантилей по интервалам временной сетки
+
+    Для каждого интервала сетки и каждой вероятности используется
+    алгоритм P² (Джейн и Хламтач, 1985): квантиль отслеживается пятью
+    маркерами, положения которых корректируются параболической
+    интерполяцией после каждого наблюдения. Память не зависит от
+    количества наблюдений - O(интервалов × квантилей). Каждое наблюдение -
+    вектор значений по всем интервалам (например, временной ряд одной
+    репликации), поэтому обновление векторизовано по интервалам.
+
+    Первые exact_count наблюдений хранятся, и квантили по ним считаются
+    точно (P² неточен для крайних квантилей на малых выборках), затем
+    маркеры инициализируются порядковыми статистиками этой выборки.
+    """
+
+    # Количество маркеров P²
+    MARKERS = 5
+
+    def __init__(self, num_bins, probabilities=(0.05, 0.5, 0.95), exact_count=32):
+        """
+        Args:
+            num_bins (int): Количество интервалов сетки
+            probabilities: Вероятности отслеживаемых квантилей
+            exact_count (int): Количество первых наблюдений, хранимых для
+                точного расчета (не меньше количества маркеров)
+        """
+        self.num_bins = num_bins
+        self.probabilities = tuple(probabilities)
+        self.exact_count = max(exact_count, self.MARKERS)
+        self.count = 0
+        self.mean = np.zeros(num_bins)
+
+        p = np.asarray(self.probabilities, dtype=float)[:, None]
+        # Доли положений маркеров и их приращения на одно наблюдение
+        self._increments = np.hstack([np.zeros_like(p), p / 2, p, (1 + p) / 2,
+                                      np.ones_like(p)])
+        # Высоты маркеров, их фактические и желаемые положения
+        shape = (len(self.probabilities), num_bins, self.MARKERS)
+        self._heights = np.zeros(shape)
+        self._positions = np.zeros(shape)
+        self._desired = np.zeros((len(self.probabilities), self.MARKERS))
+        # Первые наблюдения до инициализации маркеров
+        self._initial = []
+
+    def _init_markers(self):
+        """Инициализация маркеров по сохраненным первым наблюдениям"""
+        values = np.sort(np.array(self._initial), axis=0)
+        last = len(values) - 1
+        self._desired = last * self._increments
+        positions = np.round(self._desired)
+        for j in range(len(self.probabilities)):
+            # Положения маркеров должны строго возрастать
+            for i in range(1, self.MARKERS):
+                positions[j, i] = min(max(positions[j, i], positions[j, i - 1] + 1),
+                                      last - (self.MARKERS - 1 - i))
+            self._positions[j] = positions[j]
+            self._heights[j] = values[positions[j].astype(int)].T
+        self._initial = []
+
+    def update(self, values):
+        """
+        Добавление наблюдения
+
+        Args:
+            values: значения по всем интервалам сетки (длина num_bins)
+        """
+        x = np.asarray(values, dtype=float)
+        self.count += 1
+        self.mean += (x - self.mean) / self.count
+
+        if self.count <= self.exact_count:
+            self._initial.append(x)
+            if self.count == self.exact_count:
+                self._init_markers()
+            return
+
+        q, n = self._heights, self._positions
+        # Интервал между маркерами, в который попало наблюдение; крайние
+        # маркеры сдвигаются к новым минимуму и максимуму
+        q[:, :, 0] = np.minimum(q[:, :, 0], x)
+        q[:, :, -1] = np.maximum(q[:, :, -1], x)
+        cell = (x[None, :, None] >= q[:, :, 1:4]).sum(axis=2)
+        n += np.arange(self.MARKERS)[None, None, :] > cell[:, :, None]
+        self._desired += self._increments
+
+        for i in range(1, self.MARKERS - 1):
+            d = self._desired[:, i][:, None] - n[:, :, i]
+            move_up = (d >= 1) & (n[:, :, i + 1] - n[:, :, i] > 1)
+            move_down = (d <= -1) & (n[:, :, i - 1] - n[:, :, i] < -1)
+            step = move_up.astype(float) - move_down
+            moving = step != 0
+            if not moving.any():
+                continue
+
+            qi, q_low, q_high = q[:, :, i], q[:, :, i - 1], q[:, :, i + 1]
+            ni, n_low, n_high = n[:, :, i], n[:, :, i - 1], n[:, :, i + 1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                parabolic = qi + step / (n_high - n_low) * (
+                    (ni - n_low + step) * (q_high - qi) / (n_high - ni) +
+                    (n_high - ni - step) * (qi - q_low) / (ni - n_low))
+                q_side = np.where(step > 0, q_high, q_low)
+                n_side = np.where(step > 0, n_high, n_low)
+                linear = qi + step * (q_side - qi) / (n_side - ni)
+            inside = (q_low < parabolic) & (parabolic < q_high)
+            q[:, :, i] = np.where(moving, np.where(inside, parabolic, linear), qi)
+            n[:, :, i] = ni + step
+
+    def quantiles(self):
+        """
+        Текущие оценки квантилей
+
+        Returns:
+            dict: Вероятность -> массив оценок по интервалам сетки
+        """
+        if self.count == 0:
+            return {p: np.full(self.num_bins, np.nan) for p in self.probabilities}
+        if self._initial:
+            # Пока наблюдений мало, квантили считаются точно
+            values = np.array(self._initial)
+            return {p: np.percentile(values, 100 * p, axis=0) for p in self.probabilities}
+        return {p: self._heights[j, :, 2].copy() for j, p in enumerate(self.probabilities)}
+
+
+class StreamingQuantile:
+    """
+    Потоковая оценка одного квантиля алгоритмом P²
+
+    Скалярный вариант BinnedQuantiles для наблюдений, поступающих по
+    одному: обновление выполняется за O(1), память не зависит от
+    количества наблюдений. Первые exact_count наблюдений хранятся, и
+    квантиль по ним считается точно.
+    """
+
+    MARKERS = 5
+
+    def __init__(self, probability=0.95, exact_count=32):
+        """
+        Args:
+            probability (float): Вероятность квантиля
+            exact_count (int): Количество первых наблюдений для точного расчета
+        """
+        self.probability = probability
+        self.exact_count = max(exact_count, self.MARKERS)
+        self.count = 0
+        self._increments = (0.0, probability / 2, probability, (1 + probability) / 2, 1.0)
+        self._heights = None
+        self._positions = None
+        self._desired = None
+        self._initial = []
+
+    def _init_markers(self):
+        """Инициализация маркеров по сохраненным первым наблюдениям"""
+        values = sorted(self._initial)
+        last = len(values) - 1
+        self._desired = [last * increment for increment in self._increments]
+        positions = [round(desired) for desired in self._desired]
+        # Положения маркеров должны строго возрастать
+        for i in range(1, self.MARKERS):
+            positions[i] = min(max(positions[i], positions[i - 1] + 1),
+                               last - (self.MARKERS - 1 - i))
+        self._positions = positions
+        self._heights = [values[position] for position in positions]
+        self._initial = []
+
+    def add(self, x):
+        """Добавление наблюдения"""
+        self.count += 1
+        if self._heights is None:
+            self._initial.append(x)
+            if self.count == self.exact_count:
+                self._init_markers()
+            return
+
+        q, n, desired = self._heights, self._positions, self._desired
+        if x < q[0]:
+            q[0] = x
+        elif x > q[4]:
+            q[4] = x
+        # Маркеры выше наблюдения сдвигаются на одну позицию
+        if x < q[1]:
+            n[1] += 1
+            n[2] += 1
+            n[3] += 1
+        elif x < q[2]:
+            n[2] += 1
+            n[3] += 1
+        elif x < q[3]:
+            n[3] += 1
+        n[4] += 1
+        increments = self._increments
+        desired[1] += increments[1]
+        desired[2] += increments[2]
+        desired[3] += increments[3]
+        desired[4] += 1.0
+
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            if d >= 1 and n[i + 1] - n[i] > 1:
+                step = 1
+            elif d <= -1 and n[i - 1] - n[i] < -1:
+                step = -1
+            else:
+                continue
+            parabolic = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+            if q[i - 1] < parabolic < q[i + 1]:
+                q[i] = parabolic
+            else:
+                q[i] += step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+            n[i] += step
+
+    def value(self):
+        """Текущая оценка квантиля (0 при отсутствии наблюдений)"""
+        if self._heights is not None:
+            return self._heights[2]
+        if not self._initial:
+            return 0.0
+        return float(np.percentile(self._initial, 100 * self.probability))
+
+
+class StreamingSummary:
+    """
+    Количество, среднее, максимум и квантиль потока значений без их хранения
+
+    Заменяет список значений в статистике модели (метод append), когда
+    данные по отдельным покупателям не нужны; квантиль оценивается
+    алгоритмом P² (см. StreamingQuantile).
+    """
+
+    def __init__(self, probability=0.95):
+        """
+        Args:
+            probability (float): Вероятность отслеживаемого квантиля
+        """
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.quantile = StreamingQuantile(probability)
+
+    def __len__(self):
+        return self.count
+
+    def append(self, x):
+        """Добавление значения"""
+        if self.count == 0 or x > self.maximum:
+            self.maximum = x
+        self.count += 1
+        self.total += x
+        self.quantile.add(x)
+
+    def mean(self):
+        """Среднее значение (0 при отсутствии значений)"""
+        return self.total / self.count if self.count else 0.0
+
+
+class LastValueSeries:
+    """
+    Среднее и максимум ряда "ключ -> последнее значение" без хранения ряда
+
+    Заменяет словарь отсчетов по неубывающим ключам (например, минутам
+    модельного времени): повторная запись с тем же ключом заменяет
+    значение, а при переходе к следующему ключу значение учитывается
+    в сумме и максимуме.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0
+        self._key = None
+        self._value = None
+
+    def __len__(self):
+        return self.count + (self._key is not None)
+
+    def __setitem__(self, key, value):
+        if key != self._key and self._key is not None:
+            self._fold(self._value)
+        self._key = key
+        self._value = value
+
+    def _fold(self, value):
+        if self.count == 0 or value > self.maximum:
+            self.maximum = value
+        self.count += 1
+        self.total += value
+
+    def mean(self):
+        """Среднее по ключам с учетом последнего значения"""
+        if self._key is None:
+            return 0.0
+        return (self.total + self._value) / (self.count + 1)
+
+    def max(self):
+        """Максимум по ключам с учетом последнего значения"""
+        if self._key is None:
+            return 0
+        return max(self.maximum, self._value) if self.count else self._value
+
+
+class IntervalTotal:
+    """
+    Суммарная длительность последовательных непересекающихся интервалов
+
+    Заменяет список интервалов занятости кассы (метод append). Хранится
+    только последний интервал: лишь он может выходить за момент окончания
+    наблюдения.
+    """
+
+    def __init__(self):
+        self.completed = 0.0
+        self.last = None
+
+    def append(self, interval):
+        """Добавление интервала (начало, конец)"""
+        if self.last is not None:
+            self.completed += self.last[1] - self.last[0]
+        self.last = interval
+
+    def total(self, until=None):
+        """Суммарная длительность (с отсечением по моменту until)"""
+        if self.last is None:
+            return self.completed
+        start, end = self.last
+        if until is not None:
+            end = min(end, until)
+        return self.completed + end - start
@@ -0,0 +1,126 @@
+import math
+
+from analytic import service_time_moments
+
+
+class StabilityGuard:
+    """
+    Обнаружение неустойчивого режима (неограниченного роста очереди)
+
+    Объединяет априорную оценку по параметрам (предлагаемая нагрузка
+    относительно количества касс) и онлайн-проверку тренда длины очереди.
+    Отсчеты длины очереди после разогрева усредняются по интервалам
+    (метод групповых средних снижает автокорреляцию), а по средним
+    интервалов оценивается линейный тренд и его t-статистика.
+    Режим признается неустойчивым, если тренд значимо положителен и
+    очередь за период наблюдения выросла не меньше чем на количество касс
+    и не меньше своего среднего уровня.
+
+    Априорная оценка задает порог проверки: если нагрузка по параметрам
+    меньше количества касс, режим устойчив и прогон не останавливается
+    (рост очереди в начале дня при высокой загрузке - переходный процесс);
+    если заведомо больше - порог значимости снижен. Когда априорная оценка
+    неприменима (журнал прибытий, график касс), используется строгий порог.
+    """
+
+    def __init__(self, params, warmup=60.0, batch_length=30.0, min_batches=4,
+                 threshold=8.0, overload_threshold=2.0):
+        """
+        Args:
+            params (dict): Параметры модели (как у ShopSimulation)
+            warmup (float): Время разогрева без проверки (мин)
+            batch_length (float): Длина интервала усреднения (мин)
+            min_batches (int): Минимальное количество интервалов для проверки
+            threshold (float): Порог t-статистики тренда
+            overload_threshold (float): Порог t-статистики при нагрузке >= 1
+        """
+        self.warmup = warmup
+        self.batch_length = batch_length
+        self.min_batches = min_batches
+        self.capacity = int(params.get('num_cash_desks', 3))
+
+        # Априорная оценка имеет смысл только для стационарного пуассоновского
+        # потока, постоянного количества касс и без ухода покупателей
+        self.offered_load = None
+        arrival_mean = float(params.get('customer_arrival_mean', 5))
+        if (params.get('arrival_trace') is None and not params.get('desk_schedule')
+                and arrival_mean > 0):
+            self.offered_load = service_time_moments(params)[0] / arrival_mean
+        has_losses = any(params.get(name) for name in (
+            'balk_queue_length', 'patience_mean', 'max_customers_in_shop'))
+        self.known_stable = (self.offered_load is not None
+                             and self.offered_load < self.capacity)
+        self.overloaded = (self.offered_load is not None and not has_losses
+                           and self.offered_load >= self.capacity)
+        self.threshold = overload_threshold if self.overloaded else threshold
+
+        self.unstable = False
+        self.detected_at = None
+        self.trend = 0.0
+
+        # Текущий интервал усреднения
+        self._batch_sum = 0.0
+        self._batch_count = 0
+        self._batch_end = warmup + batch_length
+        # Суммы для регрессии средних интервалов по номеру интервала
+        self._n = 0
+        self._sx = self._sy = self._sxx = self._sxy = self._syy = 0.0
+
+    def observe(self, time, queue_length):
+        """
+        Учет очередного отсчета длины очереди
+
+        Args:
+            time (float): Момент модельного времени
+            queue_length (int): Длина очереди (ожидающие и обслуживаемые)
+
+        Returns:
+            bool: Признан ли режим неустойчивым
+        """
+        if self.unstable or self.known_stable or time < self.warmup:
+            return self.unstable
+        if time >= self._batch_end:
+            if self._batch_count:
+                self._add_batch(self._batch_sum / self._batch_count)
+                self._check(time)
+            self._batch_sum = 0.0
+            self._batch_count = 0
+            self._batch_end += self.batch_length
+        self._batch_sum += queue_length
+        self._batch_count += 1
+        return self.unstable
+
+    def _add_batch(self, value):
+        """Добавление среднего за интервал в суммы регрессии"""
+        x = float(self._n)
+        self._n += 1
+        self._sx += x
+        self._sy += value
+        self._sxx += x * x
+        self._sxy += x * value
+        self._syy += value * value
+
+    def _check(self, time):
+        """Проверка значимости положительного тренда по средним интервалов"""
+        n = self._n
+        if n < self.min_batches:
+            return
+        sxx = self._sxx - self._sx ** 2 / n
+        sxy = self._sxy - self._sx * self._sy / n
+        syy = self._syy - self._sy ** 2 / n
+        if sxx <= 0:
+            return
+        slope = sxy / sxx
+        residual = max(syy - slope * sxy, 0.0) / (n - 2)
+        error = math.sqrt(residual / sxx)
+        t_statistic = slope / error if error > 0 else (
+            float('inf') if slope > 0 else 0.0)
+
+        # Прирост очереди по линии тренда за период наблюдения
+        growth = slope * (n - 1)
+        level = self._sy / n
+        if (t_statistic > self.threshold and growth >= self.capacity
+                and growth >= level):
+            self.unstable = True
+            self.detected_at = time
+            self.trend = slope / self.batch_length
@@ -0,0 +1,101 @@
+import numpy as np
+
+from simulation import ShopSimulation
+
+
+def _run_point(params):
+    """Запуск одной симуляции точки эксперимента"""
+    return ShopSimulation(params).run_simulation()
+
+
+def _interval_scores(param_values, metric_values, curvature_weight=1.0,
+                     width_weight=0.1):
+    """
+    Оценки интервалов между соседними точками для уточнения
+
+    Оценка интервала складывается из изменения метрики на нем,
+    кривизны (изменения наклона) в его концах и небольшой доли ширины,
+    чтобы пологие участки тоже постепенно уточнялись. Изменения метрики
+    нормируются на ее размах, ширина - на диапазон параметра.
+    """
+    x = np.asarray(param_values, dtype=float)
+    y = np.asarray(metric_values, dtype=float)
+    y_range = np.ptp(y) or 1.0
+    x_range = np.ptp(x) or 1.0
+
+    widths = np.diff(x)
+    changes = np.diff(y) / y_range
+    scores = np.abs(changes) + width_weight * widths / x_range
+
+    # Кривизна во внутренних точках: разность наклонов соседних интервалов
+    if len(x) > 2:
+        slopes = changes / (widths / x_range)
+        curvature = np.abs(np.diff(slopes)) * np.minimum(
+            widths[:-1], widths[1:]) / x_range
+        scores[:-1] += curvature_weight * curvature / 2
+        scores[1:] += curvature_weight * curvature / 2
+    return scores
+
+
+def adaptive_sweep(base_params, param_name, start, end, metric_name, budget=15,
+                   initial_points=5, integer=False, simulate=None,
+                   progress_callback=None):
+    """
+    Эксперимент с адаптивным выбором значений параметра
+
+    Сначала метрика считается на грубой равномерной сетке, затем новые
+    точки добавляются в середины интервалов с наибольшим изменением
+    метрики или кривизной графика, пока не исчерпан бюджет прогонов.
+    Так точки сгущаются на перегибе кривой (где ожидание резко растет),
+    а на пологих участках их остается мало.
+
+    Args:
+        base_params (dict): Базовые параметры модели
+        param_name (str): Изменяемый параметр
+        start, end (float): Диапазон значений параметра
+        metric_name (str): Метрика, по которой выбираются новые точки
+        budget (int): Общее количество прогонов
+        initial_points (int): Количество точек грубой сетки
+        integer (bool): Целочисленный параметр (например, количество касс)
+        simulate (callable): Запуск модели по параметрам (по умолчанию ShopSimulation)
+        progress_callback (callable): Вызывается со значением параметра перед прогоном
+
+    Returns:
+        tuple: (значения параметра по возрастанию, результаты в том же порядке)
+    """
+    simulate = simulate or _run_point
+    evaluated = {}
+
+    def evaluate(value):
+        if progress_callback:
+            progress_callback(value)
+        params = base_params.copy()
+        params[param_name] = int(value) if integer else float(value)
+        evaluated[value] = simulate(params)
+
+    initial = np.linspace(start, end, max(2, min(initial_points, budget)))
+    if integer:
+        initial = np.unique(np.round(initial).astype(int))
+    for value in initial.tolist():
+        evaluate(value)
+
+    while len(evaluated) < budget:
+        values = sorted(evaluated)
+        metrics = [evaluated[value].get(metric_name, 0) for value in values]
+        scores = _interval_scores(values, metrics)
+
+        # Интервал с наибольшей оценкой, который еще можно разделить
+        candidate = None
+        for i in np.argsort(-scores):
+            middle = (values[i] + values[i + 1]) / 2
+            if integer:
+                middle = int(round(middle))
+            if middle not in evaluated and values[i] < middle < values[i + 1]:
+                candidate = middle
+                break
+        if candidate is None:
+            break
+        evaluate(candidate)
+
+    values = sorted(evaluated)
+    return values, [evaluated[value] for value in values]
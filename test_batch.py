@@ -0,0 +1,28 @@
+import itertools
+
+from batch import expand_manifest
+
+
+def test_expand_manifest_stores_and_sweep(tmp_path):
+    """Каждый магазин развертывается по всем значениям параметров и репликациям"""
+    (tmp_path / 'stores.csv').write_text(
+        "store_id,num_cash_desks\nA,2\nB,4\n", encoding='utf-8')
+    manifest = {
+        'base_params': {'simulation_time': 60},
+        'stores': 'stores.csv',
+        'sweep': {'customer_arrival_mean': [1, 2], 'service_time_mean': [2, 3]},
+        'replications': 2,
+    }
+
+    tasks = expand_manifest(manifest, base_dir=str(tmp_path))
+
+    assert len(tasks) == 2 * 2 * 2 * 2
+    assert len({task['task_id'] for task in tasks}) == len(tasks)
+    for store_id, desks in (('A', 2), ('B', 4)):
+        store_tasks = [task for task in tasks if task['store_id'] == store_id]
+        assert all(task['params']['num_cash_desks'] == desks for task in store_tasks)
+        assert all('store_id' not in task['params'] for task in store_tasks)
+        combinations = {(task['params']['customer_arrival_mean'],
+                         task['params']['service_time_mean'], task['replication'])
+                        for task in store_tasks}
+        assert combinations == set(itertools.product([1, 2], [2, 3], [0, 1]))
@@ -0,0 +1,41 @@
+import pytest
+
+from replications import confidence_interval, t_quantile
+
+# Табличные критические значения распределения Стьюдента
+T_TABLE = {
+    (0.975, 1): 12.706,
+    (0.975, 2): 4.303,
+    (0.975, 3): 3.182,
+    (0.975, 5): 2.571,
+    (0.975, 10): 2.228,
+    (0.975, 30): 2.042,
+    (0.975, 60): 2.000,
+    (0.975, 120): 1.980,
+    (0.95, 1): 6.314,
+    (0.95, 2): 2.920,
+    (0.95, 30): 1.697,
+    (0.995, 1): 63.657,
+    (0.995, 2): 9.925,
+    (0.995, 4): 4.604,
+    (0.995, 30): 2.750,
+    (0.995, 40): 2.704,
+}
+
+
+@pytest.mark.parametrize('probability, degrees_of_freedom', sorted(T_TABLE))
+def test_t_quantile_matches_table(probability, degrees_of_freedom):
+    expected = T_TABLE[probability, degrees_of_freedom]
+    assert t_quantile(probability, degrees_of_freedom) == pytest.approx(expected, abs=1e-3)
+
+
+def test_t_quantile_is_symmetric():
+    assert t_quantile(0.025, 2) == pytest.approx(-t_quantile(0.975, 2))
+
+
+def test_confidence_interval_uses_exact_quantile_for_three_replications():
+    mean, lower, upper = confidence_interval([1.0, 2.0, 3.0])
+    # s = 1, n = 3: полуширина t(0.975, 2) / sqrt(3)
+    assert mean == pytest.approx(2.0)
+    assert upper - mean == pytest.approx(4.3027 / 3 ** 0.5, rel=1e-4)
+    assert mean - lower == pytest.approx(upper - mean)
@@ -0,0 +1,345 @@
+import heapq
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from engine import DESK_CHANGE, MONITOR, QUEUE_JOIN, EventShopSimulation
+from simulation import ShopSimulation
+
+
+# Параметры этапов до касс: от них зависят моменты прибытия и постановки
+# в очередь. Остальные параметры (кассы, обслуживание, ограничения очереди,
+# график касс) влияют только на этап обслуживания
+UPSTREAM_PARAMS = ('seed', 'simulation_time', 'customer_arrival_mean', 'shopping_time_dist',
+                   'shopping_time_mean', 'shopping_time_std', 'shopping_time_min',
+                   'shopping_time_max', 'shopping_time_samples')
+
+# Количество расписаний, хранимых в кэше процесса
+SCHEDULE_CACHE_SIZE = 32
+
+
+def supports_schedule(params):
+    """
+    Можно ли воспроизводить этапы до касс по готовому расписанию
+
+    Расписание не зависит от касс, только если покупателей всегда
+    впускают в магазин (без 'max_customers_in_shop') и прибытия
+    генерируются моделью (без журнала 'arrival_trace').
+    """
+    return params.get('arrival_trace') is None and not params.get('max_customers_in_shop')
+
+
+class UpstreamSchedule:
+    """
+    Предварительно сгенерированные прибытия и моменты постановки в очередь
+
+    Хранится в виде компактных массивов: моменты прибытия покупателей,
+    их время выбора товаров и общий упорядоченный по времени поток событий
+    этапов до касс (момент и номер покупателя; отрицательный номер -
+    прибытие, положительный - постановка в очередь после выбора товаров).
+    """
+
+    def __init__(self, arrival_times, shopping_times, event_times, event_customers,
+                 next_arrival_time):
+        """
+        Args:
+            arrival_times: Моменты прибытия покупателей 1..n
+            shopping_times: Время выбора товаров покупателей 1..n
+            event_times: Моменты событий этапов до касс по возрастанию
+            event_customers: Номера покупателей событий (прибытие - со знаком минус)
+            next_arrival_time (float): Момент первого прибытия за пределами расписания
+        """
+        self.arrival_times = arrival_times
+        self.shopping_times = shopping_times
+        self.event_times = event_times
+        self.event_customers = event_customers
+        self.next_arrival_time = next_arrival_time
+
+    @classmethod
+    def generate(cls, interarrival_sampler, shopping_sampler, horizon):
+        """
+        Генерация расписания до момента horizon
+
+        Значения берутся теми же пакетами, что и в Sampler.draw(), а
+        моменты считаются последовательным накоплением, поэтому расписание
+        в точности совпадает с прогоном полной модели с тем же seed.
+
+        Args:
+            interarrival_sampler (Sampler): Генератор интервалов прибытия (неизрасходованный)
+            shopping_sampler (Sampler): Генератор времени выбора товаров (неизрасходованный)
+            horizon (float): Длительность прогона (мин)
+
+        Returns:
+            UpstreamSchedule: Расписание прибытий с моментом прибытия меньше horizon
+        """
+        # Интервалы прибытия генерируются, пока очередное прибытие не выйдет
+        # за horizon (это последнее значение модель тоже генерирует)
+        batches = [interarrival_sampler.sample(interarrival_sampler.batch_size)]
+        times = np.cumsum(batches[0])
+        while times[-1] < horizon:
+            batches.append(interarrival_sampler.sample(interarrival_sampler.batch_size))
+            times = np.cumsum(np.concatenate(batches))
+        count = int(np.searchsorted(times, horizon, side='left'))
+        arrival_times = times[:count]
+
+        shopping = np.empty(0)
+        if count:
+            batches = [shopping_sampler.sample(shopping_sampler.batch_size)
+                       for _ in range(-(-count // shopping_sampler.batch_size))]
+            shopping = np.concatenate(batches)[:count]
+        join_times = arrival_times + shopping
+
+        customers = np.arange(1, count + 1, dtype=np.int32)
+        event_times = np.concatenate([arrival_times, join_times])
+        event_customers = np.concatenate([-customers, customers])
+        # При совпадении моментов прибытие обрабатывается раньше
+        order = np.argsort(event_times, kind='stable')
+        return cls(arrival_times, shopping, event_times[order], event_customers[order],
+                   float(times[count]))
+
+    @property
+    def num_customers(self):
+        """Количество покупателей в расписании"""
+        return len(self.arrival_times)
+
+    @property
+    def nbytes(self):
+        """Объем массивов расписания (байт)"""
+        return (self.arrival_times.nbytes + self.shopping_times.nbytes +
+                self.event_times.nbytes + self.event_customers.nbytes)
+
+    def input_means(self, num_arrivals):
+        """
+        Выборочные средние интервалов прибытия и времени выбора товаров,
+        которые сгенерировала бы полная модель после num_arrivals прибытий
+
+        Returns:
+            tuple: (средний интервал прибытия, среднее время выбора товаров или None)
+        """
+        if num_arrivals < self.num_customers:
+            # После прибытия генерируется интервал до следующего
+            interarrival_sum = self.arrival_times[num_arrivals]
+        else:
+            interarrival_sum = self.next_arrival_time
+        shopping_mean = (float(self.shopping_times[:num_arrivals].mean())
+                         if num_arrivals else None)
+        return float(interarrival_sum) / (num_arrivals + 1), shopping_mean
+
+
+class ScheduleCache:
+    """
+    Кэш расписаний этапов до касс с вытеснением давно не использованных
+
+    Ключ - значения параметров UPSTREAM_PARAMS, поэтому точки эксперимента,
+    отличающиеся только параметрами касс и обслуживания, используют одно
+    расписание (и общие случайные числа прибытий и выбора товаров).
+    """
+
+    def __init__(self, max_entries=SCHEDULE_CACHE_SIZE):
+        """
+        Args:
+            max_entries (int): Наибольшее количество хранимых расписаний
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, factory):
+        """
+        Расписание по ключу; при отсутствии создается вызовом factory()
+        """
+        schedule = self.entries.get(key)
+        if schedule is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return schedule
+        self.misses += 1
+        schedule = factory()
+        self.entries[key] = schedule
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return schedule
+
+    def clear(self):
+        """Очистка кэша и счетчиков"""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Кэш расписаний текущего процесса (у каждого рабочего процесса пула свой)
+schedule_cache = ScheduleCache()
+
+
+class ScheduledShopSimulation(EventShopSimulation):
+    """
+    Событийная модель, в которой этапы до касс воспроизводятся по расписанию
+
+    Прибытия и окончания выбора товаров не генерируются и не проходят через
+    календарь событий: они читаются из готового расписания UpstreamSchedule
+    и сливаются с календарем этапа обслуживания. Результаты совпадают с
+    EventShopSimulation с теми же параметрами, но в серии прогонов,
+    отличающихся только параметрами касс и обслуживания, этапы до касс
+    генерируются один раз.
+    """
+
+    def __init__(self, params, schedule=None, cache=None):
+        """
+        Args:
+            params (dict): Параметры модели (см. supports_schedule)
+            schedule (UpstreamSchedule): Готовое расписание (по умолчанию - из кэша)
+            cache (ScheduleCache): Кэш расписаний (по умолчанию кэш процесса)
+        """
+        if not supports_schedule(params):
+            raise ValueError(
+                "Расписание этапов до касс не применимо при ограничении количества "
+                "покупателей в магазине или журнале прибытий")
+        super().__init__(params)
+        self.schedule_horizon = self.simulation_time
+        if schedule is None:
+            cache = schedule_cache if cache is None else cache
+            schedule = cache.get(self.upstream_key(), lambda: UpstreamSchedule.generate(
+                self.interarrival_sampler, self.shopping_sampler, self.schedule_horizon))
+        self.schedule = schedule
+        # Списки для быстрого доступа по индексу в цикле событий
+        self._arrival_times = schedule.arrival_times.tolist()
+        self._upstream_times = schedule.event_times.tolist()
+        self._upstream_customers = schedule.event_customers.tolist()
+        self._upstream_position = 0
+
+    def upstream_key(self):
+        """Ключ расписания: значения параметров этапов до касс"""
+        key = []
+        for name in UPSTREAM_PARAMS:
+            value = getattr(self, name)
+            if isinstance(value, (list, np.ndarray)):
+                value = tuple(np.asarray(value, dtype=float).tolist())
+            key.append(value)
+        return tuple(key)
+
+    def _start(self):
+        """Планирование начальных событий (кроме прибытий)"""
+        self._started = True
+        self._schedule(0.0, MONITOR)
+        for time, num_cash_desks in self.desk_schedule:
+            if time > 0:
+                self._schedule(time, DESK_CHANGE, num_cash_desks)
+
+    def _handle_arrival(self, customer_id):
+        """Прибытие покупателя по расписанию (ограничения на вход нет)"""
+        self.customer_id = customer_id
+        self.stats['customer_arrivals'] += 1
+        self._admit_customer(customer_id)
+        self._record_queue_length()
+
+    def _process(self, until, limit=None):
+        """
+        Обработка событий календаря и расписания в порядке времени до момента until
+
+        Args:
+            until (float): Момент модельного времени (события в этот момент
+                не обрабатываются)
+            limit (int): Наибольшее количество обрабатываемых событий
+
+        Returns:
+            int: Количество обработанных событий
+        """
+        if until > self.schedule_horizon:
+            raise ValueError("Расписание этапов до касс короче заданного времени")
+        if not self._started:
+            self._start()
+        calendar = self.events
+        handle = self._handle
+        arrival_times = self._arrival_times
+        times, customers = self._upstream_times, self._upstream_customers
+        position, count = self._upstream_position, len(times)
+        upstream_time = times[position] if position < count else float('inf')
+        processed = 0
+        while self.stopped_at is None and processed != limit:
+            if calendar and calendar[0][0] < upstream_time:
+                if calendar[0][0] >= until:
+                    break
+                time, _, kind, data = heapq.heappop(calendar)
+                self.now = time
+                handle(kind, data)
+            else:
+                if upstream_time >= until:
+                    break
+                self.now = upstream_time
+                customer = customers[position]
+                position += 1
+                upstream_time = times[position] if position < count else float('inf')
+                if customer < 0:
+                    self._handle_arrival(-customer)
+                else:
+                    handle(QUEUE_JOIN, (customer, arrival_times[customer - 1]))
+            processed += 1
+        self._upstream_position = position
+        return processed
+
+    def run_until(self, until):
+        """См. EventShopSimulation.run_until"""
+        self._process(until)
+        if self.stopped_at is None:
+            self.now = max(self.now, until)
+
+    def iter_events(self, kinds=None, keep_stats=True):
+        """См. EventShopSimulation.iter_events"""
+        if not keep_stats:
+            self.use_streaming_stats()
+        wanted = set(kinds) if kinds is not None else None
+        sink = self._event_sink = deque()
+        try:
+            while self._process(self.simulation_time, 1):
+                while sink:
+                    event = sink.popleft()
+                    if wanted is None or event.kind in wanted:
+                        yield event
+            if self.stopped_at is None:
+                self.now = max(self.now, self.simulation_time)
+        finally:
+            self._event_sink = None
+        self.calculate_results()
+
+    def apply_changes(self, changes):
+        """
+        См. EventShopSimulation.apply_changes; параметры этапов до касс
+        при воспроизведении расписания не изменяются
+        """
+        for name, value in changes.items():
+            if name in UPSTREAM_PARAMS and name != 'simulation_time':
+                raise ValueError(f"Параметр нельзя изменить при заданном расписании: {name}")
+            if name == 'max_customers_in_shop' and value:
+                raise ValueError(f"Параметр нельзя изменить при заданном расписании: {name}")
+        super().apply_changes(changes)
+
+    def calculate_results(self):
+        """Расчет результатов; средние входных величин этапов до касс - по расписанию"""
+        super().calculate_results()
+        interarrival_mean, shopping_mean = self.schedule.input_means(self.customer_id)
+        self.results['input_sample_means'].update({
+            'customer_arrival_mean': interarrival_mean,
+            'shopping_time_mean': shopping_mean,
+        })
+
+
+def simulate_with_schedule(params, cache=None):
+    """
+    Прогон модели с расписанием этапов до касс из кэша (если применимо)
+
+    Функция верхнего уровня для пула процессов. В сериях прогонов,
+    различающихся только параметрами касс и обслуживания (количество касс,
+    время обслуживания, график касс), прибытия и выбор товаров генерируются
+    один раз на процесс, а точки серии получают общие случайные числа.
+    Если расписание неприменимо (см. supports_schedule), запускается
+    EventShopSimulation, а при журнале прибытий - ShopSimulation.
+
+    Returns:
+        dict: Результаты симуляции
+    """
+    if params.get('arrival_trace') is not None:
+        return ShopSimulation(params).run_simulation()
+    if not supports_schedule(params):
+        return EventShopSimulation(params).run_simulation()
+    return ScheduledShopSimulation(params, cache=cache).run_simulation()
@@ -19,14 +19,31 @@ class SimulationVisualizer:
         plt.rcParams['figure.figsize'] = (10, 6)
         plt.rcParams['font.size'] = 12
 
+    def _distribution(self, key):
+        """
+        Значения распределения из результатов в виде массива
+
+        Массивы, отображенные в память (см. shared_results.py),
+        используются без копирования.
+        """
+        return np.asarray(self.results.get(key, []), dtype=float)
+
+    def _queue_length_series(self):
+        """Моменты времени и длины очереди, упорядоченные по времени"""
+        series = np.asarray(self.results.get('queue_length_time_series', []),
+                            dtype=float).reshape(-1, 2)
+        times, lengths = series[:, 0], series[:, 1]
+        if np.any(np.diff(times) < 0):
+            order = np.argsort(times, kind='stable')
+            times, lengths = times[order], lengths[order]
+        return times, lengths
+
     def plot_queue_length_over_time(self):
         """Построение графика изменения длины очереди во времени"""
-        if not self.results.get('queue_length_time_series'):
+        times, lengths = self._queue_length_series()
+        if len(times) == 0:
             return None
 
-        # Преобразование данных
-        times, lengths = zip(*sorted(self.results['queue_length_time_series']))
-
         fig, ax = plt.subplots()
         ax.plot(times, lengths, linewidth=1.5)
         ax.set_title('Изменение длины очереди во времени')
@@ -44,8 +61,8 @@ class SimulationVisualizer:
 
     def plot_waiting_time_histogram(self):
         """Построение гистограммы времени ожидания в очереди"""
-        waiting_times = self.results.get('waiting_time_distribution', [])
-        if not waiting_times:
+        waiting_times = self._distribution('waiting_time_distribution')
+        if len(waiting_times) == 0:
             return None
 
         fig, ax = plt.subplots()
@@ -64,8 +81,8 @@ class SimulationVisualizer:
 
     def plot_time_in_shop_histogram(self):
         """Построение гистограммы времени нахождения в магазине"""
-        times_in_shop = self.results.get('time_in_shop_distribution', [])
-        if not times_in_shop:
+        times_in_shop = self._distribution('time_in_shop_distribution')
+        if len(times_in_shop) == 0:
             return None
 
         fig, ax = plt.subplots()
@@ -122,7 +139,72 @@ class SimulationVisualizer:
 
         return fig
 
-    def plot_comparative_experiment(self, experiment_results, param_name, param_values, metric_name):
+    def plot_interval_statistics(self):
+        """Построение показателей по интервалам модельного времени
+
+        Требует статистики по интервалам (параметр модели 'interval_width')
+        """
+        arrivals = self._distribution('interval_arrivals')
+        if len(arrivals) == 0:
+            return None
+
+        width = self.results['interval_width']
+        starts = np.arange(len(arrivals)) * width
+        centers = starts + width / 2
+
+        fig, axs = plt.subplots(2, 2, figsize=(15, 10), sharex=True)
+
+        # Прибытия и обслуженные покупатели
+        axs[0, 0].bar(centers - width / 5, arrivals, width=width * 0.4, label='Прибыло')
+        axs[0, 0].bar(centers + width / 5, self._distribution('interval_completions'),
+                      width=width * 0.4, label='Обслужено')
+        axs[0, 0].set_title('Поток покупателей')
+        axs[0, 0].set_ylabel('Покупателей за интервал')
+        axs[0, 0].legend()
+
+        # Ожидание по интервалу постановки в очередь
+        axs[0, 1].plot(centers, self._distribution('interval_avg_waiting_time'), 'o-',
+                       linewidth=2, label='Среднее')
+        axs[0, 1].plot(centers, self._distribution('interval_p95_waiting_time'), 's--',
+                       linewidth=1.5, label='95-й процентиль')
+        axs[0, 1].set_title('Время ожидания')
+        axs[0, 1].set_ylabel('Время ожидания (мин)')
+        axs[0, 1].legend()
+
+        # Средняя по времени длина очереди
+        axs[1, 0].step(np.append(starts, starts[-1] + width),
+                       np.append(self._distribution('interval_avg_queue_length'),
+                                 self.results['interval_avg_queue_length'][-1]),
+                       where='post', linewidth=2)
+        axs[1, 0].set_title('Средняя длина очереди')
+        axs[1, 0].set_xlabel('Время (мин)')
+        axs[1, 0].set_ylabel('Длина очереди (чел.)')
+
+        # Загрузка касс: доля занятого времени в интервале
+        busy = np.asarray(self.results['interval_desk_busy_time'], dtype=float)
+        observed = self._distribution('interval_observed_time')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            utilization = np.where(observed > 0, busy / observed, 0.0)
+        for desk_id, values in enumerate(utilization):
+            axs[1, 1].plot(centers, values, linewidth=1, alpha=0.6,
+                           label=f'Касса {desk_id + 1}')
+        if len(utilization):
+            axs[1, 1].plot(centers, utilization.mean(axis=0), 'k-', linewidth=2.5,
+                           label='Среднее')
+        axs[1, 1].set_title('Загрузка касс')
+        axs[1, 1].set_xlabel('Время (мин)')
+        axs[1, 1].set_ylabel('Коэффициент загрузки')
+        axs[1, 1].yaxis.set_major_formatter(
+            plt.FuncFormatter(lambda y, _: '{:.0%}'.format(y)))
+        axs[1, 1].legend(fontsize=9, ncol=2)
+
+        fig.suptitle(f'Показатели по интервалам ({width:g} мин)')
+        fig.tight_layout()
+
+        return fig
+
+    def plot_comparative_experiment(self, experiment_results, param_name, param_values, metric_name,
+                                    metamodel=None):
         """Построение графика сравнительного эксперимента
 
         Args:
@@ -130,6 +212,7 @@ class SimulationVisualizer:
             param_name: имя изменяемого параметра
             param_values: список значений параметра
             metric_name: имя метрики для сравнения
+            metamodel: обученная метамодель (SweepMetamodel) для интерполяции
         """
         if len(experiment_results) == 0 or len(param_values) == 0:
             return None
@@ -162,6 +245,27 @@ class SimulationVisualizer:
 
         fig, ax = plt.subplots()
         ax.plot(param_values_numeric, metric_values, 'o-', linewidth=2)
+
+        # Точки, где прогон остановлен досрочно из-за неустойчивости
+        unstable = [(x, y) for x, y, result in zip(param_values_numeric, metric_values,
+                                                   experiment_results)
+                    if result.get('unstable')]
+        if unstable:
+            ax.plot(*zip(*unstable), 'rx', markersize=10, markeredgewidth=2,
+                    label='Неустойчивый режим')
+            ax.legend()
+
+        # Прогноз метамодели между просчитанными точками
+        if metamodel is not None and metamodel.is_fitted(metric_name):
+            grid = np.linspace(min(metamodel.param_values),
+                               max(metamodel.param_values), 200)
+            mean, std = metamodel.predict_curve(grid, metric_name)
+            ax.plot(grid, mean, color='gray', linestyle='--', linewidth=1,
+                    label='Метамодель')
+            ax.fill_between(grid, mean - 2 * std, mean + 2 * std,
+                            color='gray', alpha=0.2, label='±2σ')
+            ax.legend()
+
         ax.set_title(
             f'Зависимость {metric_label} от параметра\n"{param_label}"')
         ax.set_xlabel(param_label)
@@ -180,6 +284,242 @@ class SimulationVisualizer:
 
         return fig
 
+    def plot_staffing_search(self, search_result):
+        """Построение графика проверенных точек при подборе количества касс
+
+        Args:
+            search_result: словарь, возвращаемый find_min_cash_desks
+        """
+        evaluations = search_result.get('evaluations', {})
+        if not evaluations:
+            return None
+
+        desks = sorted(evaluations.keys())
+        means = [evaluations[d]['mean'] for d in desks]
+        lower_errors = [max(0, evaluations[d]['mean'] - evaluations[d]['ci'][0])
+                        for d in desks]
+        upper_errors = [max(0, evaluations[d]['ci'][1] - evaluations[d]['mean'])
+                        for d in desks]
+
+        fig, ax = plt.subplots()
+        ax.errorbar(desks, means, yerr=[lower_errors, upper_errors],
+                    fmt='o', capsize=5, linewidth=2)
+
+        # Целевое значение SLA
+        target = search_result.get('target_wait', 0)
+        ax.axhline(y=target, color='r', linestyle='--',
+                   label=f'Цель: {target:.1f} мин')
+
+        # Найденное минимальное количество касс
+        best = search_result.get('num_cash_desks')
+        if best is not None:
+            ax.axvline(x=best, color='g', linestyle=':',
+                       label=f'Минимум касс: {best}')
+
+        ax.set_title('Подбор минимального количества касс')
+        ax.set_xlabel('Количество касс')
+        ax.set_ylabel('95-й перцентиль ожидания (мин)')
+        ax.set_xticks(desks)
+        ax.grid(True)
+        ax.legend()
+
+        return fig
+
+    def plot_desk_schedule(self, schedule_result):
+        """Построение графика работы касс и почасового времени ожидания
+
+        Args:
+            schedule_result: словарь, возвращаемый optimize_desk_schedule
+        """
+        blocks = schedule_result.get('blocks', [])
+        if not blocks:
+            return None
+
+        block_length = schedule_result.get('block_length', 60)
+        starts = [i * block_length for i in range(len(blocks))]
+
+        fig, ax = plt.subplots()
+        ax.bar(starts, blocks, width=block_length, align='edge', alpha=0.6,
+               color=sns.color_palette("viridis", 1)[0], label='Открытые кассы')
+        ax.set_title('Оптимальный график работы касс')
+        ax.set_xlabel('Время (мин)')
+        ax.set_ylabel('Количество касс')
+        ax.set_ylim(0, max(blocks) + 1)
+
+        # Почасовое время ожидания на второй оси
+        hourly = schedule_result.get('hourly_values', [])
+        if hourly:
+            ax2 = ax.twinx()
+            hours = [h * 60 + 30 for h in range(len(hourly))]
+            ax2.plot(hours, hourly, 'o-', color='k', linewidth=1.5,
+                     label='Ожидание по часам')
+            target = schedule_result.get('target_wait', 0)
+            ax2.axhline(y=target, color='r', linestyle='--',
+                        label=f'Допустимое ожидание: {target:.1f} мин')
+            ax2.set_ylabel('Время ожидания (мин)')
+            ax2.grid(False)
+            lines, labels = ax.get_legend_handles_labels()
+            lines2, labels2 = ax2.get_legend_handles_labels()
+            ax2.legend(lines + lines2, labels + labels2, loc='upper right')
+
+        return fig
+
+    def plot_sensitivity(self, sensitivity_result, factor_labels=None):
+        """Построение индексов Соболя с доверительными интервалами
+
+        Args:
+            sensitivity_result: словарь, возвращаемый sobol_sensitivity
+            factor_labels: русские названия факторов
+        """
+        factors = sensitivity_result.get('factors', [])
+        if not factors:
+            return None
+
+        factor_labels = factor_labels or {}
+        labels = [factor_labels.get(name, name) for name in factors]
+        positions = np.arange(len(factors))
+        height = 0.4
+
+        def errors(values, intervals):
+            values = np.asarray(values)
+            intervals = np.asarray(intervals)
+            return np.clip([values - intervals[:, 0], intervals[:, 1] - values], 0, None)
+
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.barh(positions - height / 2, sensitivity_result['first_order'], height,
+                xerr=errors(sensitivity_result['first_order'],
+                            sensitivity_result['first_order_ci']),
+                capsize=3, label='Индекс первого порядка')
+        ax.barh(positions + height / 2, sensitivity_result['total'], height,
+                xerr=errors(sensitivity_result['total'], sensitivity_result['total_ci']),
+                capsize=3, label='Полный индекс')
+        ax.set_yticks(positions)
+        ax.set_yticklabels(labels)
+        ax.invert_yaxis()
+        ax.set_xlabel('Доля дисперсии метрики')
+        ax.set_title(f"Индексы Соболя ({sensitivity_result['evaluations']} прогонов)")
+        ax.legend()
+        fig.tight_layout()
+
+        return fig
+
+    def plot_time_series_bands(self, series_result):
+        """Построение медианы и полос квантилей длины очереди и загрузки касс
+
+        Args:
+            series_result: словарь, возвращаемый replicate_time_series
+        """
+        times = series_result.get('times', [])
+        if not times:
+            return None
+
+        probabilities = sorted(series_result['probabilities'])
+        low, high = probabilities[0], probabilities[-1]
+        median = min(probabilities, key=lambda p: abs(p - 0.5))
+
+        fig, axs = plt.subplots(2, 1, figsize=(10, 8), sharex=True)
+        panels = [
+            (axs[0], 'queue_length', 1, 'Длина очереди (чел.)'),
+            (axs[1], 'utilization', 100, 'Загрузка касс (%)'),
+        ]
+        for ax, key, scale, ylabel in panels:
+            quantiles = series_result[key]
+            ax.fill_between(times, np.asarray(quantiles[low]) * scale,
+                            np.asarray(quantiles[high]) * scale, alpha=0.3,
+                            label=f'{low:.0%}–{high:.0%}')
+            ax.plot(times, np.asarray(quantiles[median]) * scale, linewidth=2,
+                    label='Медиана')
+            ax.plot(times, np.asarray(series_result[f'{key}_mean']) * scale,
+                    'k--', linewidth=1, label='Среднее')
+            ax.set_ylabel(ylabel)
+            ax.grid(True)
+            ax.legend(loc='upper left')
+
+        axs[0].set_title(f"Динамика по {series_result['replications']} репликациям "
+                         f"(интервал {series_result['bin_width']:g} мин)")
+        axs[1].set_xlabel('Время (мин)')
+        fig.tight_layout()
+
+        return fig
+
+    def plot_control_variates(self, cv_result, metric_labels=None):
+        """Построение обычных оценок и оценок с контрольными переменными
+
+        Args:
+            cv_result: словарь, возвращаемый control_variate_estimates
+            metric_labels: русские названия метрик
+        """
+        estimates = cv_result.get('estimates', {})
+        if not estimates:
+            return None
+
+        metric_labels = metric_labels or {}
+        fig, axs = plt.subplots(1, len(estimates), figsize=(5 * len(estimates), 5),
+                                squeeze=False)
+        for ax, (name, estimate) in zip(axs[0], estimates.items()):
+            for position, key in enumerate(('raw', 'adjusted')):
+                mean, lower, upper = estimate[key]
+                ax.errorbar([position], [mean], yerr=[[mean - lower], [upper - mean]],
+                            fmt='o', capsize=8, linewidth=2, markersize=8)
+            ax.set_xticks([0, 1])
+            ax.set_xticklabels(['Обычная', 'С контрольными\nпеременными'])
+            ax.set_xlim(-0.5, 1.5)
+            ax.set_title(metric_labels.get(name, name))
+            ax.grid(True)
+
+        fig.suptitle(f"Оценки по {cv_result['replications']} репликациям "
+                     f"({cv_result['confidence']:.0%}-е интервалы)")
+        fig.tight_layout()
+
+        return fig
+
+    def plot_calibration(self, calibration_result, kpi_labels=None):
+        """Построение хода калибровки и сравнения показателей с наблюдаемыми
+
+        Args:
+            calibration_result: словарь, возвращаемый calibrate_parameters
+            kpi_labels: русские названия показателей
+        """
+        history = calibration_result.get('history', [])
+        if not history:
+            return None
+
+        kpi_labels = kpi_labels or {}
+        fig, (ax_history, ax_kpis) = plt.subplots(1, 2, figsize=(12, 5))
+
+        ax_history.semilogy(range(1, len(history) + 1),
+                            np.maximum(history, 1e-12), 'o-', linewidth=1.5)
+        ax_history.set_title('Ход калибровки')
+        ax_history.set_xlabel('Итерация')
+        ax_history.set_ylabel('Целевая функция')
+        ax_history.grid(True)
+
+        # Показатели в начальной и найденной точках в долях наблюдаемых значений
+        targets = calibration_result['targets']
+        names = list(targets)
+        positions = np.arange(len(names))
+        width = 0.35
+
+        def ratios(kpis):
+            return [kpis[name] / targets[name] if targets[name] else np.nan
+                    for name in names]
+
+        initial, fitted = ratios(calibration_result['initial_kpis']), ratios(calibration_result['kpis'])
+        ax_kpis.bar(positions - width / 2, initial, width, label='Начальные параметры')
+        ax_kpis.bar(positions + width / 2, fitted, width, label='Найденные параметры')
+        # Место над столбцами для легенды
+        ax_kpis.set_ylim(0, 1.4 * max(1.0, np.nanmax(initial + fitted)))
+        ax_kpis.axhline(y=1.0, color='r', linestyle='--', label='Наблюдаемое значение')
+        ax_kpis.set_xticks(positions)
+        ax_kpis.set_xticklabels([kpi_labels.get(name, name) for name in names],
+                                rotation=15, ha='right')
+        ax_kpis.set_ylabel('Модель / наблюдение')
+        ax_kpis.set_title('Показатели модели')
+        ax_kpis.legend()
+        fig.tight_layout()
+
+        return fig
+
     def create_summary_dashboard(self):
         """Создание панели с основными показателями симуляции"""
         # Создание фигуры с 4 графиками
@@ -187,9 +527,8 @@ class SimulationVisualizer:
         plt.subplots_adjust(hspace=0.3, wspace=0.3)
 
         # График 1: Изменение длины очереди
-        if self.results.get('queue_length_time_series'):
-            times, lengths = zip(
-                *sorted(self.results['queue_length_time_series']))
+        times, lengths = self._queue_length_series()
+        if len(times) > 0:
             axs[0, 0].plot(times, lengths, linewidth=1.5)
             axs[0, 0].set_title('Изменение длины очереди во времени')
             axs[0, 0].set_xlabel('Время (мин)')
@@ -201,8 +540,8 @@ class SimulationVisualizer:
             axs[0, 0].legend()
 
         # График 2: Гистограмма времени ожидания
-        waiting_times = self.results.get('waiting_time_distribution', [])
-        if waiting_times:
+        waiting_times = self._distribution('waiting_time_distribution')
+        if len(waiting_times) > 0:
             sns.histplot(waiting_times, kde=True, ax=axs[0, 1])
             axs[0, 1].set_title('Распределение времени ожидания')
             axs[0, 1].set_xlabel('Время ожидания (мин)')
@@ -214,8 +553,8 @@ class SimulationVisualizer:
             axs[0, 1].legend()
 
         # График 3: Гистограмма времени в магазине
-        times_in_shop = self.results.get('time_in_shop_distribution', [])
-        if times_in_shop:
+        times_in_shop = self._distribution('time_in_shop_distribution')
+        if len(times_in_shop) > 0:
             sns.histplot(times_in_shop, kde=True, ax=axs[1, 0])
             axs[1, 0].set_title('Время нахождения в магазине')
             axs[1, 0].set_xlabel('Время (мин)')